@@ -6,7 +6,8 @@ from gymnasium.envs import make
 from gymnasium.wrappers import TimeLimit
 
 from treasure_hunt.environment import FixedTreasureHuntEnv
-from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.agent import TabularQLearner, SimplifierQLearner
+from treasure_hunt.agent.env_reducer import ObliviousReducer
 
 
 @pytest.fixture(name='fixed_environment')
@@ -36,3 +37,10 @@ def fixture_q_learner_with_limit(fixed_environment: FixedTreasureHuntEnv):
     """Fixture to create the TabularQLearner with a limit."""
     limited_env = TimeLimit(fixed_environment, max_episode_steps=500)
     return TabularQLearner(limited_env)
+
+
+@pytest.fixture(name="dense_q_learner")
+def fixture_dense_q_learner(fixed_environment: FixedTreasureHuntEnv):
+    """Fixture to create the TabularQLearner with an oblivious dense Q-table."""
+    return SimplifierQLearner(fixed_environment, ObliviousReducer(fixed_environment),
+                              q_table_backend="dense")
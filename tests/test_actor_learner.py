@@ -0,0 +1,93 @@
+"""Tests for the actor-learner training mode."""
+import numpy as np
+import pytest
+from gymnasium.envs import make
+
+from treasure_hunt.agent import TabularQLearner, SimplifierQLearner
+from treasure_hunt.agent.actor_learner import ActorPool, TransitionRing
+from treasure_hunt.agent.env_reducer import NearSightedReducer
+from treasure_hunt.environment import BaseTreasureHuntEnv
+from treasure_hunt.telemetry import Telemetry
+
+
+def test_transition_ring():
+    """Test that transitions come out of the ring in order, across wrap-arounds."""
+    ring = TransitionRing(key_width=2, capacity=4)
+    try:
+        received = []
+        for i in range(10):
+            ring.put([i, -i], i % 4, float(i), [i + 1, -i - 1])
+            if i % 3 == 2:
+                received.extend(ring.get_batch(8)[1].tolist())
+        states, actions, rewards, next_states = ring.get_batch(8)
+        received.extend(actions.tolist())
+        assert received == [i % 4 for i in range(10)]
+        assert states[-1].tolist() == [9, -9]
+        assert rewards[-1] == 9.0
+        assert next_states[-1].tolist() == [10, -10]
+    finally:
+        ring.close()
+
+
+def test_actor_learner_dict_backend():
+    """Test that actors feed the learner's Q-table with every transition."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=50)
+    agent = TabularQLearner(env, n_actors=2)
+    agent.learn(total_timesteps=2000)
+    assert any(np.any(row != 0) for row in agent.q_table.values())
+    assert np.isclose(agent.exploration_rate, max(0.01, 0.995**2000))
+    agent.close()
+
+
+def test_actor_learner_reduced_dense_backend():
+    """Test the actor-learner mode with a reducer and a dense Q-table."""
+    env = make("RandomMonsterTreasureHunt-v0", max_episode_steps=50)
+    agent = SimplifierQLearner(env, NearSightedReducer(env.unwrapped),
+                               q_table_backend="dense", n_actors=3)
+    agent.learn(total_timesteps=3000)
+    assert np.count_nonzero(np.any(agent.q_table != 0, axis=1)) > 10
+    agent.close()
+
+
+def test_actor_pool_kept_across_learn_calls():
+    """Test that the actors are started once and stopped by close."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=50)
+    agent = TabularQLearner(env, q_table_backend="dense", n_actors=2)
+    agent.learn(total_timesteps=500)
+    actors = agent.actor_pool.actors
+    agent.learn(total_timesteps=500)
+    assert agent.actor_pool.actors is actors and all(actor.is_alive() for actor in actors)
+    assert np.isclose(agent.exploration_rate, max(0.01, 0.995**1000))
+    agent.close()
+    assert agent.actor_pool is None and not any(actor.is_alive() for actor in actors)
+
+
+@pytest.mark.timeout(30)  # Every spawned actor imports the package
+def test_spawned_actors():
+    """Test that spawned actors get a copy of the agent, without its telemetry wrappers,
+    and write to the learner's rings."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=50)
+    agent = TabularQLearner(env)
+    telemetry = Telemetry(agent, env)
+    pool = ActorPool(agent, 2, start_method="spawn", seed=0)
+    try:
+        pool.learn(total_timesteps=1000)
+        assert any(np.any(row != 0) for row in agent.q_table.values())
+        assert telemetry.env_steps == 1000
+    finally:
+        pool.close()
+        telemetry.detach()
+
+
+def test_batched_dense_update():
+    """Test that a batch of distinct pairs updates a dense Q-table as one update per pair."""
+    agent = TabularQLearner(BaseTreasureHuntEnv(env_size=4, n_monsters=1), q_table_backend="dense")
+    agent.q_table[:] = np.random.default_rng(0).random(agent.q_table.shape)
+    expected = agent.q_table.copy()
+    states, actions = np.array([0, 1, 2]), np.array([1, 2, 3])
+    rewards, next_states = np.array([-1.0, 0.0, 5.0]), np.array([5, 6, 7])
+    for transition in zip(states, actions, rewards, next_states):
+        expected[transition[0], transition[1]] += 0.1 * (
+            transition[2] + 0.99 * expected[transition[3]].max() - expected[transition[0], transition[1]])
+    agent._update_q_values(states, actions, rewards, next_states)  # pylint: disable=protected-access
+    assert np.allclose(agent.q_table, expected)
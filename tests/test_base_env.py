@@ -1,9 +1,13 @@
 """Tests for the TreasureHuntEnv environment."""
 import warnings
 import pytest
+import numpy as np
+from gymnasium import make
 from gymnasium.utils.env_checker import check_env
 
+from treasure_hunt.agent.state_indexer import StateIndexer
 from treasure_hunt.environment import BaseTreasureHuntEnv
+from treasure_hunt.environment.frames import HERO_COLOR, render_frames
 
 # pylint: disable=W0212  # We're fine with using protected members in tests.
 # pylint: disable=W0611 # Unused import
@@ -120,3 +124,131 @@ class TestBaseTreasureHuntEnv:
         assert not environment._is_valid_monster_move([(1, 1), (1, 1)])
         assert not environment._is_valid_monster_move([(1, 1), (99, 99)])
         assert not environment._is_valid_monster_move([(1, 1)])
+
+    def test_deterministic(self, environment):
+        """Test that random monster layouts make the environment non-deterministic."""
+        assert not environment.deterministic
+
+    def test_transition_tables(self, environment):
+        """Test that the lookup tables agree with the grid geometry."""
+        size = environment.ENV_SIZE
+        for position in range(size**2):
+            row, col = environment.decode_position(position)
+            for action, (d_row, d_col) in enumerate([(-1, 0), (1, 0), (0, -1), (0, 1)]):
+                valid = environment._is_valid_position(row + d_row, col + d_col)
+                assert environment.is_invalid[position, action] == (not valid)
+                expected = environment._encode_position(
+                    row + d_row, col + d_col) if valid else position
+                assert environment.next_position[position, action] == expected
+
+
+def test_grid_size_and_monster_count():
+    """Test that the grid size and number of monsters are make() parameters."""
+    env = make("RandomMonsterTreasureHunt-v0", env_size=30, n_monsters=40)
+    obs, _ = env.reset(seed=0)
+    assert env.unwrapped.ENV_SIZE == 30 and BaseTreasureHuntEnv.ENV_SIZE == 10
+    assert obs["treasure_position"] == 30**2 - 1
+    assert len(obs["monster_positions"]) == 40
+    for _ in range(100):
+        obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        if terminated or truncated:
+            obs, _ = env.reset()
+        assert obs["treasure_position"] not in obs["monster_positions"]
+
+    with pytest.raises(ValueError):
+        BaseTreasureHuntEnv(env_size=2, n_monsters=3)
+    with pytest.raises(ValueError):
+        make("FixedTreasureHunt-v0", env_size=5)
+
+
+def test_occupancy(base_environment: BaseTreasureHuntEnv):
+    """Test that the occupancy map follows the monsters."""
+    base_environment.monster_positions = [45, 55]
+    assert base_environment._is_on_monster(45) and base_environment._is_on_monster(55)
+    base_environment.monster_positions = (46, 55)
+    assert not base_environment._is_on_monster(45)
+    assert base_environment._occupied.sum() == 2
+    assert base_environment.monster_positions == (46, 55)
+
+
+@pytest.mark.parametrize("n_monsters", [2, BaseTreasureHuntEnv.VECTORIZED_MONSTER_COUNT])
+def test_occupancy_follows_moves(n_monsters):
+    """Test that monster moves, checked and applied in Python or with arrays, keep the
+    positions and the occupancy map in sync."""
+    env = make("RandomMonsterTreasureHunt-v0", env_size=10, n_monsters=n_monsters,
+               layout_pool_size=1000).unwrapped
+    env.reset(seed=0)
+    pooled = env._layout_pool.copy()
+    for action in np.random.default_rng(0).integers(0, 4, 300):
+        *_, terminated, _, _ = env.step(int(action))
+        if terminated:
+            env.reset()
+        positions = env.monster_positions
+        assert env._monster_array.tolist() == list(positions)
+        assert np.flatnonzero(env._occupied).tolist() == sorted(positions)
+        assert len(set(positions)) == n_monsters and env.treasure_position not in positions
+    # Moves update the monster array in place, never a layout it was set from
+    assert np.array_equal(env._layout_pool, pooled)
+
+
+@pytest.mark.parametrize("obs_mode", ["index", "array", "one_hot"])
+def test_observation_modes(obs_mode):
+    """Test that every observation mode encodes the same states as dict observations."""
+    dict_env = make("RandomMonsterTreasureHunt-v0", max_episode_steps=50)
+    # The passive checker warns about the reused buffers, which is their point
+    env = make("RandomMonsterTreasureHunt-v0", max_episode_steps=50, obs_mode=obs_mode,
+               disable_env_checker=True)
+    if obs_mode == "index":
+        # The checker compares observations kept across resets, which reused buffers overwrite
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            check_env(env.unwrapped, skip_render_check=True)
+    indexer = StateIndexer(dict_env.observation_space)
+    n_cells = env.unwrapped.ENV_SIZE**2
+
+    dict_obs, _ = dict_env.reset(seed=0)
+    obs, _ = env.reset(seed=0)
+    for action in np.random.default_rng(0).integers(0, 4, 200):
+        assert obs in env.observation_space
+        positions = [dict_obs["hero_position"], dict_obs["treasure_position"],
+                     *dict_obs["monster_positions"]]
+        if obs_mode == "index":
+            assert obs == indexer.index(dict_obs)
+        elif obs_mode == "array":
+            assert obs.tolist() == positions
+        else:
+            assert np.flatnonzero(obs).tolist() == [i * n_cells + pos for i, pos in enumerate(positions)]
+        dict_obs, _, terminated, truncated, _ = dict_env.step(action)
+        obs, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            dict_obs, _ = dict_env.reset()
+            obs, _ = env.reset()
+
+
+def test_observation_buffer_reuse():
+    """Test that the array observation modes update one buffer in place."""
+    env = BaseTreasureHuntEnv(obs_mode="array")
+    obs, _ = env.reset(seed=0)
+    assert env.step(1)[0] is obs and obs.dtype == np.int32
+
+    with pytest.raises(ValueError):
+        BaseTreasureHuntEnv(obs_mode="image")
+    with pytest.raises(ValueError):
+        BaseTreasureHuntEnv(env_size=50, n_monsters=10, obs_mode="index")
+
+
+def test_rgb_array_render():
+    """Test that rgb_array frames match the batched drawing and need no display."""
+    env = make("RandomMonsterTreasureHunt-v0", render_mode="rgb_array", max_episode_steps=50)
+    env.reset(seed=0)
+    unwrapped = env.unwrapped
+    frame = env.render()
+    assert frame.shape == (80, 80, 3) and tuple(frame[0, 0]) == HERO_COLOR
+    for action in np.random.default_rng(0).integers(0, 4, 100):
+        frame = env.render()
+        expected = render_frames(unwrapped.ENV_SIZE, unwrapped.RGB_CELL_SIZE, [unwrapped.hero_position],
+                                 [unwrapped.treasure_position], [unwrapped.monster_positions])[0]
+        assert np.array_equal(frame, expected)
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
@@ -0,0 +1,87 @@
+"""Tests for the BatchedTreasureHuntEnv vectorized environment."""
+import numpy as np
+import pytest
+import gymnasium as gym
+from gymnasium.vector import SyncVectorEnv
+
+from treasure_hunt.environment import BatchedTreasureHuntEnv, BatchedFixedTreasureHuntEnv
+from treasure_hunt.environment.monster_strategy import RandomMovementStrategy
+
+
+ENV_IDS = ["FixedTreasureHunt-v0", "StationaryMonsterTreasureHunt-v0",
+           "RandomMonsterTreasureHunt-v0"]
+
+
+def assert_same_obs(batched_obs, reference_obs):
+    """Check that two batched dict observations are identical."""
+    assert np.array_equal(batched_obs["hero_position"], reference_obs["hero_position"])
+    assert np.array_equal(batched_obs["treasure_position"], reference_obs["treasure_position"])
+    for batched, reference in zip(batched_obs["monster_positions"],
+                                  reference_obs["monster_positions"]):
+        assert np.array_equal(batched, reference)
+
+
+@pytest.mark.parametrize("env_id, kwargs", [(env_id, {}) for env_id in ENV_IDS] + [
+    # The fixed layout draws nothing on reset, so the random moves must line up too
+    ("FixedTreasureHunt-v0", {"monster_strategy": RandomMovementStrategy()})])
+def test_matches_scalar_envs(env_id, kwargs):
+    """Test that the batched env reproduces N scalar envs step for step."""
+    num_envs, max_episode_steps = 8, 30
+    batched = gym.make_vec(env_id, num_envs=num_envs, max_episode_steps=max_episode_steps, **kwargs)
+    reference = SyncVectorEnv([
+        lambda: gym.make(env_id, max_episode_steps=max_episode_steps, **kwargs)
+    ] * num_envs)
+
+    batched_obs, _ = batched.reset(seed=123)
+    reference_obs, _ = reference.reset(seed=123)
+    assert_same_obs(batched_obs, reference_obs)
+
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        actions = rng.integers(0, 4, size=num_envs)
+        batched_obs, rewards, terminated, truncated, _ = batched.step(actions)
+        reference_obs, ref_rewards, ref_terminated, ref_truncated, _ = reference.step(actions)
+        assert_same_obs(batched_obs, reference_obs)
+        assert np.array_equal(rewards, ref_rewards)
+        assert np.array_equal(terminated, ref_terminated)
+        assert np.array_equal(truncated, ref_truncated)
+
+
+def test_make_vec_uses_batched_env():
+    """Test that the registered environments vectorize to the native implementation."""
+    assert isinstance(gym.make_vec("RandomMonsterTreasureHunt-v0", num_envs=2).unwrapped,
+                      BatchedTreasureHuntEnv)
+    assert isinstance(gym.make_vec("FixedTreasureHunt-v0", num_envs=2).unwrapped,
+                      BatchedFixedTreasureHuntEnv)
+
+
+def test_autoreset():
+    """Test that finished sub-envs are reset on the following step."""
+    env = BatchedFixedTreasureHuntEnv(num_envs=2)
+    env.reset(seed=0)
+    env.hero_positions[0] = 89  # Next to the treasure
+    _, rewards, terminated, _, _ = env.step(np.array([1, 3]))
+    assert rewards[0] == env.single_env_class.TREASURE_REWARD
+    assert terminated.tolist() == [True, False]
+
+    obs, rewards, terminated, _, _ = env.step(np.array([1, 3]))
+    assert obs["hero_position"][0] == 0
+    assert rewards[0] == 0
+    assert not terminated[0]
+
+
+def test_invalid_action():
+    """Test that invalid action values raise an error."""
+    env = BatchedTreasureHuntEnv(num_envs=2)
+    env.reset(seed=0)
+    with pytest.raises(ValueError):
+        env.step(np.array([0, 5]))
+
+
+def test_grid_size_and_monster_count():
+    """Test that the batched env takes the grid size and number of monsters."""
+    envs = gym.make_vec("RandomMonsterTreasureHunt-v0", num_envs=3, env_size=20, n_monsters=7)
+    obs, _ = envs.reset(seed=0)
+    assert len(obs["monster_positions"]) == 7
+    assert np.all(obs["treasure_position"] == 399)
+    envs.step(np.zeros(3, dtype=np.int64))
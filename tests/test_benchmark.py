@@ -0,0 +1,55 @@
+"""Tests for the benchmark suite."""
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from treasure_hunt.benchmark import benchmarks, compare, environment_ids, run_benchmarks
+
+
+def test_benchmark_names():
+    """Test that every registered environment and hot path has a benchmark."""
+    assert "RandomMonsterTreasureHunt-v0" in environment_ids()
+    names = benchmarks().keys()
+    for env_id in environment_ids():
+        assert f"env_step[{env_id}]" in names and f"env_reset[{env_id}]" in names
+    assert {"predict", "q_update", "save", "load", "near_sighted_reduce"} <= names
+
+
+def test_run_benchmarks():
+    """Test that selected benchmarks run and report their throughput."""
+    results = run_benchmarks(["oblivious_reduce", "q_update"], min_time=0.001, repeat=2,
+                             verbose=False)
+    # Names are matched by substring
+    assert results["results"].keys() == {"oblivious_reduce", "oblivious_reduce_batch", "q_update"}
+    assert all(result["ops_per_second"] > 0 for result in results["results"].values())
+
+
+# Scalar steps with stationary monsters run at about 300k/s on one core, and fell to 40k/s when
+# every step validated and re-applied the unchanged monster positions with arrays
+MIN_STATIONARY_STEPS_PER_SECOND = 100_000
+
+
+@pytest.mark.parametrize("env_id", ["FixedTreasureHunt-v0", "StationaryMonsterTreasureHunt-v0"])
+def test_stationary_step_throughput(env_id):
+    """Test that scalar steps do no per-step work when the monsters do not move."""
+    results = run_benchmarks([f"env_step[{env_id}]"], min_time=0.05, repeat=3, verbose=False)
+    assert results["results"][f"env_step[{env_id}]"]["ops_per_second"] > MIN_STATIONARY_STEPS_PER_SECOND
+
+
+def test_file_benchmarks_clean_up(tmp_path: Path, monkeypatch):
+    """Test that the save and load benchmarks remove their temporary files."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    results = run_benchmarks(["save", "load"], min_time=0.001, repeat=1, verbose=False)
+    assert results["results"].keys() == {"save", "load"}
+    assert not list(tmp_path.iterdir())
+
+
+def test_compare():
+    """Test that only slowdowns beyond the threshold are flagged."""
+    def results(**throughputs):
+        return {"results": {name: {"ops_per_second": value} for name, value in throughputs.items()}}
+
+    rows = compare(results(step=100, reset=100, load=100), results(step=95, reset=80, save=1),
+                   threshold=0.1)
+    assert [(row["name"], row["regression"]) for row in rows] == [("reset", True), ("step", False)]
@@ -0,0 +1,75 @@
+"""Tests for the CanonicalTreasureWrapper and the grid symmetry tables."""
+import numpy as np
+import pytest
+from gymnasium.envs import make
+
+from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.environment import CanonicalTreasureWrapper, hero_transition_tables, symmetry_tables
+from treasure_hunt.environment.canonical_treasure_wrapper import SYMMETRY_GROUPS
+
+
+def test_symmetry_tables():
+    """Test that every symmetry permutes the cells and commutes with the hero moves."""
+    next_position, _ = hero_transition_tables(5)
+    positions, actions = symmetry_tables(5, SYMMETRY_GROUPS["dihedral"])
+    assert positions.shape == (8, 25)
+    for table, action_table in zip(positions, actions):
+        assert sorted(table) == list(range(25))
+        assert sorted(action_table) == [0, 1, 2, 3]
+        assert (next_position[table[:, None], action_table[None, :]] == table[next_position]).all()
+
+
+@pytest.mark.parametrize("symmetries", list(SYMMETRY_GROUPS))
+def test_canonical_observations(symmetries):
+    """Test that all the images of a state share its canonical observation, with sorted monsters."""
+    wrapper = CanonicalTreasureWrapper(make("RandomMonsterTreasureHunt-v0"), symmetries)
+    positions, _ = symmetry_tables(10, SYMMETRY_GROUPS[symmetries])
+    rng = np.random.default_rng(0)
+    observations = set()
+    for hero, *monsters in rng.integers(0, 99, size=(50, 3)).tolist():
+        canonical, _ = wrapper.canonicalize(
+            {"hero_position": hero, "treasure_position": 99, "monster_positions": tuple(monsters)})
+        assert list(canonical["monster_positions"]) == sorted(canonical["monster_positions"])
+        for table in positions:
+            for order in (1, -1):
+                image = {"hero_position": table[hero], "treasure_position": table[99],
+                         "monster_positions": tuple(table[monsters].tolist())[::order]}
+                assert wrapper.canonicalize(image)[0] == canonical
+                observations.add(tuple(image.values()))
+    assert len(observations) > 50 * len(positions)
+
+
+def test_actions_in_canonical_frame():
+    """Test that actions move the hero as they would in the frame of the canonical observation."""
+    env = make("FixedTreasureHunt-v0")
+    wrapper = CanonicalTreasureWrapper(env, "dihedral")
+    positions, _ = symmetry_tables(10, SYMMETRY_GROUPS["dihedral"])
+    next_position, _ = hero_transition_tables(10)
+    rng = np.random.default_rng(0)
+    obs, _ = wrapper.reset(seed=0)
+    transforms = set()
+    for _ in range(200):
+        action = int(rng.integers(4))
+        transform = wrapper._transform  # pylint: disable=protected-access
+        transforms.add(transform)
+        expected_hero = next_position[obs["hero_position"], action]
+        obs, _, terminated, truncated, _ = wrapper.step(action)
+        assert positions[transform][env.unwrapped.hero_position] == expected_hero
+        assert obs == wrapper.canonicalize(env.unwrapped._get_obs())[0]  # pylint: disable=protected-access
+        if terminated or truncated:
+            obs, _ = wrapper.reset()
+    assert len(transforms) > 1
+
+
+def test_agent_with_symmetries(tmp_path):
+    """Test that tabular agents learn through the wrapper and check the symmetries of saved tables."""
+    wrapper = CanonicalTreasureWrapper(make("RandomMonsterTreasureHunt-v0", max_episode_steps=50), "dihedral")
+    agent = TabularQLearner(wrapper)
+    agent.learn(total_timesteps=200)
+    agent.save(tmp_path / "agent")
+    assert all(list(state[2]) == sorted(state[2]) for state in agent.q_table)
+
+    with pytest.raises(ValueError, match="symmetries"):
+        TabularQLearner(make("RandomMonsterTreasureHunt-v0")).load(tmp_path / "agent")
+    with pytest.raises(ValueError):
+        CanonicalTreasureWrapper(make("RandomMonsterTreasureHunt-v0", obs_mode="index"))
@@ -0,0 +1,48 @@
+"""Tests for the environment reducers."""
+import numpy as np
+import pytest
+
+from treasure_hunt.agent.env_reducer import NearSightedReducer, ObliviousReducer
+from treasure_hunt.agent.env_reducer.near_sighted import MAX_CACHED_TABLES, near_sighted_tables
+from treasure_hunt.environment import BaseTreasureHuntEnv
+
+# pylint: disable=W0212  # We're fine with using protected members in tests.
+
+
+def test_near_sighted_lookup_tables():
+    """Test that the lookup tables discretize every relative monster position."""
+    env = BaseTreasureHuntEnv(env_size=7, n_monsters=1)
+    reducer = NearSightedReducer(env, focus_distance=1)
+
+    def discretize(coord):
+        return -1 if coord < -1 else 1 if coord > 1 else 0
+
+    for hero in range(49):
+        for monster in range(49):
+            obs = reducer.reduce_observation(
+                {"hero_position": hero, "treasure_position": 48, "monster_positions": (monster,)})
+            (monster_row, monster_col), (hero_row, hero_col) = divmod(monster, 7), divmod(hero, 7)
+            assert obs["monster_positions"] == (
+                (discretize(monster_row - hero_row), discretize(monster_col - hero_col)),)
+    assert NearSightedReducer(env, focus_distance=1)._rows is reducer._rows
+
+
+def test_near_sighted_tables_cache_is_bounded():
+    """Test that reducers over many grid sizes and focus distances keep a bounded number of tables."""
+    near_sighted_tables.cache_clear()
+    for focus_distance in range(2 * MAX_CACHED_TABLES):
+        NearSightedReducer(BaseTreasureHuntEnv(env_size=5, n_monsters=1), focus_distance=focus_distance)
+    assert near_sighted_tables.cache_info().currsize == MAX_CACHED_TABLES
+
+
+@pytest.mark.parametrize("reducer_class", [NearSightedReducer, ObliviousReducer])
+def test_reduce_batch(reducer_class):
+    """Test that batched reduction matches indexing the reduced observations one by one."""
+    env = BaseTreasureHuntEnv(env_size=12, n_monsters=3)
+    reducer = reducer_class(env)
+    observations = np.random.default_rng(0).integers(0, 144, size=(200, 5))
+    expected = [reducer.state_indexer.index(reducer.reduce_observation({
+        "hero_position": hero, "treasure_position": treasure, "monster_positions": tuple(monsters),
+    })) for hero, treasure, *monsters in observations.tolist()]
+    assert reducer.reduce_batch(observations).tolist() == expected
+    assert reducer.reduce_batch(observations[:0]).shape == (0,)
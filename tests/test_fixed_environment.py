@@ -1,6 +1,7 @@
 """Tests for the FixedTreasureHuntEnv environment."""
 import pytest
 from treasure_hunt.environment import FixedTreasureHuntEnv
+from treasure_hunt.environment.monster_strategy import RandomMovementStrategy
 from .test_base_env import TestBaseTreasureHuntEnv
 
 # pylint: disable=W0611  # Unused import
@@ -28,3 +29,9 @@ class TestFixedTreasureHuntEnv(TestBaseTreasureHuntEnv):
         assert obs["hero_position"] == environment.FIXED_LAYOUT["hero_position"]
         assert obs["treasure_position"] == environment.FIXED_LAYOUT["treasure_position"]
         assert obs["monster_positions"] == environment.FIXED_LAYOUT["monster_positions"]
+
+    def test_deterministic(self, environment):
+        """Test that the fixed layout with stationary monsters is deterministic."""
+        assert environment.deterministic
+        environment.monster_strategy = RandomMovementStrategy()
+        assert not environment.deterministic
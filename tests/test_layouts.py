@@ -0,0 +1,44 @@
+"""Tests for the monster layout sampling."""
+from collections import Counter
+
+import numpy as np
+import pytest
+from gymnasium import make
+
+from treasure_hunt.environment.layouts import sample_layouts
+
+
+# Single sparse, batched sparse and crowded sampling
+@pytest.mark.parametrize("n_monsters, n_layouts", [(2, 1), (2, 20000), (6, 20000)])
+def test_layouts_are_valid_and_uniform(n_monsters, n_layouts):
+    """Test that layouts have distinct, free cells and every set is equally likely."""
+    rng = np.random.default_rng(0)
+    layouts = np.concatenate([sample_layouts(rng, 9, n_monsters, (0, 8), n_layouts=n_layouts)
+                              for _ in range(20000 // n_layouts)])
+    assert layouts.shape == (20000, n_monsters)
+    assert not np.isin(layouts, [0, 8]).any()
+    assert all(len(set(layout)) == n_monsters for layout in layouts.tolist())
+
+    counts = Counter(frozenset(layout) for layout in layouts.tolist())
+    expected = 20000 / len(counts)
+    assert len(counts) == {2: 21, 6: 7}[n_monsters]  # 7 choose n_monsters
+    assert all(abs(count - expected) < 0.15 * expected for count in counts.values())
+
+
+def test_too_many_monsters():
+    """Test that impossible layouts are refused."""
+    with pytest.raises(ValueError):
+        sample_layouts(np.random.default_rng(0), 9, 8, (0, 8))
+
+
+@pytest.mark.parametrize("layout_pool_size", [0, 16])
+def test_seeded_resets(layout_pool_size):
+    """Test that seeded resets are reproducible, with and without a layout pool."""
+    env = make("RandomMonsterTreasureHunt-v0", n_monsters=10, layout_pool_size=layout_pool_size)
+    runs = []
+    for _ in range(2):
+        first, _ = env.reset(seed=3)
+        runs.append([first["monster_positions"]]
+                    + [env.reset()[0]["monster_positions"] for _ in range(40)])
+    assert runs[0] == runs[1]
+    assert len(set(runs[0])) > 1
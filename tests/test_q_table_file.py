@@ -0,0 +1,128 @@
+"""Tests for the memory-mapped Q-table file format."""
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from treasure_hunt.agent import TabularQLearner, SimplifierQLearner
+from treasure_hunt.agent.env_reducer import NearSightedReducer
+from treasure_hunt.agent.q_table_file import (MappedQTable, is_q_table_file, load_q_table,
+                                              read_header)
+from treasure_hunt.agent.state_keys import flatten_key, key_structure, unflatten_key
+from treasure_hunt.convert_checkpoints import convert_results
+
+# pylint: disable=W0212  # We're fine with using protected members in tests.
+# pylint: disable=W0611  # Unused import
+from .fixtures import fixture_fixed_environment, fixture_q_learner, fixture_dense_q_learner
+
+LEGACY_CHECKPOINT = Path(__file__).parent / "data" / "legacy_tabular_q_agent"
+
+
+def test_key_round_trip():
+    """Test that nested serialized states survive flattening."""
+    key = (3, 99, ((-1, 0), (1, 1)))
+    values = flatten_key(key)
+    assert values == [3, 99, -1, 0, 1, 1]
+    assert unflatten_key(np.array(values), key_structure(key)) == key
+    assert unflatten_key(flatten_key(42), key_structure(42)) == 42
+
+
+def test_lazy_lookup(q_learner: TabularQLearner, tmp_path: Path):
+    """Test that a loaded Q-table finds saved rows on demand and defaults to zeros."""
+    states = [(5, 99, (45, 55)), (0, 99, (45, 55)), (0, 99, (44, 55))]
+    for i, state in enumerate(states):
+        q_learner.q_table[state] = np.full(4, i, dtype=np.float32)
+    q_learner.save(tmp_path / "agent")
+
+    header, q_table = load_q_table(tmp_path / "agent")
+    assert isinstance(q_table, MappedQTable)
+    assert header["n_rows"] == 3 and not q_table.rows
+    assert np.array_equal(q_table[states[1]], np.full(4, 1))
+    assert list(q_table.rows) == [states[1]]
+    assert (1, 2, (3, 4)) not in q_table
+    assert np.array_equal(q_table[(1, 2, (3, 4))], np.zeros(4))
+    assert len(q_table) == 4 and set(q_table) == {*states, (1, 2, (3, 4))}
+
+
+def test_metadata(q_learner: TabularQLearner, tmp_path: Path):
+    """Test that the reducer and hyperparameters are saved, and the exploration rate restored."""
+    q_learner.exploration_rate = 0.25
+    q_learner.save(tmp_path / "agent")
+    header = read_header(tmp_path / "agent")
+    assert header["backend"] == "dict" and header["reducer"] is None
+    assert header["hyperparameters"]["exploration_rate"] == 0.25
+
+    new_agent = TabularQLearner(q_learner.env)
+    new_agent.load(tmp_path / "agent")
+    assert new_agent.exploration_rate == 0.25
+
+    reduced_agent = SimplifierQLearner(q_learner.env, NearSightedReducer(q_learner.env))
+    with pytest.raises(ValueError):
+        reduced_agent.load(tmp_path / "agent")
+
+
+def test_update_after_load(q_learner: TabularQLearner, tmp_path: Path):
+    """Test that a loaded Q-table can keep learning and be saved over its own file."""
+    state = (98, 99, (45, 55))  # Out of reach of the short training
+    q_learner.q_table[state] = np.array([1, 2, 3, 4])
+    q_learner.save(tmp_path / "agent")
+    q_learner.load(tmp_path / "agent")
+
+    q_learner.q_table[state][0] += 10
+    q_learner.learn(total_timesteps=10)
+    q_learner.save(tmp_path / "agent")
+    new_agent = TabularQLearner(q_learner.env)
+    new_agent.load(tmp_path / "agent")
+    assert new_agent.q_table[state][0] == 11
+    assert len(new_agent.q_table) == len(q_learner.q_table)
+
+
+def test_dense_memory_map(dense_q_learner: SimplifierQLearner, tmp_path: Path):
+    """Test that dense Q-tables are memory-mapped copy-on-write."""
+    dense_q_learner.q_table[42] = [1, 2, 3, 4]
+    dense_q_learner.save(tmp_path / "agent")
+    dense_q_learner.load(tmp_path / "agent")
+    assert isinstance(dense_q_learner.q_table, np.memmap)
+
+    dense_q_learner.q_table[42] = 0
+    _, q_table = load_q_table(tmp_path / "agent")
+    assert np.array_equal(q_table[42], [1, 2, 3, 4])
+
+
+def test_convert_legacy_checkpoints(tmp_path: Path):
+    """Test converting pickled dict and dense checkpoints found under a results folder."""
+    # Saved by the original TabularQLearner after learn(300) on FixedTreasureHunt-v0,
+    # with its stray hero position state 0 next to the observation tuples
+    legacy_q_table = np.load(LEGACY_CHECKPOINT, allow_pickle=True).item()
+    assert 0 in legacy_q_table
+    dict_path = tmp_path / "tabular_q" / "run" / "agent"
+    dense_path = tmp_path / "oblivious" / "run" / "agent"
+    broken_path = tmp_path / "near_sighted" / "run" / "agent"
+    for path in (dict_path, dense_path, broken_path):
+        path.parent.mkdir(parents=True)
+    shutil.copy(LEGACY_CHECKPOINT, dict_path)
+    with open(dense_path, 'wb') as f:
+        np.save(f, np.eye(5, 4, dtype=np.float32))
+    with open(broken_path, 'wb') as f:
+        f.write(b"\x93NUMPY truncated")
+
+    converted, failed = convert_results(tmp_path)
+    assert sorted(converted) == sorted([str(dict_path), str(dense_path)])
+    assert list(failed) == [str(broken_path)]
+    assert is_q_table_file(dict_path) and is_q_table_file(dense_path)
+    q_table = load_q_table(dict_path)[1]
+    assert len(q_table) == len(legacy_q_table) - 1 and 0 not in q_table
+    for state, row in legacy_q_table.items():
+        if state != 0:
+            assert np.array_equal(q_table[state], row)
+    assert np.array_equal(load_q_table(dense_path)[1], np.eye(5, 4))
+    assert convert_results(tmp_path) == ([], {str(broken_path): failed[str(broken_path)]})
+
+
+def test_rejects_legacy_files(q_learner: TabularQLearner, tmp_path: Path):
+    """Test that legacy pickled checkpoints are not unpickled by load."""
+    with open(tmp_path / "agent", 'wb') as f:
+        np.save(f, {(0, 99, (45, 55)): np.zeros(4)})
+    with pytest.raises(ValueError, match="convert_checkpoints"):
+        q_learner.load(tmp_path / "agent")
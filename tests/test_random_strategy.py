@@ -0,0 +1,70 @@
+"""Tests for the RandomMovementStrategy class and the batched monster movement API"""
+import numpy as np
+import pytest
+
+from treasure_hunt.environment import monster_neighbor_tables
+from treasure_hunt.environment.monster_strategy import (
+    MonsterMovementStrategy, RandomMovementStrategy)
+
+
+class ScalarOnlyStrategy(MonsterMovementStrategy):
+    """Custom strategy without a batched implementation: every monster moves right."""
+
+    def move_monsters(self, monster_positions, hero_position, env_size, rng):
+        return [(row, col + 1) for row, col in monster_positions]
+
+
+class TestRandomMovementStrategy:
+    """Tests for the RandomMovementStrategy class."""
+
+    @pytest.fixture
+    def strategy(self):
+        """Fixture to create an instance of RandomMovementStrategy."""
+        return RandomMovementStrategy()
+
+    def test_moves_to_neighbors(self, strategy):
+        """Test that monsters only move to an adjacent cell or stay."""
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            new_positions = strategy.move_monsters([(0, 0), (5, 5), (9, 9)], 0, 10, rng)
+            for (row, col), (new_row, new_col) in zip([(0, 0), (5, 5), (9, 9)], new_positions):
+                assert abs(row - new_row) + abs(col - new_col) <= 1
+                assert 0 <= new_row < 10 and 0 <= new_col < 10
+
+    def test_batch_matches_scalar(self, strategy):
+        """Test that each row of a batch draws like the scalar method with the same generator."""
+        positions = np.random.default_rng(1).integers(0, 100, size=(16, 3))
+        hero = np.zeros(16, dtype=np.int64)
+        batch_rngs = [np.random.default_rng(seed) for seed in range(16)]
+        scalar_rngs = [np.random.default_rng(seed) for seed in range(16)]
+        for _ in range(10):
+            proposed = strategy.move_monsters_batch(positions, hero, 10, batch_rngs)
+            for row, rng in enumerate(scalar_rngs):
+                expected = strategy.move_monsters(
+                    [divmod(int(pos), 10) for pos in positions[row]], 0, 10, rng)
+                assert [divmod(int(pos), 10) for pos in proposed[row]] == expected
+            positions = proposed
+
+    def test_batch_single_generator(self, strategy):
+        """Test that a shared generator gives valid moves for every row."""
+        neighbors, n_neighbors = monster_neighbor_tables(10)
+        positions = np.arange(100).reshape(50, 2)
+        proposed = strategy.move_monsters_batch(
+            positions, np.zeros(50, dtype=np.int64), 10, np.random.default_rng(0))
+        for position, new_position in zip(positions.ravel(), proposed.ravel()):
+            assert new_position in neighbors[position, :n_neighbors[position]]
+
+    def test_neighbor_tables(self):
+        """Test the neighbor tables on a corner, an edge and an inner cell."""
+        neighbors, n_neighbors = monster_neighbor_tables(10)
+        assert neighbors[0, :n_neighbors[0]].tolist() == [10, 1, 0]
+        assert neighbors[5, :n_neighbors[5]].tolist() == [15, 4, 6, 5]
+        assert neighbors[55, :n_neighbors[55]].tolist() == [45, 65, 54, 56, 55]
+
+
+def test_batch_fallback():
+    """Test that strategies without a batched implementation fall back to move_monsters."""
+    proposed = ScalarOnlyStrategy().move_monsters_batch(
+        np.array([[0, 11], [8, 9]]), np.zeros(2, dtype=np.int64), 10, None)
+    # Moving right from the last column is off the grid
+    assert proposed.tolist() == [[1, 12], [9, -1]]
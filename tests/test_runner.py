@@ -0,0 +1,186 @@
+"""Tests for the RLRunner classes."""
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pytest
+from gymnasium.envs import make
+
+from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.sequential import SequentialTest
+from treasure_hunt.stopping import TargetReward
+from treasure_hunt.utils import AdaptiveRLRunner, RLRunner
+
+
+@pytest.fixture(name="random_environment")
+def fixture_random_environment():
+    """Fixture to create a short random monsters environment."""
+    return make("RandomMonsterTreasureHunt-v0", max_episode_steps=20)
+
+
+def make_runner(env, tmp_path, **kwargs):
+    """Create a runner with an untrained tabular agent."""
+    return AdaptiveRLRunner(TabularQLearner(env), env, verbose=False, results_root=tmp_path,
+                            **kwargs)
+
+
+def test_final_test_episodes(random_environment, tmp_path: Path):
+    """Test that the final test plays final_test_episodes episodes."""
+    runner = make_runner(random_environment, tmp_path, final_test_episodes=7, eval_episodes=2)
+    runner.test_agent(final_test=True)
+    assert len(runner.last_rewards) == 7
+    runner.test_agent()
+    assert len(runner.last_rewards) == 2
+    assert len(runner.reward_history) == 2
+
+
+@pytest.mark.timeout(30)  # Every spawned worker imports the package
+def test_parallel_final_test(random_environment, tmp_path: Path):
+    """Test that the parallel final test is reproducible for a given seed and worker count,
+    and that telemetry does not keep the agent from being sent to the workers."""
+    results = []
+    for telemetry in (False, True):
+        runner = make_runner(random_environment, tmp_path, final_test_episodes=21,
+                             final_test_workers=3, seed=5, telemetry=telemetry)
+        runner.test_agent(final_test=True)
+        assert len(runner.last_rewards) == 21
+        results.append(runner.last_rewards)
+    assert results[0] == results[1]
+
+
+def test_sequential_evaluation(random_environment, tmp_path: Path):
+    """Test that evaluations stop once the sequential test is done, within the episode bounds."""
+    runner = make_runner(random_environment, tmp_path, final_test_episodes=40, eval_episodes=2,
+                         sequential_test=SequentialTest(half_width=np.inf, min_episodes=4, max_episodes=8))
+    runner.test_agent()
+    assert len(runner.last_rewards) == 4
+    runner.test_agent(final_test=True)
+    assert len(runner.last_rewards) == 4
+
+    runner.sequential_test.half_width = 0
+    for final_test, max_episodes in ((False, 8), (True, 40)):
+        runner.test_agent(final_test=final_test)
+        # Only identical rewards give a zero-width interval
+        assert len(runner.last_rewards) == max_episodes or np.var(runner.last_rewards) == 0
+
+
+def test_deterministic_evaluation(tmp_path: Path):
+    """Test that a deterministic policy on a deterministic env is evaluated once per policy."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=20)
+    runner = make_runner(env, tmp_path, final_test_episodes=50, eval_episodes=5)
+    runner.test_agent(final_test=True)
+    assert len(runner.last_rewards) == 1
+    assert len(runner.evaluation_cache) == 1
+
+    # An unchanged policy is not played again
+    policy_key = runner.agent.greedy_policy_key()
+    runner.evaluation_cache[policy_key] = 123.0
+    runner.test_agent()
+    assert runner.reward_history[-1] == 123.0
+
+    state = runner.agent._serialize_state(env.reset()[0])
+    runner.agent._update_q_value(state, 2, 10.0, state)
+    runner.test_agent()
+    assert len(runner.evaluation_cache) == 2
+    assert runner.reward_history[-1] != 123.0
+
+
+def test_runner_results_root(random_environment, tmp_path: Path):
+    """Test that results are saved under the results root."""
+    runner = RLRunner(TabularQLearner(random_environment), random_environment,
+                      total_epochs=1, eval_interval=10, final_test_episodes=1,
+                      verbose=False, results_root=tmp_path)
+    runner.train_agent()
+    runner.test_agent(final_test=True)
+    runner.save_results()
+    assert (Path(runner.results_dir) / 'mean_reward.txt').is_file()
+    assert Path(runner.results_dir).parent.parent == tmp_path
+
+
+def test_checkpoint_and_resume(random_environment, tmp_path: Path):
+    """Test that a resumed run continues exactly where an uninterrupted run would be."""
+    def make_seeded_runner(**kwargs):
+        return make_runner(random_environment, tmp_path, total_epochs=4, eval_interval=50,
+                           seed=3, checkpoint_epochs=2, **kwargs)
+
+    # The runner's seed only seeds the environment
+    np.random.seed(0)
+    random_environment.action_space.seed(0)
+    uninterrupted = make_seeded_runner(experiment_name="uninterrupted")
+    uninterrupted.train_agent()
+
+    np.random.seed(0)
+    random_environment.action_space.seed(0)
+    interrupted = make_seeded_runner(experiment_name="interrupted")
+    interrupted.total_epochs = 3  # Killed during the fourth epoch
+    interrupted.train_agent()
+    assert json.loads((Path(interrupted.results_dir) / 'checkpoint.json').read_text())[
+        'completed_epochs'] == 2
+
+    np.random.seed(1)
+    resumed = make_seeded_runner(experiment_name="resumed")
+    resumed.resume(interrupted.results_dir)
+    assert resumed.completed_epochs == 2
+    resumed.train_agent()
+    assert resumed.reward_history == uninterrupted.reward_history
+    assert resumed.wallclock_history[:2] == interrupted.wallclock_history[:2]
+    assert resumed.eval_episodes == uninterrupted.eval_episodes
+
+    resumed.save_results()
+    saved_rewards = np.loadtxt(Path(interrupted.results_dir) / 'reward_history.csv')
+    assert saved_rewards.tolist() == resumed.reward_history
+    assert os.listdir(Path(interrupted.results_dir) / 'checkpoint') == ['agent_epoch4']
+
+
+@pytest.mark.timeout(30)  # Every spawned worker imports the package
+def test_resume_then_parallel_final_test(random_environment, tmp_path: Path):
+    """Test that the workers of a parallel final test get the Q-table of a resumed agent,
+    even though it was mapped from a checkpoint file deleted since."""
+    def make_checkpointing_runner(**kwargs):
+        return make_runner(random_environment, tmp_path, total_epochs=2, eval_interval=50,
+                           checkpoint_epochs=1, final_test_episodes=6, final_test_workers=2,
+                           seed=1, **kwargs)
+
+    interrupted = make_checkpointing_runner(experiment_name="interrupted")
+    interrupted.train_agent()
+    resumed = make_checkpointing_runner(experiment_name="resumed")
+    resumed.resume(interrupted.results_dir)
+    mapped_path = resumed.agent.q_table.path
+    resumed.total_epochs = 3
+    resumed.train_agent()
+    assert not os.path.exists(mapped_path)
+    resumed.test_agent(final_test=True)
+    assert len(resumed.last_rewards) == 6
+
+
+def test_record_episodes(random_environment, tmp_path: Path):
+    """Test that the first evaluation episodes are recorded, batched across evaluations."""
+    runner = make_runner(random_environment, tmp_path, total_epochs=2, eval_interval=10,
+                         eval_episodes=3, final_test_episodes=3, record_episodes=2)
+    runner.train_agent()
+    assert not runner.recorder.files  # Still batching
+    runner.test_agent(final_test=True)
+
+    assert runner.recorder.files == [os.path.join(runner.results_dir, 'episodes', 'episodes_00000.npz')]
+    with np.load(runner.recorder.files[0]) as data:
+        frames, episode_starts = data["frames"], data["episode_starts"]
+    assert len(episode_starts) == 6 and episode_starts[0] == 0
+    assert frames.shape[1:] == (40, 40, 3) and frames.dtype == np.uint8
+    assert len(frames) <= 6 * 21
+
+
+def test_early_stopping(random_environment, tmp_path: Path):
+    """Test that a stopping rule ends training and is recorded in the results."""
+    runner = make_runner(random_environment, tmp_path, total_epochs=10, eval_interval=10,
+                         final_test_episodes=1, adapt_window=2,
+                         stopping_rules=[TargetReward(-np.inf)])
+    runner.train_agent()
+    assert runner.completed_epochs == 2
+    runner.train_agent()  # Stopped runs do not continue
+    assert runner.completed_epochs == 2
+
+    runner.test_agent(final_test=True)
+    runner.save_results()
+    early_stop = json.loads((Path(runner.results_dir) / 'early_stop.json').read_text())
+    assert early_stop["epoch"] == 2 and early_stop["total_epochs"] == 10
+    assert "reached the target" in early_stop["reason"]
@@ -0,0 +1,38 @@
+"""Tests for the successive halving hyperparameter search."""
+import csv
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from treasure_hunt.search import SEARCH_SPACES, sample_hyperparameters, successive_halving
+
+
+def test_sample_hyperparameters():
+    """Test that sampled configurations cover the search space within its bounds."""
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        config = sample_hyperparameters("near_sighted", rng)
+        assert set(config) == set(SEARCH_SPACES["near_sighted"])
+        assert 0.01 <= config["learning_rate"] <= 0.5
+        assert 0.9 <= config["discount_factor"] <= 0.999
+        assert 0.99 <= config["exploration_decay"] < 1
+        assert 1 <= config["focus_distance"] <= 4
+    assert "net_arch" in sample_hyperparameters("DQN", rng)
+
+
+def test_successive_halving(tmp_path: Path):
+    """Test that the best trials continue for more epochs and the leaderboard ranks them first."""
+    leaderboard = successive_halving("near_sighted", "fixed", n_trials=4, min_epochs=1, eta=2,
+                                     timesteps=10, workers=1, results_root=tmp_path)
+
+    assert [trial["epochs"] for trial in leaderboard] == [4, 2, 1, 1]
+    assert [trial["rung"] for trial in leaderboard] == [2, 1, 0, 0]
+    assert leaderboard[2]["score"] >= leaderboard[3]["score"]
+    assert all(os.path.isfile(os.path.join(trial["results_dir"], 'checkpoint.json')) for trial in leaderboard)
+
+    with open(tmp_path / "search_near_sighted_fixed_leaderboard.csv", encoding='utf8') as f:
+        rows = list(csv.DictReader(f))
+    assert [int(row["trial"]) for row in rows] == [trial["trial"] for trial in leaderboard]
+    assert json.loads(rows[0]["hyperparameters"]) == leaderboard[0]["hyperparameters"]
@@ -0,0 +1,38 @@
+"""Tests for the sequential test of evaluations."""
+import numpy as np
+import pytest
+
+from treasure_hunt.sequential import SequentialTest
+
+
+def test_welford_statistics():
+    """Test that the running mean and variance match the batch ones."""
+    rewards = np.random.default_rng(0).normal(10, 3, 50)
+    test = SequentialTest(half_width=1)
+    for reward in rewards:
+        test.update(reward)
+    assert test.mean == pytest.approx(rewards.mean())
+    assert test.variance == pytest.approx(rewards.var(ddof=1))
+    assert test.interval_half_width == pytest.approx(1.96 * rewards.std(ddof=1) / np.sqrt(50), rel=1e-3)
+
+
+def test_done():
+    """Test that the test is done after min_episodes once the interval is narrow enough."""
+    test = SequentialTest(half_width=1, min_episodes=3)
+    test.update(5)
+    test.update(5)
+    assert not test.done
+    test.update(5)
+    assert test.done
+    test.update(100)
+    assert not test.done
+    test.reset()
+    assert test.count == 0 and not test.done
+
+
+def test_shard():
+    """Test that shards tolerate wider intervals and fewer episodes."""
+    shard = SequentialTest(half_width=1, min_episodes=10, max_episodes=50).shard(4)
+    assert shard.half_width == 2
+    assert shard.min_episodes == 3
+    assert shard.max_episodes == 50
@@ -0,0 +1,55 @@
+"""Tests for the StateIndexer class."""
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from treasure_hunt.agent.state_indexer import StateIndexer
+from treasure_hunt.agent.env_reducer import NearSightedReducer
+from treasure_hunt.environment import FixedTreasureHuntEnv
+
+# pylint: disable=W0611  # Unused import
+from .fixtures import fixture_fixed_environment
+
+
+def test_environment_space(fixed_environment: FixedTreasureHuntEnv):
+    """Test that every observation of the environment gets a distinct index."""
+    indexer = StateIndexer(fixed_environment.observation_space)
+    assert indexer.n_states == 100**4
+
+    obs = {"hero_position": 1, "treasure_position": 2, "monster_positions": (3, 4)}
+    # Dict spaces are ordered by key: hero, monsters, treasure
+    assert indexer.flatten(obs) == [1, 3, 4, 2]
+    assert indexer.index(obs) == ((1 * 100 + 3) * 100 + 4) * 100 + 2
+    assert indexer.unindex(indexer.index(obs)) == [1, 3, 4, 2]
+
+
+def test_index_batch(fixed_environment: FixedTreasureHuntEnv):
+    """Test that batched indexing matches the scalar one."""
+    indexer = StateIndexer(fixed_environment.observation_space)
+    values = np.random.default_rng(0).integers(0, 100, size=(20, 4))
+    expected = [indexer.index({"hero_position": h, "monster_positions": (m1, m2),
+                               "treasure_position": t}) for h, m1, m2, t in values]
+    assert indexer.index_batch(values).tolist() == expected
+
+
+def test_near_sighted_space(fixed_environment: FixedTreasureHuntEnv):
+    """Test indexing of reduced observations with negative values."""
+    reducer = NearSightedReducer(fixed_environment)
+    indexer = StateIndexer(reducer.observation_space)
+    assert indexer.n_states == 100 * 100 * 9**2
+
+    seen = set()
+    for hero in range(100):
+        obs = reducer.reduce_observation(
+            {"hero_position": hero, "treasure_position": 99, "monster_positions": (45, 55)})
+        assert reducer.observation_space.contains(obs)
+        index = indexer.index(obs)
+        assert 0 <= index < indexer.n_states
+        seen.add(index)
+    assert len(seen) == 100
+
+
+def test_unsupported_space():
+    """Test that non-discrete spaces are rejected."""
+    with pytest.raises(TypeError):
+        StateIndexer(spaces.Box(0, 1))
@@ -0,0 +1,40 @@
+"""Tests for the early stopping rules."""
+import numpy as np
+
+from treasure_hunt.stopping import ImprovementBound, Plateau, TargetReward, make_stopping_rules
+
+
+def test_target_reward():
+    """Test that the target applies to the mean of the last window."""
+    rule = TargetReward(100)
+    assert rule.check([0, 200], window=3) is None
+    assert rule.check([0, 50, 200], window=3) is None
+    assert "reached the target" in rule.check([0, 100, 200], window=2)
+
+
+def test_plateau():
+    """Test that a plateau is detected only after patience epochs without improvement."""
+    rule = Plateau(patience=5, min_delta=1)
+    rising = list(range(20))
+    assert rule.check(rising, window=3) is None
+    flat = rising + [19] * 4
+    assert rule.check(flat, window=3) is None
+    assert "did not improve" in rule.check(flat + [19.5] * 4, window=3)
+
+
+def test_improvement_bound():
+    """Test that noisy flat rewards stop training while a clear trend does not."""
+    rng = np.random.default_rng(0)
+    rule = ImprovementBound(confidence=0.95, min_improvement=2)
+    flat = list(rng.normal(0, 1, 20))
+    assert rule.check(flat[:19], window=10) is None
+    assert "upper bound" in rule.check(flat, window=10)
+    trend = np.linspace(0, 20, 20) + rng.normal(0, 1, 20)
+    assert rule.check(list(trend), window=10) is None
+
+
+def test_make_stopping_rules():
+    """Test that only the set options become rules."""
+    assert not make_stopping_rules()
+    rules = make_stopping_rules(target_reward=150, min_improvement=1)
+    assert [type(rule) for rule in rules] == [TargetReward, ImprovementBound]
@@ -0,0 +1,48 @@
+"""Tests for the experiment sweep runner."""
+import csv
+import os
+from pathlib import Path
+
+from treasure_hunt.sweep import (SWEEP_AGENTS, THREAD_ENV_VARIABLES, experiment_name, find_results,
+                                 run_cell, run_sweep, worker_thread_variables)
+
+
+def test_run_cell(tmp_path: Path):
+    """Test that a cell trains, tests and saves its results."""
+    results_dir = run_cell("tabular_q", "fixed", 0, epochs=1, timesteps=10,
+                           final_test_episodes=2, results_root=tmp_path)
+    assert os.path.isfile(os.path.join(results_dir, 'mean_reward.txt'))
+    assert find_results(tmp_path, experiment_name("tabular_q", "fixed", 0)) == results_dir
+
+
+def test_skips_existing_results(tmp_path: Path):
+    """Test that cells with saved results are not run again but are summarized."""
+    run_dir = tmp_path / experiment_name("oblivious", "static", 3) / "20250101_000000"
+    run_dir.mkdir(parents=True)
+    (run_dir / 'mean_reward.txt').write_text("12.5", encoding='utf8')
+    (run_dir / 'wallclock_history.csv').write_text("1.0\n2.0\n", encoding='utf8')
+    (run_dir / 'early_stop.json').write_text('{"epoch": 2, "reason": "plateau"}', encoding='utf8')
+
+    summary_path = tmp_path / "summary.csv"
+    run_sweep(["oblivious"], ["static"], [3], epochs=1, timesteps=10,
+              results_root=tmp_path, summary_path=summary_path)
+
+    with open(summary_path, encoding='utf8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]["status"] == "existing"
+    assert float(rows[0]["final_mean_reward"]) == 12.5
+    assert int(rows[0]["epochs"]) == 2
+    assert rows[0]["stop_reason"] == "plateau"
+
+
+def test_worker_thread_variables(monkeypatch):
+    """Test that the thread variables are only set while workers start."""
+    monkeypatch.setenv("OMP_NUM_THREADS", "8")
+    for variable in THREAD_ENV_VARIABLES[1:]:
+        monkeypatch.delenv(variable, raising=False)
+    with worker_thread_variables(2):
+        assert all(os.environ[variable] == "2" for variable in THREAD_ENV_VARIABLES)
+    assert os.environ["OMP_NUM_THREADS"] == "8"
+    assert not any(variable in os.environ for variable in THREAD_ENV_VARIABLES[1:])
+    assert "value_iteration" not in SWEEP_AGENTS
@@ -2,12 +2,14 @@
 from pathlib import Path
 import numpy as np
 
-from treasure_hunt.environment import FixedTreasureHuntEnv
-from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.environment import BaseTreasureHuntEnv, FixedTreasureHuntEnv
+from treasure_hunt.agent import TabularQLearner, SimplifierQLearner
+from treasure_hunt.agent.env_reducer import NearSightedReducer, ObliviousReducer
 
 # pylint: disable=W0212  # We're fine with using protected members in tests.
 # pylint: disable=W0611  # Unused import
 from .fixtures import fixture_fixed_environment, fixture_q_learner, fixture_q_learner_with_limit
+from .fixtures import fixture_dense_q_learner
 
 
 def test_serialize_state(q_learner: TabularQLearner):
@@ -76,6 +78,44 @@ def test_predict(q_learner: TabularQLearner, fixed_environment: FixedTreasureHun
         fixed_environment.action_space.n), "Predicted action should be within the valid action space."
 
 
+def test_compile_policy(q_learner: TabularQLearner, fixed_environment: FixedTreasureHuntEnv):
+    """Test that the compiled policy is greedy, has a default action and leaves the Q-table untouched."""
+    obs, _ = fixed_environment.reset()
+    q_learner.q_table[q_learner._serialize_state(obs)] = np.array([0, 0, 5, 1])
+    q_learner.compile_policy()
+    assert q_learner.predict(obs, deterministic=True)[0] == 2
+
+    unseen = {"hero_position": 7, "treasure_position": 99, "monster_positions": (45, 55)}
+    assert q_learner.predict(unseen, deterministic=True)[0] == 0
+    assert len(q_learner.q_table) == 1
+
+    # An unchanged Q-table is not compiled again, nor hashed into a compiled policy
+    assert q_learner.compile_policy() is q_learner.compiled_policy
+    q_learner.compiled_policy = None
+    q_learner.greedy_policy_key()
+    assert q_learner.compiled_policy is None
+
+    # Learning discards the compiled policy
+    q_learner.compile_policy()
+    q_learner.learn(total_timesteps=5)
+    assert q_learner.compiled_policy is None
+
+
+def test_compile_loaded_policy(q_learner: TabularQLearner, tmp_path: Path):
+    """Test that compiling a memory-mapped Q-table does not copy its rows."""
+    state = (0, 99, (45, 55))
+    q_learner.q_table[state] = np.array([1, 2, 3, 4])
+    q_learner.q_table[(1, 99, (45, 55))] = np.array([4, 3, 2, 1])
+    q_learner.save(tmp_path / "q_table")
+
+    new_agent = TabularQLearner(q_learner.env)
+    new_agent.load(tmp_path / "q_table")
+    policy = new_agent.compile_policy()
+    assert policy.actions == {state: 3}
+    assert not new_agent.q_table.rows
+    assert policy.key() == q_learner.compile_policy().key()
+
+
 def test_save_and_load(q_learner: TabularQLearner, tmp_path: Path):
     """Test saving and loading the Q-table."""
     state = (0, 99, (45, 55))
@@ -93,3 +133,119 @@ def test_save_and_load(q_learner: TabularQLearner, tmp_path: Path):
     assert np.array_equal(new_agent.q_table[state], q_learner.q_table[state]), (
         "Loaded Q-table does not match the saved Q-table."
     )
+
+
+def test_dense_q_table(dense_q_learner: SimplifierQLearner):
+    """Test that the dense backend is a preallocated float32 array indexed by state."""
+    assert isinstance(dense_q_learner.q_table, np.ndarray)
+    assert dense_q_learner.q_table.shape == (100 * 100, 4)
+    assert dense_q_learner.q_table.dtype == np.float32
+
+    state = dense_q_learner._serialize_state(
+        {"hero_position": 3, "treasure_position": 99, "monster_positions": (45, 55)})
+    assert state == 3 * 100 + 99
+
+
+def test_dense_train(dense_q_learner: SimplifierQLearner):
+    """Test that training updates the dense Q-table in place."""
+    dense_q_learner.learn(total_timesteps=10)
+    assert np.any(dense_q_learner.q_table != 0)
+
+
+def test_dense_compile_policy(dense_q_learner: SimplifierQLearner):
+    """Test that the dense policy is an array of greedy actions indexed by state row."""
+    dense_q_learner.q_table[42] = [1, 2, 3, 4]
+    policy = dense_q_learner.compile_policy()
+    assert policy.actions.shape == (100 * 100,)
+    assert policy.actions[42] == 3
+    assert policy.actions[41] == 0
+
+
+def test_dense_save_and_load(dense_q_learner: SimplifierQLearner, tmp_path: Path):
+    """Test saving and loading the dense Q-table."""
+    dense_q_learner.q_table[42] = [1, 2, 3, 4]
+    save_path = tmp_path / "q_table.npy"
+    dense_q_learner.save(save_path)
+
+    new_agent = SimplifierQLearner(dense_q_learner.env, dense_q_learner.reducer,
+                                   q_table_backend="dense")
+    new_agent.load(save_path)
+    assert np.array_equal(new_agent.q_table, dense_q_learner.q_table)
+
+
+def test_native_observation_modes():
+    """Test that tabular agents learn from integer and array observations."""
+    for obs_mode in ("index", "array"):
+        env = FixedTreasureHuntEnv(obs_mode=obs_mode)
+        agent = TabularQLearner(env)
+        agent.learn(total_timesteps=100)
+        state = agent._serialize_state(env.reset()[0])
+        assert isinstance(state, int if obs_mode == "index" else tuple)
+        assert agent.predict(env.reset()[0])[0] in range(4)
+
+
+def _random_observations(n_observations, n_cells=100, n_monsters=2, seed=0):
+    """Observations as dicts and as a [hero, treasure, *monsters] array."""
+    array = np.random.default_rng(seed).integers(0, n_cells, size=(n_observations, 2 + n_monsters))
+    dicts = [{"hero_position": hero, "treasure_position": treasure, "monster_positions": tuple(monsters)}
+             for hero, treasure, *monsters in array.tolist()]
+    return dicts, array
+
+
+def test_batched_predict():
+    """Test that batched predictions match one by one predictions for every backend and reducer."""
+    small_env = BaseTreasureHuntEnv(env_size=4, n_monsters=1)
+    agents = [
+        (TabularQLearner(FixedTreasureHuntEnv()), 100, 2),
+        (TabularQLearner(small_env, q_table_backend="dense"), 16, 1),
+        (SimplifierQLearner(FixedTreasureHuntEnv(), ObliviousReducer(FixedTreasureHuntEnv()),
+                            q_table_backend="dense"), 100, 2),
+        (SimplifierQLearner(FixedTreasureHuntEnv(), NearSightedReducer(FixedTreasureHuntEnv())), 100, 2),
+    ]
+    for agent, n_cells, n_monsters in agents:
+        agent.learn(total_timesteps=300)
+        dicts, array = _random_observations(50, n_cells, n_monsters)
+        expected = [agent.predict(obs, deterministic=True)[0] for obs in dicts]
+        size = len(agent.q_table)
+        for batch in (dicts, array):
+            actions, _ = agent.predict(batch, deterministic=True)
+            assert actions.tolist() == expected
+        assert len(agent.q_table) == size or agent.q_table_backend == "dense"
+        agent.compile_policy()
+        assert agent.predict(array)[0].tolist() == expected
+        assert agent.predict(array[:0])[0].shape == (0,)
+
+
+def test_predict_array_observation():
+    """Test that an array observation is predicted like the equivalent dict observation."""
+    agents = [
+        TabularQLearner(FixedTreasureHuntEnv()),
+        TabularQLearner(BaseTreasureHuntEnv(env_size=4, n_monsters=1), q_table_backend="dense"),
+        SimplifierQLearner(FixedTreasureHuntEnv(), NearSightedReducer(FixedTreasureHuntEnv())),
+    ]
+    rng = np.random.default_rng(0)
+    for agent in agents:
+        dicts, array = _random_observations(50, agent.env.ENV_SIZE**2, agent.env.n_monsters)
+        for obs in dicts:
+            agent.q_table[agent._serialize_state(obs)] = rng.random(4).astype(np.float32)
+        expected = [agent.predict(obs)[0] for obs in dicts]
+        assert [agent.predict(row)[0] for row in array] == expected
+        agent.compile_policy()
+        assert [agent.predict(row)[0] for row in array] == expected
+
+
+def test_batched_predict_observation_modes():
+    """Test batches of integer and array observations, and exploration."""
+    for obs_mode in ("index", "array"):
+        env = FixedTreasureHuntEnv(obs_mode=obs_mode)
+        agent = TabularQLearner(env, exploration_rate=1.0)
+        agent.learn(total_timesteps=100)
+        observations = np.array([env.reset()[0].copy() if obs_mode == "array" else env.reset()[0]] * 20)
+        expected = agent.predict(observations[0], deterministic=True)[0]
+        assert (agent.predict(observations, deterministic=True)[0] == expected).all()
+
+        agent.exploration_rate = 1.0
+        explored = agent.predict(observations, deterministic=False)[0]
+        assert len(set(explored.tolist())) > 1
+        agent.exploration_rate = 0.0
+        assert (agent.predict(observations, deterministic=False)[0] == expected).all()
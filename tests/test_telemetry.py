@@ -0,0 +1,86 @@
+"""Tests for the training telemetry."""
+import json
+from pathlib import Path
+
+from gymnasium.envs import make
+from stable_baselines3 import DQN
+
+from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.main import make_agent
+from treasure_hunt.telemetry import LatencyHistogram, Telemetry
+from treasure_hunt.utils import RLRunner
+
+
+def test_latency_histogram():
+    """Test that durations land in power-of-two buckets."""
+    histogram = LatencyHistogram()
+    for duration_ns in (0, 1, 3, 1000, 1000):
+        histogram.observe(duration_ns)
+    assert histogram.counts[:3] == [1, 1, 1] and histogram.counts[10] == 2
+    assert histogram.count == 5 and histogram.total_ns == 2004
+    assert histogram.quantile(.5) == 2**2 / 1e9 and histogram.quantile(.99) == 2**10 / 1e9
+
+
+def test_collects_metrics():
+    """Test that steps, episodes, calls and Q-table size are counted."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=20)
+    agent = TabularQLearner(env)
+    telemetry = Telemetry(agent, env, labels={"experiment": "test"})
+    agent.learn(total_timesteps=50)
+    agent.predict(env.reset()[0])
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["env_steps"] == 50
+    assert telemetry.histograms["env_step"].count == 50
+    assert telemetry.histograms["td_update"].count == 50
+    assert telemetry.histograms["agent_predict"].count == 1
+    assert snapshot["episodes"] >= 2 and 0 <= snapshot["success_rate"] <= 1
+    assert snapshot["q_table_states"] == len(agent.q_table) > 0
+
+    telemetry.detach()
+    agent.learn(total_timesteps=5)
+    assert telemetry.env_steps == 50 and "step" not in vars(env)
+
+
+def test_runner_exports(tmp_path: Path):
+    """Test that the runner exports JSON lines and Prometheus metrics after every epoch."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=20)
+    runner = RLRunner(TabularQLearner(env), env, total_epochs=2, eval_interval=30,
+                      verbose=False, results_root=tmp_path, telemetry=True)
+    runner.train_agent()
+
+    lines = (Path(runner.results_dir) / "telemetry.jsonl").read_text().splitlines()
+    snapshots = [json.loads(line) for line in lines]
+    assert [snapshot["epoch"] for snapshot in snapshots] == [1, 2]
+    # Evaluation episodes are not training steps
+    assert snapshots[-1]["env_steps"] == 60
+    metrics = (Path(runner.results_dir) / "metrics.prom").read_text()
+    assert f'treasure_hunt_env_steps_total{{experiment="{runner.experiment_name}"}} ' in metrics
+    assert 'call="env_step",le="+Inf"}' in metrics
+
+
+def test_counts_actor_steps():
+    """Test that the steps of actor processes are counted from the learner's batches."""
+    env = make("FixedTreasureHunt-v0", max_episode_steps=20)
+    agent = TabularQLearner(env, n_actors=2)
+    telemetry = Telemetry(agent, env)
+    agent.learn(total_timesteps=300)
+    agent.close()
+    assert telemetry.env_steps == 300
+    assert telemetry.histograms["td_update_batch"].count > 0
+
+
+def test_saved_agent_has_no_wrappers(tmp_path: Path):
+    """Test that an agent saved with telemetry neither grows nor loads shadowed methods."""
+    sizes = {}
+    for telemetry in (False, True):
+        agent, env = make_agent("DQN", make("FixedTreasureHunt-v0", max_episode_steps=20))
+        runner = RLRunner(agent, env, total_epochs=1, eval_interval=20, eval_episodes=1,
+                          verbose=False, results_root=tmp_path / str(telemetry), telemetry=telemetry)
+        runner.train_agent()
+        runner.save_results()
+        assert "predict" in vars(agent) if telemetry else "predict" not in vars(agent)
+        path = Path(runner.results_dir) / "agent.zip"
+        sizes[telemetry] = path.stat().st_size
+        assert "predict" not in vars(DQN.load(path))
+    assert sizes[True] < 1.1 * sizes[False]
@@ -0,0 +1,74 @@
+"""Tests for the TransitionModel class and model-based planning."""
+import numpy as np
+import pytest
+
+from treasure_hunt.agent import TabularQLearner
+from treasure_hunt.agent.transition_model import TransitionModel
+
+# pylint: disable=W0212  # We're fine with using protected members in tests.
+# pylint: disable=W0611  # Unused import
+from .fixtures import fixture_fixed_environment
+
+
+def test_model_updates():
+    """Test that the model keeps the last outcome of every pair and grows its arrays."""
+    model = TransitionModel(n_actions=4, capacity=2)
+    for i in range(10):
+        model.update((i, (0, 1)), i % 4, -1.0, (i + 1, (0, 1)))
+    model.update((3, (0, 1)), 3, 5.0, (0, (0, 1)))
+    assert model.n_pairs == 10 and len(model.states) == 11
+    assert model.transition(model.pair((3, (0, 1)), 3)) == ((3, (0, 1)), 3, 5.0, (0, (0, 1)))
+
+    np.random.seed(0)
+    sampled = model.sample(100)
+    assert {transition[0] for transition in sampled} == {(i, (0, 1)) for i in range(10)}
+
+
+def test_predecessors():
+    """Test that predecessors follow the latest outcomes only."""
+    model = TransitionModel(n_actions=2)
+    model.update(0, 0, 0, 2)
+    model.update(1, 0, 0, 2)
+    model.update(1, 1, 0, 2)
+    model.update(1, 0, 0, 3)  # Outdated edge from (1, 0) to 2
+    model.update(1, 0, 0, 2)  # Repeated edge
+    assert sorted(model.predecessors(2)) == [model.pair(0, 0), model.pair(1, 0), model.pair(1, 1)]
+    assert model.predecessors(3) == [] and model.predecessors(4) == []
+
+
+@pytest.mark.parametrize("planning", ["uniform", "prioritized"])
+def test_planning_propagates_rewards(fixed_environment, planning):
+    """Test that planning propagates a reward back along the modelled transitions."""
+    np.random.seed(0)
+    agent = TabularQLearner(fixed_environment, planning_steps=50, planning=planning)
+    chain = [(i, 99, (45, 55)) for i in range(4)]
+    for state, next_state, reward in zip(chain, chain[1:], [0, 0, 100]):
+        td_error = agent._update_q_value(state, 0, reward, next_state)
+        agent._plan(state, 0, reward, next_state, td_error)
+    assert agent.q_table[chain[0]][0] > 0
+    assert agent.q_table[chain[0]][1] == 0
+
+
+def test_learn_with_planning(fixed_environment):
+    """Test that learn runs with planning and records the real transitions."""
+    agent = TabularQLearner(fixed_environment, planning_steps=5, planning="prioritized")
+    agent.learn(total_timesteps=200)
+    assert 0 < agent.model.n_pairs <= 200
+    # Every queued pair has a single valid entry, at its recorded priority
+    valid = [pair for negative_priority, pair in agent.priority_queue
+             if -negative_priority == agent.model.priorities.flat[pair]]
+    assert len(valid) == len(set(valid)) == np.count_nonzero(agent.model.priorities)
+    with pytest.raises(ValueError):
+        TabularQLearner(fixed_environment, planning_steps=5, planning="random")
+
+
+def test_load_restores_planning(fixed_environment, tmp_path):
+    """Test that the planning settings are saved and restored."""
+    agent = TabularQLearner(fixed_environment, planning_steps=5, planning="prioritized",
+                            priority_threshold=0.5)
+    agent.save(tmp_path / "q_table")
+    new_agent = TabularQLearner(fixed_environment)
+    new_agent.load(tmp_path / "q_table")
+    assert (new_agent.planning_steps, new_agent.planning, new_agent.priority_threshold) == (5, "prioritized", 0.5)
+    assert new_agent.model is not None
+    new_agent.learn(total_timesteps=20)
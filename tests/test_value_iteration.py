@@ -0,0 +1,81 @@
+"""Tests for the ValueIterationPlanner class."""
+from pathlib import Path
+import numpy as np
+import pytest
+from gymnasium.envs import make
+
+from treasure_hunt.environment import FixedTreasureHuntEnv
+from treasure_hunt.environment.monster_strategy import RandomMovementStrategy
+from treasure_hunt.agent import TabularQLearner, ValueIterationPlanner
+
+# pylint: disable=W0611  # Unused import
+from .fixtures import fixture_fixed_environment, fixture_q_learner
+
+
+@pytest.fixture(name="planner")
+def fixture_planner(fixed_environment: FixedTreasureHuntEnv):
+    """Fixture to create a solved planner on the fixed environment."""
+    planner = ValueIterationPlanner(fixed_environment)
+    planner.learn()
+    return planner
+
+
+def run_episode(env, agent):
+    """Play one greedy episode and return its total reward."""
+    obs, _ = env.reset()
+    total_reward, done = 0, False
+    while not done:
+        action, _ = agent.predict(obs, deterministic=True)
+        obs, reward, terminated, truncated, _ = env.step(action)
+        total_reward += reward
+        done = terminated or truncated
+    return total_reward
+
+
+def test_optimal_fixed_episode(planner: ValueIterationPlanner,
+                               fixed_environment: FixedTreasureHuntEnv):
+    """Test that the planner takes a shortest path to the treasure (18 moves)."""
+    assert len(planner.layouts) == 1
+    expected = fixed_environment.TREASURE_REWARD + 17 * fixed_environment.SLACK_PENALTY
+    assert run_episode(fixed_environment, planner) == expected
+
+
+def test_warm_start(planner: ValueIterationPlanner, q_learner: TabularQLearner,
+                    fixed_environment: FixedTreasureHuntEnv):
+    """Test that a warm-started Q-learner follows the optimal policy."""
+    planner.warm_start(q_learner)
+    assert run_episode(fixed_environment, q_learner) == run_episode(fixed_environment, planner)
+
+
+def test_warm_start_copies(planner: ValueIterationPlanner, fixed_environment: FixedTreasureHuntEnv):
+    """Test that training a warm-started Q-learner leaves the planner's Q-values unchanged."""
+    # Another discount factor, so the optimal Q-values are not a fixed point of the updates
+    q_learner = TabularQLearner(fixed_environment, discount_factor=0.5)
+    planner.warm_start(q_learner)
+    q_values = planner.q_values.copy()
+    q_learner.learn(total_timesteps=200)
+    assert np.array_equal(planner.q_values, q_values)
+
+
+def test_save_and_load(planner: ValueIterationPlanner, tmp_path: Path):
+    """Test saving and loading the solved Q-values."""
+    save_path = tmp_path / "agent"
+    planner.save(save_path)
+    new_planner = ValueIterationPlanner(planner.env)
+    new_planner.load(save_path)
+    assert np.array_equal(new_planner.q_values, planner.q_values)
+    obs, _ = planner.env.reset()
+    assert new_planner.predict(obs)[0] == planner.predict(obs)[0]
+
+
+def test_random_model_probabilities():
+    """Test that the random movement model is a probability distribution."""
+    env = make("RandomMonsterTreasureHunt-v0")
+    positions = np.array([[0, 9], [45, 55], [98, 11]])
+    proposals, probabilities = RandomMovementStrategy().proposal_distribution(
+        positions, env.unwrapped.ENV_SIZE)
+    assert proposals.shape == (3, 25, 2)
+    assert np.allclose(probabilities.sum(axis=1), 1)
+    # A corner monster has 3 options, an inner one has 5
+    assert np.isclose(probabilities[1].max(), 1 / 25)
+    assert np.isclose(probabilities[0].max(), 1 / 9)
@@ -1,2 +1,3 @@
 from .tabular_qlearner import TabularQLearner
 from .simplfier_qlearner import SimplifierQLearner
+from .value_iteration import ValueIterationPlanner
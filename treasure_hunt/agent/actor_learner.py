@@ -0,0 +1,238 @@
+"""Actor-learner training: actor processes collect transitions, one learner updates the Q-table."""
+
+import copy
+import multiprocessing
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .state_keys import flatten_key, key_structure, unflatten_key
+
+
+class TransitionRing:
+    """Single-producer single-consumer ring buffer of (s, a, r, s') transitions in shared memory.
+    States are flattened serialized states of a fixed width."""
+
+    def __init__(self, key_width: int, capacity: int = 4096):
+        self.key_width, self.capacity = key_width, capacity
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in self._layout())
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self._map()
+        self.counters[:] = 0
+
+    def _layout(self):
+        """Name, dtype and shape of the arrays in the shared memory, in order."""
+        return [("counters", np.int64, (2,)),  # Total items written, total items read
+                ("states", np.int64, (self.capacity, self.key_width)),
+                ("actions", np.int64, (self.capacity,)),
+                ("rewards", np.float64, (self.capacity,)),
+                ("next_states", np.int64, (self.capacity, self.key_width))]
+
+    def _map(self):
+        """Set the arrays as views into the shared memory."""
+        offset = 0
+        for name, dtype, shape in self._layout():
+            array = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            setattr(self, name, array)
+            offset += array.nbytes
+
+    def __getstate__(self):
+        """Pickle the name of the shared memory, for spawned actors to attach to it."""
+        return {"key_width": self.key_width, "capacity": self.capacity, "name": self.memory.name}
+
+    def __setstate__(self, state):
+        self.key_width, self.capacity = state["key_width"], state["capacity"]
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self._map()
+
+    def put(self, state, action, reward, next_state):
+        """Write a transition, waiting for the consumer if the ring is full."""
+        written = self.counters[0]
+        while written - self.counters[1] >= self.capacity:
+            time.sleep(0.0001)
+        slot = written % self.capacity
+        self.states[slot] = state
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.next_states[slot] = next_state
+        # Publish the slot only once it is fully written
+        self.counters[0] = written + 1
+
+    def get_batch(self, max_items: int):
+        """Read up to max_items transitions, returned as copies."""
+        read = self.counters[1]
+        n_items = min(int(self.counters[0] - read), max_items)
+        slots = (read + np.arange(n_items)) % self.capacity
+        batch = (self.states[slots], self.actions[slots], self.rewards[slots],
+                 self.next_states[slots])
+        self.counters[1] = read + n_items
+        return batch
+
+    def close(self):
+        """Release the shared memory."""
+        # Drop the views first, the buffer cannot be closed while they exist
+        del self.counters, self.states, self.actions, self.rewards, self.next_states
+        self.memory.close()
+        self.memory.unlink()
+
+
+def _apply_published_updates(agent, updates: multiprocessing.Queue):
+    """Copy the Q-values and exploration rate published by the learner into an actor's agent."""
+    while True:
+        try:
+            exploration_rate, rows = updates.get_nowait()
+        except queue.Empty:
+            return
+        agent.exploration_rate = exploration_rate
+        for state, row in rows.items():
+            agent.q_table[state] = row
+
+
+def _run_actor(agent, ring: TransitionRing, updates: multiprocessing.Queue,
+               commands: multiprocessing.Queue, seed: int, sync_interval: int):
+    """Actor process: for every number of steps received, play that many epsilon-greedy
+    steps and stream the transitions. Episodes continue across commands, None stops."""
+    np.random.seed(seed)
+    agent.env.action_space.seed(seed)
+    obs, _ = agent.env.reset(seed=seed)
+    state = agent._serialize_state(obs)  # pylint: disable=protected-access
+    while (n_steps := commands.get()) is not None:
+        for step in range(n_steps):
+            if step % sync_interval == 0:
+                _apply_published_updates(agent, updates)
+            action = agent._select_action(state, deterministic=False)  # pylint: disable=protected-access
+            next_obs, reward, done, truncated, _ = agent.env.step(action)
+            next_state = agent._serialize_state(next_obs)  # pylint: disable=protected-access
+            ring.put(flatten_key(state), action, reward, flatten_key(next_state))
+            if done or truncated:
+                obs, _ = agent.env.reset()
+                state = agent._serialize_state(obs)  # pylint: disable=protected-access
+            else:
+                state = next_state
+
+
+def _without_shadowed_methods(obj):
+    """Shallow copy of obj without the instance attributes shadowing its methods, e.g. the
+    telemetry wrappers, which belong to this process and cannot be pickled."""
+    obj = copy.copy(obj)
+    for name in [name for name in vars(obj) if callable(getattr(type(obj), name, None))]:
+        delattr(obj, name)
+    return obj
+
+
+def _picklable_agent(agent):
+    """Copy of the agent to pickle into spawned actors, see _without_shadowed_methods."""
+    agent = _without_shadowed_methods(agent)
+    agent.env = _without_shadowed_methods(agent.env)
+    return agent
+
+
+def _stop_actors(actors, commands, updates, rings):
+    """Stop the actor processes and release their queues and rings."""
+    for actor_commands in commands:
+        actor_commands.put(None)
+    for actor in actors:
+        actor.join(timeout=1)
+        if actor.is_alive():
+            actor.terminate()
+    for actor_queue in (*commands, *updates):
+        actor_queue.cancel_join_thread()
+        actor_queue.close()
+    for ring in rings:
+        ring.close()
+
+
+class ActorPool:
+    """
+    Actor processes of a tabular agent, kept alive across learn calls so each epoch does not
+    pay their start-up. Actors start from a copy of the agent and act with the
+    Q-values last published by the learner, the process calling learn, which applies every
+    TD update and decays the exploration rate.
+    Actors start with the platform's default start method unless start_method is given.
+    Forked actors inherit the agent, others (spawn on macOS and Windows) get a pickled copy.
+    The actors are stopped by close, or when the pool is garbage collected.
+    """
+
+    def __init__(self, agent, n_actors: int, *, sync_interval=100, seed=None, start_method=None):
+        # pylint: disable=protected-access
+        self.agent = agent
+        obs, _ = agent.env.reset()
+        self.structure = key_structure(agent._serialize_state(obs))
+        key_width = len(flatten_key(agent._serialize_state(obs)))
+
+        context = multiprocessing.get_context(start_method)
+        actor_agent = agent if context.get_start_method() == "fork" else _picklable_agent(agent)
+        self.rings = [TransitionRing(key_width) for _ in range(n_actors)]
+        self.updates = [context.Queue() for _ in range(n_actors)]
+        self.commands = [context.Queue() for _ in range(n_actors)]
+        seeds = [int(seed_sequence.generate_state(1)[0])
+                 for seed_sequence in np.random.SeedSequence(seed).spawn(n_actors)]
+        self.actors = [context.Process(target=_run_actor, daemon=True,
+                                       args=(actor_agent, ring, actor_updates, actor_commands,
+                                             actor_seed, sync_interval))
+                       for ring, actor_updates, actor_commands, actor_seed
+                       in zip(self.rings, self.updates, self.commands, seeds)]
+        for actor in self.actors:
+            actor.start()
+        self._finalizer = weakref.finalize(self, _stop_actors, self.actors, self.commands,
+                                           self.updates, self.rings)
+
+    def learn(self, total_timesteps: int, *, batch_size=256, publish_interval=1000):
+        """Have the actors play total_timesteps steps in total and learn from their transitions.
+        Every drained batch is applied at once, see TabularQLearner._update_q_values."""
+        # pylint: disable=protected-access
+        agent = self.agent
+        dense = agent.state_indexer is not None
+        # The exploration rate may have been restored since the last call
+        self._publish({})
+        quotas = [len(shard) for shard in np.array_split(np.arange(total_timesteps), len(self.actors))]
+        for actor_commands, quota in zip(self.commands, quotas):
+            actor_commands.put(quota)
+
+        consumed, since_publish, dirty_states = 0, 0, set()
+        while consumed < total_timesteps:
+            received = 0
+            for ring in self.rings:
+                states, actions, rewards, next_states = ring.get_batch(batch_size)
+                if len(actions) == 0:
+                    continue
+                if dense:  # Row indices, a single column
+                    states, next_states = states[:, 0], next_states[:, 0]
+                    dirty_states.update(states.tolist())
+                else:
+                    states = [unflatten_key(state, self.structure) for state in states]
+                    next_states = [unflatten_key(state, self.structure) for state in next_states]
+                    dirty_states.update(states)
+                agent._update_q_values(states, actions, rewards, next_states)
+                agent.exploration_rate = max(agent.min_exploration_rate,
+                                             agent.exploration_rate * agent.exploration_decay**len(actions))
+                received += len(actions)
+            consumed += received
+            since_publish += received
+
+            # Rows changed last are published at the end, so the next call starts in sync
+            if since_publish >= publish_interval or (consumed >= total_timesteps and dirty_states):
+                self._publish({state: np.array(agent.q_table[state]) for state in dirty_states})
+                since_publish, dirty_states = 0, set()
+            if received == 0:
+                if any(actor.exitcode is not None for actor in self.actors):
+                    self.close()
+                    raise RuntimeError("An actor process failed.")
+                time.sleep(0.0001)
+
+    def _publish(self, rows: dict):
+        """Send the exploration rate and changed Q rows to every actor."""
+        for actor_updates in self.updates:
+            actor_updates.put((self.agent.exploration_rate, rows))
+
+    @property
+    def alive(self) -> bool:
+        """Whether the actors have not been stopped."""
+        return self._finalizer.alive
+
+    def close(self):
+        """Stop the actors."""
+        self._finalizer()
@@ -1,7 +1,10 @@
 """Module for the abstract EnvironmentReducer class."""
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 from ...environment import BaseTreasureHuntEnv
+from ..state_indexer import StateIndexer
 
 
 class EnvironmentReducer(ABC):
@@ -9,7 +12,43 @@ class EnvironmentReducer(ABC):
 
     def __init__(self, env: BaseTreasureHuntEnv):
         self.env = env
+        self._state_indexer = None
 
     @abstractmethod
     def reduce_observation(self, obs):
         """Turn an observation into a simpler one."""
+
+    @property
+    def observation_space(self):
+        """Space of the reduced observations. Required for dense Q-tables."""
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not describe its reduced observation space.")
+
+    @property
+    def state_indexer(self) -> StateIndexer:
+        """StateIndexer numbering the reduced observations, as dense Q-tables do."""
+        if self._state_indexer is None:
+            self._state_indexer = StateIndexer(self.observation_space)
+        return self._state_indexer
+
+    @staticmethod
+    def _split_batch(observations: np.ndarray) -> dict:
+        """Columns of a batch of flattened observations, by observation key."""
+        observations = np.asarray(observations, dtype=np.int64)
+        return {"hero_position": observations[:, :1],
+                "treasure_position": observations[:, 1:2],
+                "monster_positions": observations[:, 2:]}
+
+    def reduce_batch(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Reduce a (N, 2 + n_monsters) array of flattened observations, laid out as
+        [hero, treasure, *monsters] like FlattenTreasureWrapper and the "array" obs_mode.
+        Return the (N,) int64 state ids of the reduced observations, in state_indexer's numbering.
+        Unless overridden, observations are reduced one by one.
+        """
+        columns = self._split_batch(observations)
+        return np.array([self.state_indexer.index(self.reduce_observation({
+            "hero_position": int(hero[0]),
+            "treasure_position": int(treasure[0]),
+            "monster_positions": tuple(monsters.tolist()),
+        })) for hero, treasure, monsters in zip(*columns.values())], dtype=np.int64)
@@ -1,8 +1,33 @@
-"""Module for the ObliviousReducer environment reducer class."""
+"""Module for the NearSightedReducer environment reducer class."""
+
+from functools import lru_cache
+
+import numpy as np
+from gymnasium import spaces
 
 from .environment_reducer import EnvironmentReducer
 
 
+# A hyperparameter search builds reducers for many grid sizes and focus distances
+MAX_CACHED_TABLES = 16
+
+
+@lru_cache(maxsize=MAX_CACHED_TABLES)
+def near_sighted_tables(env_size: int, focus_distance: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the `rows[pos]`, `cols[pos]` and `discretized[coord + env_size - 1]` tables of a grid.
+
+    Relative monster coordinates are discretized to -1 (far before), 0 (within focus_distance)
+    or 1 (far after), and offset by env_size - 1 to start at 0. Relative monster positions
+    then take a few lookups, and the tables stay linear in the grid size. Tables are read-only.
+    """
+    rows, cols = np.divmod(np.arange(env_size**2), env_size)
+    coords = np.arange(1 - env_size, env_size)
+    discretized = np.where(coords < -focus_distance, -1, np.where(coords > focus_distance, 1, 0))
+    for table in (rows, cols, discretized):
+        table.flags.writeable = False
+    return rows, cols, discretized
+
+
 class NearSightedReducer(EnvironmentReducer):
     """Reduce monster position to a relative near-far state."""
 
@@ -10,31 +35,46 @@ class NearSightedReducer(EnvironmentReducer):
         """Initialize the reducer."""
         super().__init__(env)
         self.focus_distance = focus_distance
+        self._rows, self._cols, self._discretized = near_sighted_tables(
+            self.env.ENV_SIZE, focus_distance)
+        # Plain lists are faster than arrays to index one value at a time
+        self._row_list, self._col_list = self._rows.tolist(), self._cols.tolist()
+        self._discretized_list = self._discretized.tolist()
+        self._offset = self.env.ENV_SIZE - 1
 
     def reduce_observation(self, obs):
-        """Return only the hero and treasure positions."""
+        """Replace the monster positions by their discretized positions relative to the hero."""
+        rows, cols, discretized = self._row_list, self._col_list, self._discretized_list
+        offset = self._offset
+        hero_row = rows[obs['hero_position']] - offset
+        hero_col = cols[obs['hero_position']] - offset
         obs = obs.copy()
-        obs['monster_positions'] = tuple(self._discretize_monster_position(
-            monster_pos, obs['hero_position']) for monster_pos in obs['monster_positions'])
+        obs['monster_positions'] = tuple(
+            (discretized[rows[monster_pos] - hero_row], discretized[cols[monster_pos] - hero_col])
+            for monster_pos in obs['monster_positions'])
         return obs
 
-    def _discretize_monster_position(self, monster_pos, hero_pos):
-        """Discretize the monster position."""
-        return tuple(self._discretize_relative_coordinate(coord) for coord in self._relative_monster_position(monster_pos, hero_pos))
-
-    def _relative_monster_position(self, monster_pos, hero_pos):
-        """Return the relative position of the monster to the hero."""
-        monster_row, monster_col = self.env.decode_position(monster_pos)
-        hero_row, hero_col = self.env.decode_position(hero_pos)
-        row_diff = monster_row - hero_row
-        col_diff = monster_col - hero_col
-        return row_diff, col_diff
-
-    def _discretize_relative_coordinate(self, coord: int):
-        """Discretize a relative coordinate."""
-        if coord < - self.focus_distance:
-            return -1
-        elif coord > self.focus_distance:
-            return 1
-        else:
-            return 0
+    def reduce_batch(self, observations: np.ndarray) -> np.ndarray:
+        """Discretize the monster positions of all observations with array lookups, then index them."""
+        columns = self._split_batch(observations)
+        hero, monsters = columns["hero_position"], columns["monster_positions"]
+        offset = self._offset
+        relative = np.stack([
+            self._discretized[self._rows[monsters] - self._rows[hero] + offset],
+            self._discretized[self._cols[monsters] - self._cols[hero] + offset],
+        ], axis=2)
+        # Flattened (row, col) pairs, monster by monster, as in the Tuple space
+        columns["monster_positions"] = relative.reshape(len(monsters), 2 * monsters.shape[1])
+        return self.state_indexer.index_batch(
+            np.concatenate([columns[key] for key in self.observation_space.spaces], axis=1))
+
+    @property
+    def observation_space(self):
+        """Monster positions become (row, col) pairs of -1 (far before), 0 (near) or 1 (far after)."""
+        env_spaces = self.env.observation_space.spaces
+        relative_space = spaces.Tuple([spaces.Discrete(3, start=-1)] * 2)
+        return spaces.Dict({
+            **env_spaces,
+            "monster_positions": spaces.Tuple(
+                [relative_space] * len(env_spaces["monster_positions"])),
+        })
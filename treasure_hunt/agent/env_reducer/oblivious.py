@@ -1,5 +1,8 @@
 """Module for the ObliviousReducer environment reducer class."""
 
+import numpy as np
+from gymnasium import spaces
+
 from .environment_reducer import EnvironmentReducer
 
 
@@ -14,3 +17,15 @@ class ObliviousReducer(EnvironmentReducer):
     def reduce_observation(self, obs):
         """Return only the hero and treasure positions."""
         return {k: v for k, v in obs.items() if k != self.dropped_feature}
+
+    def reduce_batch(self, observations: np.ndarray) -> np.ndarray:
+        """Index the kept columns of the observations directly."""
+        columns = self._split_batch(observations)
+        kept = [columns[key] for key in self.observation_space.spaces]
+        return self.state_indexer.index_batch(np.concatenate(kept, axis=1))
+
+    @property
+    def observation_space(self):
+        """The environment's observation space without the dropped feature."""
+        return spaces.Dict({k: v for k, v in self.env.observation_space.spaces.items()
+                            if k != self.dropped_feature})
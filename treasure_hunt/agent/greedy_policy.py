@@ -0,0 +1,44 @@
+"""Frozen greedy policy of a tabular agent, for inference without Q-table lookups."""
+
+import hashlib
+
+import numpy as np
+
+
+class GreedyPolicy:
+    """
+    Greedy action of every state, compiled from a Q-table by TabularQLearner.compile_policy.
+
+    Actions are an array indexed by state row for the dense backend, or a dict keyed by
+    serialized state for the dict backend. The dict only holds states whose greedy action
+    differs from default_action, which is also the action of unseen states, as for the
+    zero rows a Q-table adds for them. Predicting never modifies anything.
+    """
+
+    def __init__(self, serialize, actions, default_action: int = 0):
+        self.serialize = serialize  # Observation to state row or key, e.g. TabularQLearner._serialize_state
+        self.actions = actions
+        self.default_action = default_action
+
+    def predict(self, observation, deterministic=True):  # pylint: disable=unused-argument
+        """SB3-compatible interface. The policy is always greedy."""
+        state = self.serialize(observation)
+        if isinstance(self.actions, dict):
+            return self.actions.get(state, self.default_action), None
+        return self.actions.item(state), None
+
+    def actions_of(self, states) -> np.ndarray:
+        """Actions of a batch of serialized states: row indices or keys."""
+        if isinstance(self.actions, dict):
+            return np.fromiter((self.actions.get(state, self.default_action) for state in states),
+                               dtype=np.int64, count=len(states))
+        return self.actions[states].astype(np.int64)
+
+    def key(self) -> str:
+        """Hash of the actions, equal for equal policies of the same agent."""
+        digest = hashlib.blake2b(digest_size=16)
+        if isinstance(self.actions, dict):
+            digest.update(repr(list(self.actions.items())).encode())
+        else:
+            digest.update(self.actions.tobytes())
+        return digest.hexdigest()
@@ -0,0 +1,239 @@
+"""Versioned, pickle-free Q-table checkpoint format, memory-mapped on load.
+
+Layout of a file:
+    MAGIC (8 bytes), format version (uint32), header length (uint32),
+    JSON header, padded so the arrays start on an ALIGNMENT boundary,
+    keys: (n_rows, key_width) int64 flattened states sorted lexicographically (dict backend only),
+    values: (n_rows, n_actions) float32 Q-values.
+The header holds the backend, array shapes and offsets, and the agent's metadata.
+"""
+
+import bisect
+import json
+import os
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+from .state_keys import flatten_key, key_structure, unflatten_key
+
+MAGIC = b"THQTABLE"
+VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+_KEY_DTYPE = np.dtype("<i8")
+_VALUE_DTYPE = np.dtype("<f4")
+
+
+def _structure_to_json(structure):
+    """Nested tuples of None become nested lists of None."""
+    return None if structure is None else [_structure_to_json(child) for child in structure]
+
+
+def _structure_from_json(structure):
+    """Inverse of _structure_to_json."""
+    return None if structure is None else tuple(_structure_from_json(child) for child in structure)
+
+
+def is_q_table_file(path) -> bool:
+    """Return whether the file at path is in this format."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_q_table(path, q_table, n_actions: int, metadata: dict = None):
+    """
+    Save a dict-like or dense Q-table with optional metadata (e.g. reducer, hyperparameters).
+    The file is written next to path then moved over it, so a Q-table memory-mapped
+    from path stays valid.
+    """
+    header = {"n_actions": int(n_actions), **(metadata or {})}
+    if isinstance(q_table, np.ndarray):
+        header.update(backend="dense", key_structure=None, key_width=0)
+        keys = np.empty((len(q_table), 0), dtype=_KEY_DTYPE)
+        values = np.asarray(q_table, dtype=_VALUE_DTYPE)
+    else:
+        states = list(q_table)
+        structures = {key_structure(state) for state in states}
+        if len(structures) > 1:
+            raise ValueError(f"States of a Q-table must share one structure, got {structures}.")
+        structure = structures.pop() if structures else None
+        key_width = len(flatten_key(states[0])) if states else 0
+        keys = np.array([flatten_key(state) for state in states], dtype=_KEY_DTYPE)
+        keys = keys.reshape(len(states), key_width)
+        values = np.array([q_table[state] for state in states], dtype=_VALUE_DTYPE)
+        values = values.reshape(len(states), n_actions)
+        # Sort the keys so lookups can binary search them, first column varying slowest
+        order = np.lexsort(keys.T[::-1]) if keys.shape[1] else np.arange(len(keys))
+        keys, values = keys[order], values[order]
+        header.update(backend="dict", key_structure=_structure_to_json(structure),
+                      key_width=keys.shape[1])
+    header["n_rows"] = len(values)
+
+    # Offsets depend on the header length, itself depending on the offsets' digits
+    offset = ALIGNMENT
+    while True:
+        header.update(keys_offset=offset, values_offset=offset + keys.nbytes)
+        encoded = json.dumps(header).encode("utf8")
+        data_start = _PREAMBLE.size + len(encoded)
+        if data_start <= offset:
+            break
+        offset = -(-data_start // ALIGNMENT) * ALIGNMENT
+    encoded = encoded.ljust(offset - _PREAMBLE.size)
+
+    temporary_path = f"{os.fspath(path)}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(keys.tobytes())
+        f.write(values.tobytes())
+    os.replace(temporary_path, path)
+
+
+def read_header(path) -> dict:
+    """Read and validate the header of a Q-table file."""
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size or preamble[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{path}' is not a Q-table file. Legacy pickled checkpoints "
+                             "can be converted with `python -m treasure_hunt.convert_checkpoints`.")
+        _, version, header_length = _PREAMBLE.unpack(preamble)
+        if version != VERSION:
+            raise ValueError(f"'{path}' has format version {version}, "
+                             f"only version {VERSION} is supported.")
+        return json.loads(f.read(header_length))
+
+
+def load_q_table(path):
+    """
+    Open a Q-table file without reading its arrays.
+    Return the header and the Q-table: a copy-on-write memory-mapped array for the dense
+    backend, a MappedQTable for the dict backend.
+    """
+    header = read_header(path)
+    if header["backend"] == "dense":
+        return header, np.memmap(path, dtype=_VALUE_DTYPE, mode='c', offset=header["values_offset"],
+                                 shape=(header["n_rows"], header["n_actions"]))
+    return header, MappedQTable(path, header)
+
+
+class MappedQTable(Mapping):
+    """
+    Dict-backend Q-table reading its rows from a memory-mapped Q-table file on demand.
+
+    Behaves like the defaultdict it replaces: looking up a state copies its saved row,
+    or a zero row for unknown states, into an in-memory overlay which receives all updates.
+    The file itself is never modified.
+    """
+
+    def __init__(self, path, header: dict = None):
+        self.path = os.fspath(path)
+        self.header = read_header(path) if header is None else header
+        self.structure = _structure_from_json(self.header["key_structure"])
+        self.n_actions = self.header["n_actions"]
+        self.rows = {}  # Overlay of the rows looked up or set since loading
+        self._open()
+
+    def _open(self):
+        """Memory-map the key and value arrays."""
+        n_rows, key_width = self.header["n_rows"], self.header["key_width"]
+        if n_rows == 0:
+            # Empty files cannot be memory-mapped
+            self.keys = np.empty((0, key_width), dtype=_KEY_DTYPE)
+            self.values = np.empty((0, self.n_actions), dtype=_VALUE_DTYPE)
+            return
+        self.keys = np.memmap(self.path, dtype=_KEY_DTYPE, mode='r',
+                              offset=self.header["keys_offset"], shape=(n_rows, key_width))
+        self.values = np.memmap(self.path, dtype=_VALUE_DTYPE, mode='r',
+                                offset=self.header["values_offset"], shape=(n_rows, self.n_actions))
+
+    def __getstate__(self):
+        """Pickle the saved rows themselves rather than the path, so an unpickled copy, e.g. in a
+        spawned evaluation worker, does not depend on the file, which a later checkpoint may
+        delete or replace."""
+        return {"path": self.path, "header": self.header, "rows": self.rows,
+                "keys": np.asarray(self.keys), "values": np.asarray(self.values)}
+
+    def __setstate__(self, state):
+        self.path, self.header, self.rows = state["path"], state["header"], state["rows"]
+        self.structure = _structure_from_json(self.header["key_structure"])
+        self.n_actions = self.header["n_actions"]
+        self.keys, self.values = state["keys"], state["values"]
+
+    def _find(self, state) -> int:
+        """Return the file row of a state, or -1 if it was not saved."""
+        if self.structure != key_structure(state):
+            return -1
+        flat = flatten_key(state)
+        row = bisect.bisect_left(range(len(self.keys)), flat,
+                                 key=lambda i: self.keys[i].tolist())
+        if row < len(self.keys) and self.keys[row].tolist() == flat:
+            return row
+        return -1
+
+    def __getitem__(self, state) -> np.ndarray:
+        row = self.rows.get(state)
+        if row is None:
+            file_row = self._find(state)
+            row = (np.array(self.values[file_row]) if file_row >= 0
+                   else np.zeros(self.n_actions, dtype=np.float32))
+            self.rows[state] = row
+        return row
+
+    def __setitem__(self, state, row):
+        self.rows[state] = row
+
+    def __contains__(self, state) -> bool:
+        return state in self.rows or self._find(state) >= 0
+
+    def __iter__(self):
+        yield from self.rows
+        for flat in self.keys:
+            state = unflatten_key(flat, self.structure)
+            if state not in self.rows:
+                yield state
+
+    def iter_rows(self):
+        """Iterate over the (state, row) pairs without copying saved rows into the overlay."""
+        yield from self.rows.items()
+        for flat, row in zip(self.keys, self.values):
+            state = unflatten_key(flat, self.structure)
+            if state not in self.rows:
+                yield state, row
+
+    def __len__(self) -> int:
+        return len(self.keys) + sum(1 for state in self.rows if self._find(state) < 0)
+
+
+def convert_legacy_checkpoint(path) -> bool:
+    """
+    Rewrite a legacy `np.save` Q-table checkpoint (pickled dict or dense array) in place
+    in the Q-table file format. Unpickles the file, so only convert trusted files.
+    Return whether the file was converted, files in other formats are left untouched.
+    States whose structure differs from most states are dropped, see _drop_stray_states.
+    """
+    with open(path, 'rb') as f:
+        if f.read(6) != b"\x93NUMPY":
+            return False
+        f.seek(0)
+        q_table = np.load(f, allow_pickle=True)
+    if q_table.dtype == object:
+        q_table = _drop_stray_states(q_table.item())
+        n_actions = len(next(iter(q_table.values()))) if q_table else 0
+    else:
+        n_actions = q_table.shape[1]
+    save_q_table(path, q_table, n_actions)
+    return True
+
+
+def _drop_stray_states(q_table: dict) -> dict:
+    """
+    Keep the states sharing the most common structure.
+    The original learner started every run from the bare hero position, so its checkpoints
+    hold a stray integer state next to the full observation tuples.
+    """
+    by_structure = {}
+    for state, row in q_table.items():
+        by_structure.setdefault(key_structure(state), {})[state] = row
+    return max(by_structure.values(), key=len, default={})
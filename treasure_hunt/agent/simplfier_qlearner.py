@@ -1,5 +1,7 @@
 """Module for the SimplifierQLearner agent class."""
 
+import numpy as np
+
 from .tabular_qlearner import TabularQLearner
 from .env_reducer import EnvironmentReducer
 
@@ -9,10 +11,24 @@ class SimplifierQLearner(TabularQLearner):
 
     def __init__(self, env, reducer: EnvironmentReducer, *args, **kwargs):
         """Initialize the agent."""
-        super().__init__(env, *args, **kwargs)
+        if env.unwrapped.obs_mode != "dict":
+            raise ValueError(f"Environment reducers need dict observations, got {env.unwrapped.obs_mode}.")
+        # The reducer defines the state space, so it must be set before the Q-table is built
         self.reducer = reducer
+        super().__init__(env, *args, **kwargs)
+
+    def _observation_space(self):
+        """Space of the reduced observations."""
+        return self.reducer.observation_space
 
     def _serialize_state(self, state):
         """Convert the observation dict to a simpler state, then to a hashable tuple."""
-        state = self.reducer.reduce_observation(state)
+        state = self.reducer.reduce_observation(self._as_dict_observation(state))
         return super()._serialize_state(state)
+
+    def _serialize_batch(self, observations):
+        """Reduce arrays of observations at once for dense Q-tables, see TabularQLearner._serialize_batch."""
+        if isinstance(observations, np.ndarray) and self.state_indexer is not None:
+            # reduce_batch numbers the reduced states as the dense Q-table does
+            return self.reducer.reduce_batch(observations)
+        return super()._serialize_batch(observations)
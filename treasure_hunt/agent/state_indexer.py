@@ -0,0 +1,81 @@
+"""Module for the StateIndexer class, mapping discrete observations to table rows."""
+
+import numpy as np
+from gymnasium import spaces
+
+
+class StateIndexer:
+    """Perfect (collision-free) mapping between observations of a discrete space and integers.
+
+    The space may nest Dict and Tuple spaces as long as all the leaves are Discrete
+    or MultiDiscrete (one leaf per dimension).
+    Leaves are read in the space's order and combined as digits of a mixed-radix number,
+    so every observation gets a unique index in [0, n_states).
+    """
+
+    def __init__(self, space: spaces.Space):
+        self.space = space
+        self.sizes = []
+        self.starts = []
+        self._register_leaves(space)
+        self.n_states = 1
+        for size in self.sizes:
+            self.n_states *= size
+        # Stride of each leaf, the last leaf varying fastest
+        self.strides = [1] * len(self.sizes)
+        for i in range(len(self.sizes) - 2, -1, -1):
+            self.strides[i] = self.strides[i + 1] * self.sizes[i + 1]
+
+    def _register_leaves(self, space: spaces.Space):
+        """Record the size and offset of every Discrete leaf of the space."""
+        if isinstance(space, spaces.Discrete):
+            self.sizes.append(int(space.n))
+            self.starts.append(int(space.start))
+        elif isinstance(space, spaces.MultiDiscrete) and space.nvec.ndim == 1:
+            self.sizes.extend(int(size) for size in space.nvec)
+            self.starts.extend(int(start) for start in space.start)
+        elif isinstance(space, spaces.Dict):
+            for subspace in space.spaces.values():
+                self._register_leaves(subspace)
+        elif isinstance(space, spaces.Tuple):
+            for subspace in space.spaces:
+                self._register_leaves(subspace)
+        else:
+            raise TypeError(f"Cannot index states of space {space}.")
+
+    def flatten(self, obs, space: spaces.Space = None) -> list[int]:
+        """Return the leaf values of an observation, in the space's order."""
+        space = self.space if space is None else space
+        if isinstance(space, spaces.Discrete):
+            return [obs]
+        if isinstance(space, spaces.MultiDiscrete):
+            return list(obs)
+        values = []
+        if isinstance(space, spaces.Dict):
+            for key, subspace in space.spaces.items():
+                values.extend(self.flatten(obs[key], subspace))
+        else:
+            for value, subspace in zip(obs, space.spaces):
+                values.extend(self.flatten(value, subspace))
+        return values
+
+    def index(self, obs) -> int:
+        """Return the unique index of an observation."""
+        index = 0
+        for value, size, start in zip(self.flatten(obs), self.sizes, self.starts):
+            index = index * size + int(value) - start
+        return index
+
+    def index_batch(self, values: np.ndarray) -> np.ndarray:
+        """Return the indices of a (N, n_leaves) array of flattened observations."""
+        if self.n_states > np.iinfo(np.int64).max:
+            raise OverflowError(f"{self.n_states} states do not fit in int64 indices.")
+        values = np.asarray(values, dtype=np.int64)
+        return (values - np.array(self.starts)) @ np.array(self.strides, dtype=np.int64)
+
+    def unindex(self, index: int) -> list[int]:
+        """Return the flattened leaf values of the observation with the given index."""
+        values = []
+        for stride, size, start in zip(self.strides, self.sizes, self.starts):
+            values.append((index // stride) % size + start)
+        return values
@@ -0,0 +1,26 @@
+"""Flattening of serialized states into rows of integers, as stored by actor rings and Q-table files."""
+
+
+def key_structure(key):
+    """Describe the nesting of a serialized state: None for an integer, a tuple for tuples."""
+    if isinstance(key, tuple):
+        return tuple(key_structure(value) for value in key)
+    return None
+
+
+def flatten_key(key) -> list[int]:
+    """Flatten a (possibly nested) serialized state into a list of integers."""
+    if isinstance(key, tuple):
+        return [value for item in key for value in flatten_key(item)]
+    return [int(key)]
+
+
+def unflatten_key(values, structure):
+    """Rebuild a serialized state from its flattened values, given its structure."""
+    values = iter(values)
+
+    def rebuild(node):
+        if node is None:
+            return int(next(values))
+        return tuple(rebuild(child) for child in node)
+    return rebuild(structure)
@@ -1,19 +1,53 @@
 """Simple Q-learner using a table"""
 
+import heapq
 from collections import defaultdict
+from functools import partial
 
 import numpy as np
 import gymnasium as gym
 
+from .actor_learner import ActorPool
+from .greedy_policy import GreedyPolicy
+from .q_table_file import MappedQTable, load_q_table, save_q_table
+from .state_indexer import StateIndexer
+from .transition_model import TransitionModel
+
 
 class TabularQLearner:
     """
     A simple Tabular Q-learning agent compatible with the Stable-Baselines3 interface.
+
+    The Q-table is either a dict of rows keyed by state tuples (`q_table_backend="dict"`),
+    which only stores visited states, or a dense (n_states, n_actions) float32 array
+    (`q_table_backend="dense"`) indexed by a StateIndexer over the observation space.
+
+    With `n_actors > 1`, learn collects transitions in that many actor processes
+    while the calling process applies the updates, see ActorPool. The actors are started
+    by the first learn call and kept until close or load.
+
+    With `planning_steps > 0`, the agent learns a TransitionModel of the observed transitions
+    and makes that many model-based updates after every real step (Dyna-Q): on pairs sampled
+    uniformly (`planning="uniform"`), or on the pairs with the largest TD errors and their
+    predecessors (`planning="prioritized"`, prioritized sweeping).
+
+    compile_policy freezes the greedy actions into a GreedyPolicy, which predict then uses
+    until the next TD update, so inference neither looks up nor grows the Q-table. The
+    policy is only compiled again once the Q-table has changed.
     """
 
+    # Pairs queued for prioritized sweeping kept at most, the lowest priorities are dropped beyond
+    PRIORITY_QUEUE_SIZE = 100000
+    # Length of the prioritized sweeping heap at which it is first rebuilt without skipped entries
+    MIN_PRIORITY_QUEUE_REBUILD = 1024
+
     def __init__(self, env: gym.Env, learning_rate=0.1, discount_factor=0.99,
-                 exploration_rate=1.0, exploration_decay=0.995, min_exploration_rate=0.01):
+                 exploration_rate=1.0, exploration_decay=0.995, min_exploration_rate=0.01,
+                 q_table_backend="dict", n_actors=1, planning_steps=0, planning="uniform",
+                 priority_threshold=1e-4):
         self.env = env
+        self.n_actors = n_actors
+        self.actor_pool = None  # Started by the first learn call if n_actors > 1
 
         # Learning parameters
         self.learning_rate = learning_rate
@@ -22,12 +56,61 @@ class TabularQLearner:
         self.exploration_decay = exploration_decay
         self.min_exploration_rate = min_exploration_rate
 
-        self.q_table = defaultdict(lambda: np.zeros(
-            env.action_space.n, dtype=np.float32))
+        self.q_table_backend = q_table_backend
+        self.state_indexer = None
+        if q_table_backend == "dict":
+            # A partial rather than a lambda keeps the agent picklable
+            self.q_table = defaultdict(partial(np.zeros, env.action_space.n, dtype=np.float32))
+        elif q_table_backend == "dense":
+            self.state_indexer = StateIndexer(self._observation_space())
+            self.q_table = np.zeros((self.state_indexer.n_states, env.action_space.n),
+                                    dtype=np.float32)
+        else:
+            raise ValueError(f"Unknown Q-table backend {q_table_backend}.")
+
+        # Model-based planning
+        if planning not in ("uniform", "prioritized"):
+            raise ValueError(f"Unknown planning method {planning}.")
+        if planning_steps and n_actors > 1:
+            raise ValueError("Planning is not supported with several actors.")
+        self.planning_steps = planning_steps
+        self.planning = planning
+        self.priority_threshold = priority_threshold
+        self.model = TransitionModel(env.action_space.n) if planning_steps else None
+        # (-priority, pair) heap of prioritized sweeping. A pair is queued once, at its highest
+        # priority (TransitionModel.priorities), other entries of it are skipped when popped
+        # and dropped when the heap grows to priority_queue_rebuild entries
+        self.priority_queue = []
+        self.priority_queue_rebuild = self.MIN_PRIORITY_QUEUE_REBUILD
+        self.compiled_policy = None  # Set by compile_policy, discarded by TD updates
+
+    def _observation_space(self):
+        """Space of the observations passed to _serialize_state."""
+        return self.env.observation_space
 
-    def _serialize_state(self, state: dict) -> tuple:
-        """Convert the observation dict into a hashable state tuple."""
-        return tuple(state.values())
+    def _serialize_state(self, state) -> tuple | int:
+        """Convert the observation into a hashable state, or a row index if dense.
+        Dict observations become tuples, array observations (buffers reused by the env)
+        tuples of their values, and integer observations stay integers.
+        With a Dict observation space, arrays are read as dict observations, see _as_dict_observation."""
+        if isinstance(state, np.ndarray):
+            state = self._as_dict_observation(state)
+        if self.state_indexer is not None:
+            return self.state_indexer.index(state)
+        if isinstance(state, dict):
+            return tuple(state.values())
+        if isinstance(state, np.ndarray):
+            return tuple(state.tolist())
+        return int(state)
+
+    def _as_dict_observation(self, observation):
+        """Read a [hero, treasure, *monsters] array as a dict observation if the observation
+        space is a Dict, like the rows of _serialize_batch, so it maps to the same state."""
+        if isinstance(observation, np.ndarray) and isinstance(self.env.observation_space, gym.spaces.Dict):
+            hero, treasure, *monsters = observation.tolist()
+            return {"hero_position": hero, "treasure_position": treasure,
+                    "monster_positions": tuple(monsters)}
+        return observation
 
     def _select_action(self, state: tuple, deterministic: bool) -> int:
         """Select an action based on exploration or exploitation."""
@@ -35,13 +118,85 @@ class TabularQLearner:
             return np.argmax(self.q_table[state])  # Exploit
         return self.env.action_space.sample()  # Explore
 
-    def _update_q_value(self, state: tuple, action: int, reward: float, next_state: tuple):
-        """Update the Q-value using the Q-learning formula."""
+    def _td_error(self, state: tuple, action: int, reward: float, next_state: tuple) -> float:
+        """Return the Q-learning TD error of a transition."""
         best_next_action = np.argmax(self.q_table[next_state])
         td_target = reward + self.discount_factor * \
             self.q_table[next_state][best_next_action]
-        td_error = td_target - self.q_table[state][action]
+        return td_target - self.q_table[state][action]
+
+    def _update_q_value(self, state: tuple, action: int, reward: float, next_state: tuple):
+        """Update the Q-value using the Q-learning formula. Return the TD error."""
+        td_error = self._td_error(state, action, reward, next_state)
         self.q_table[state][action] += self.learning_rate * td_error
+        self.compiled_policy = None
+        return td_error
+
+    def _update_q_values(self, states, actions: np.ndarray, rewards: np.ndarray, next_states) -> np.ndarray:
+        """
+        Apply the Q-learning updates of a batch of transitions. Return the TD errors.
+        Dense Q-tables update at once, every TD error being computed from the values before
+        the batch and the updates of repeated pairs adding up. Other tables update in order.
+        """
+        if self.state_indexer is None:
+            return np.array([self._update_q_value(*transition)
+                             for transition in zip(states, actions, rewards, next_states)])
+        td_errors = (rewards + self.discount_factor * self.q_table[next_states].max(axis=1)
+                     - self.q_table[states, actions])
+        np.add.at(self.q_table, (states, actions), (self.learning_rate * td_errors).astype(self.q_table.dtype))
+        self.compiled_policy = None
+        return td_errors
+
+    def _plan(self, state: tuple, action: int, reward: float, next_state: tuple, td_error: float):
+        """Record a real transition in the model, then make planning_steps model-based updates."""
+        self.model.update(state, action, reward, next_state)
+        if self.planning == "uniform":
+            for transition in self.model.sample(self.planning_steps):
+                self._update_q_value(*transition)
+            return
+
+        model, n_actions = self.model, self.model.n_actions
+        queue, priorities = self.priority_queue, model.priorities.reshape(-1)
+        self._queue_update(model.pair(state, action), abs(td_error))
+        updates = 0
+        while updates < self.planning_steps and queue:
+            negative_priority, pair = heapq.heappop(queue)
+            if -negative_priority != priorities[pair]:
+                continue  # Requeued with a higher priority, or already updated
+            priorities[pair] = 0
+            updated_state, *transition = model.transition(pair)
+            self._update_q_value(updated_state, *transition)
+            updates += 1
+            # The TD errors of the pairs leading to the updated state changed, all share its value
+            next_value = self.discount_factor * float(np.max(self.q_table[updated_state]))
+            for predecessor in model.predecessors(updated_state):
+                state_id, action = divmod(predecessor, n_actions)
+                q_value = float(self.q_table[model.states[state_id]][action])
+                self._queue_update(predecessor, abs(model.rewards[state_id, action] + next_value - q_value))
+        if len(queue) >= self.priority_queue_rebuild:
+            self._rebuild_priority_queue()
+
+    def _queue_update(self, pair: int, priority: float):
+        """Queue a prioritized sweeping update of a pair, unless its priority is below the
+        threshold or the pair is already queued with a higher one."""
+        priority = float(priority)
+        priorities = self.model.priorities.reshape(-1)
+        if priority > self.priority_threshold and priority > priorities[pair]:
+            priorities[pair] = priority
+            heapq.heappush(self.priority_queue, (-priority, pair))
+
+    def _rebuild_priority_queue(self):
+        """Rebuild the prioritized sweeping heap with one entry per queued pair, keeping the
+        PRIORITY_QUEUE_SIZE highest priorities. The next rebuild is due at twice its length."""
+        priorities = self.model.priorities.reshape(-1)
+        pairs = np.flatnonzero(priorities)
+        if len(pairs) > self.PRIORITY_QUEUE_SIZE:
+            dropped = np.argpartition(priorities[pairs], len(pairs) - self.PRIORITY_QUEUE_SIZE)
+            priorities[pairs[dropped[:len(pairs) - self.PRIORITY_QUEUE_SIZE]]] = 0
+            pairs = np.flatnonzero(priorities)
+        self.priority_queue = list(zip((-priorities[pairs]).tolist(), pairs.tolist()))
+        heapq.heapify(self.priority_queue)
+        self.priority_queue_rebuild = max(2 * len(pairs), self.MIN_PRIORITY_QUEUE_REBUILD)
 
     def _decay_learning_rate(self):
         """Decay exploration rate."""
@@ -52,9 +207,15 @@ class TabularQLearner:
         """
         Train the agent using Q-learning.
         """
+        self.compiled_policy = None
+        if self.n_actors > 1:
+            if self.actor_pool is None or not self.actor_pool.alive:
+                self.actor_pool = ActorPool(self, self.n_actors)
+            self.actor_pool.learn(total_timesteps)
+            return
+
         state, _ = self.env.reset()  # Get the initial observation
-        # Focus on the hero's position for tabular Q-learning
-        state = state['hero_position']
+        state = self._serialize_state(state)
 
         for _ in range(total_timesteps):
             # Epsilon-greedy action selection
@@ -62,7 +223,9 @@ class TabularQLearner:
             next_state, reward, done, truncated, _ = self.env.step(action)
             next_state = self._serialize_state(next_state)
 
-            self._update_q_value(state, action, reward, next_state)
+            td_error = self._update_q_value(state, action, reward, next_state)
+            if self.model is not None:
+                self._plan(state, action, reward, next_state, td_error)
 
             # Reset environment if done
             if done or truncated:
@@ -75,26 +238,175 @@ class TabularQLearner:
 
     def predict(self, observation, deterministic=True):
         """
-        Predict an action given the observation.
+        Predict an action given the observation, or an array of actions given a batch of
+        observations, see _serialize_batch.
         SB3-compatible interface.
         """
-        state = self._serialize_state(observation)
-        action = self._select_action(state, deterministic)
-        return action, None
+        if self._is_batch(observation):
+            return self._predict_batch(observation, deterministic), None
+        if self.compiled_policy is None:
+            return self._select_action(self._serialize_state(observation), deterministic), None
+        if not deterministic and np.random.rand() <= self.exploration_rate:
+            return self.env.action_space.sample(), None  # Explore
+        return self.compiled_policy.predict(observation)
+
+    def _is_batch(self, observation) -> bool:
+        """Whether an observation passed to predict is a batch: a list, or an array with
+        more dimensions than an observation (an encoded state row for dict observations)."""
+        if isinstance(observation, list):
+            return True
+        if not isinstance(observation, np.ndarray):
+            return False
+        space = self.env.observation_space
+        return observation.ndim > (1 if isinstance(space, gym.spaces.Dict) else len(space.shape))
+
+    def _serialize_batch(self, observations) -> np.ndarray | list:
+        """
+        Serialize a list of observations, or an array of them. Dict observations are batched
+        as a (N, 2 + n_monsters) array laid out as [hero, treasure, *monsters], like the "array" obs_mode.
+        Return the row indices if dense, else the list of states.
+        """
+        if isinstance(observations, np.ndarray):
+            space = self.env.observation_space
+            if isinstance(space, gym.spaces.Dict):
+                if self.state_indexer is not None:
+                    # Leaves of the Dict space in its key order
+                    columns = {"hero_position": [0], "treasure_position": [1],
+                               "monster_positions": range(2, observations.shape[1])}
+                    return self.state_indexer.index_batch(
+                        observations[:, [column for key in space.spaces for column in columns[key]]])
+                observations = [{"hero_position": hero, "treasure_position": treasure,
+                                 "monster_positions": tuple(monsters)}
+                                for hero, treasure, *monsters in observations.tolist()]
+            elif self.state_indexer is not None:
+                return self.state_indexer.index_batch(observations.reshape(len(observations), -1))
+        states = [self._serialize_state(obs) for obs in observations]
+        return np.array(states, dtype=np.int64) if self.state_indexer is not None else states
+
+    def _predict_batch(self, observations, deterministic: bool) -> np.ndarray:
+        """Actions of a batch of observations, gathering their Q-table rows for a single argmax.
+        Each action is random with probability exploration_rate unless deterministic."""
+        states = self._serialize_batch(observations)
+        n_actions = self.env.action_space.n
+        if self.compiled_policy is not None:
+            actions = self.compiled_policy.actions_of(states)
+        elif self.state_indexer is not None:
+            actions = np.argmax(self.q_table[states], axis=1)
+        elif states:
+            # Unseen states act as zero rows, without adding them to the table
+            zero_row = np.zeros(n_actions, dtype=np.float32)
+            actions = np.argmax(np.stack([self.q_table.get(state, zero_row) for state in states]), axis=1)
+        else:
+            actions = np.zeros(0, dtype=np.int64)
+        if not deterministic:
+            explore = np.random.rand(len(actions)) <= self.exploration_rate
+            actions[explore] = self.env.action_space.np_random.integers(n_actions, size=int(explore.sum()))
+        return actions
+
+    def compile_policy(self) -> GreedyPolicy:
+        """Freeze the greedy action of every state into a GreedyPolicy used by predict until
+        the next TD update, reusing the current one if there was none since."""
+        if self.compiled_policy is None:
+            self.compiled_policy = GreedyPolicy(self._serialize_state, self._greedy_actions())
+        return self.compiled_policy
+
+    def _greedy_actions(self) -> np.ndarray | dict:
+        """Greedy action of every row for the dense backend, else of every state whose greedy
+        action is not 0, the greedy action of a zero row and so of unseen states."""
+        n_actions = self.env.action_space.n
+        action_dtype = np.min_scalar_type(n_actions - 1)
+        if self.q_table_backend == "dense":
+            actions = np.argmax(self.q_table, axis=1).astype(action_dtype)
+        else:
+            # Rows of a loaded table are read from its file, not copied into its overlay
+            rows = self.q_table.iter_rows() if isinstance(self.q_table, MappedQTable) else self.q_table.items()
+            states, values = [], []
+            for state, row in rows:
+                states.append(state)
+                values.append(row)
+            greedy = np.argmax(np.stack(values), axis=1).tolist() if values else []
+            actions = {state: action for state, action in zip(states, greedy) if action != 0}
+        return actions
+
+    def greedy_policy_key(self) -> str:
+        """Hash of the greedy policy, equal for Q-tables with the same greedy actions.
+        The compiled policy is used if current, but none is stored."""
+        if self.compiled_policy is not None:
+            return self.compiled_policy.key()
+        return GreedyPolicy(self._serialize_state, self._greedy_actions()).key()
+
+    def close(self):
+        """Stop the actor processes, if any. The next learn call starts new ones."""
+        if self.actor_pool is not None:
+            self.actor_pool.close()
+            self.actor_pool = None
+
+    def __getstate__(self):
+        """Pickled copies, e.g. of parallel evaluations, do not share the actor processes."""
+        return {**self.__dict__, "actor_pool": None}
+
+    def _checkpoint_metadata(self) -> dict:
+        """Reducer and hyperparameters stored alongside the Q-table."""
+        reducer = getattr(self, "reducer", None)
+        return {
+            "reducer": None if reducer is None else type(reducer).__name__,
+            "symmetries": getattr(self.env, "symmetries", None),
+            "hyperparameters": {
+                "learning_rate": self.learning_rate,
+                "discount_factor": self.discount_factor,
+                "exploration_rate": self.exploration_rate,
+                "exploration_decay": self.exploration_decay,
+                "min_exploration_rate": self.min_exploration_rate,
+                "planning_steps": self.planning_steps,
+                "planning": self.planning,
+                "priority_threshold": self.priority_threshold,
+            },
+        }
 
     def save(self, path):
         """
-        Save the Q-table.
+        Save the Q-table and its metadata in the pickle-free Q-table file format.
+        The greedy actions are not saved: compile_policy derives them from the loaded table,
+        reading a dict table straight from its file.
         """
-        with open(path, 'wb') as f:
-            # Convert defaultdict to dict for saving
-            np.save(f, dict(self.q_table))
+        save_q_table(path, self.q_table, self.env.action_space.n, self._checkpoint_metadata())
 
     def load(self, path):
         """
-        Load the Q-table.
+        Load a Q-table saved by save. The file is memory-mapped, so only the states
+        looked up are read. The saved exploration rate and planning settings are restored
+        if known, planning starting from an empty model.
         """
-        with open(path, 'rb') as f:
-            q_table = np.load(f, allow_pickle=True).item()
-            self.q_table = defaultdict(lambda: np.zeros(
-                self.env.action_space.n), q_table)
+        header, q_table = load_q_table(path)
+        expected = self._checkpoint_metadata()
+        if header["backend"] != self.q_table_backend:
+            raise ValueError(f"Saved Q-table uses the {header['backend']} backend, "
+                             f"expected {self.q_table_backend}.")
+        if header.get("reducer", expected["reducer"]) != expected["reducer"]:
+            raise ValueError(f"Saved Q-table was learned with reducer {header['reducer']}, "
+                             f"expected {expected['reducer']}.")
+        if header.get("symmetries", expected["symmetries"]) != expected["symmetries"]:
+            raise ValueError(f"Saved Q-table was learned with symmetries {header['symmetries']}, "
+                             f"expected {expected['symmetries']}.")
+        if self.state_indexer is not None and q_table.shape != self.q_table.shape:
+            raise ValueError(f"Saved Q-table has shape {q_table.shape}, "
+                             f"expected {self.q_table.shape}.")
+        if header["n_actions"] != self.env.action_space.n:
+            raise ValueError(f"Saved Q-table has {header['n_actions']} actions, "
+                             f"expected {self.env.action_space.n}.")
+        hyperparameters = header.get("hyperparameters", {})
+        planning_steps = hyperparameters.get("planning_steps", self.planning_steps)
+        if planning_steps and self.n_actors > 1:
+            raise ValueError("Saved Q-table was learned with planning, which is not supported with several actors.")
+        # The actors and the compiled policy come from the previous Q-table
+        self.close()
+        self.compiled_policy = None
+        self.q_table = q_table
+        self.exploration_rate = hyperparameters.get("exploration_rate", self.exploration_rate)
+        self.planning = hyperparameters.get("planning", self.planning)
+        self.priority_threshold = hyperparameters.get("priority_threshold", self.priority_threshold)
+        if planning_steps != self.planning_steps:
+            self.planning_steps = planning_steps
+            self.model = TransitionModel(self.env.action_space.n) if planning_steps else None
+            self.priority_queue = []
+            self.priority_queue_rebuild = self.MIN_PRIORITY_QUEUE_REBUILD
@@ -0,0 +1,117 @@
+"""Learned transition model for Dyna-Q and prioritized sweeping planning."""
+
+import numpy as np
+
+
+def _grown(array: np.ndarray, length: int, fill) -> np.ndarray:
+    """Return a copy of array with a first axis of at least length, padded with fill."""
+    new_length = max(length, 2 * len(array))
+    grown = np.full((new_length, *array.shape[1:]), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class TransitionModel:
+    """
+    Deterministic model of the observed transitions: the last reward and next state seen
+    for every (state, action) pair, as Dyna-Q assumes.
+
+    Serialized states get consecutive ids. Rewards, next states, the list of observed pairs,
+    the predecessor edges and the queued priorities used by prioritized sweeping are arrays
+    grown by doubling. A pair is identified by state_id * n_actions + action.
+    """
+
+    def __init__(self, n_actions: int, capacity: int = 1024):
+        self.n_actions = n_actions
+        self.states = []  # Serialized state of every id
+        self.state_ids = {}
+        self.next_states = np.full((capacity, n_actions), -1, dtype=np.int64)  # -1 if unobserved
+        self.rewards = np.zeros((capacity, n_actions), dtype=np.float64)
+        # Priority of the queued prioritized sweeping update of every pair, 0 if none
+        self.priorities = np.zeros((capacity, n_actions), dtype=np.float64)
+        self.observed_pairs = np.zeros(capacity, dtype=np.int64)
+        self.n_pairs = 0
+        # Predecessors as linked lists of edges: the last edge into every state, then the pair
+        # of every edge and the previous edge into the same state (-1 at the end of the list)
+        self.last_edge = np.full(capacity, -1, dtype=np.int64)
+        self.edge_pairs = np.zeros(capacity, dtype=np.int64)
+        self.edge_previous = np.zeros(capacity, dtype=np.int64)
+        self.n_edges = 0
+
+    def state_id(self, state) -> int:
+        """Return the id of a serialized state, registering new states."""
+        state_id = self.state_ids.get(state)
+        if state_id is None:
+            state_id = len(self.states)
+            self.state_ids[state] = state_id
+            self.states.append(state)
+            if state_id >= len(self.next_states):
+                self.next_states = _grown(self.next_states, state_id + 1, -1)
+                self.rewards = _grown(self.rewards, state_id + 1, 0)
+                self.priorities = _grown(self.priorities, state_id + 1, 0)
+                self.last_edge = _grown(self.last_edge, state_id + 1, -1)
+        return state_id
+
+    def pair(self, state, action) -> int:
+        """Return the pair id of a state and action."""
+        return self.state_id(state) * self.n_actions + int(action)
+
+    def update(self, state, action: int, reward: float, next_state):
+        """Record a real transition, replacing the previous outcome of the pair."""
+        state_id, next_id = self.state_id(state), self.state_id(next_state)
+        pair = state_id * self.n_actions + int(action)
+        previous_id = self.next_states[state_id, action]
+        if previous_id < 0:
+            if self.n_pairs == len(self.observed_pairs):
+                self.observed_pairs = _grown(self.observed_pairs, self.n_pairs + 1, 0)
+            self.observed_pairs[self.n_pairs] = pair
+            self.n_pairs += 1
+        if previous_id != next_id:
+            # Edges of outdated outcomes stay in the lists until predecessors unlinks them
+            if self.n_edges == len(self.edge_pairs):
+                self.edge_pairs = _grown(self.edge_pairs, self.n_edges + 1, 0)
+                self.edge_previous = _grown(self.edge_previous, self.n_edges + 1, 0)
+            self.edge_pairs[self.n_edges] = pair
+            self.edge_previous[self.n_edges] = self.last_edge[next_id]
+            self.last_edge[next_id] = self.n_edges
+            self.n_edges += 1
+        self.next_states[state_id, action] = next_id
+        self.rewards[state_id, action] = reward
+
+    def transition(self, pair: int) -> tuple:
+        """Return the modelled (state, action, reward, next_state) of a pair."""
+        state_id, action = divmod(pair, self.n_actions)
+        return (self.states[state_id], action, float(self.rewards[state_id, action]),
+                self.states[self.next_states[state_id, action]])
+
+    def sample(self, n_samples: int) -> list[tuple]:
+        """Return the modelled transitions of n_samples observed pairs drawn uniformly."""
+        pairs = self.observed_pairs[np.random.randint(self.n_pairs, size=n_samples)]
+        state_ids, actions = np.divmod(pairs, self.n_actions)
+        rewards = self.rewards[state_ids, actions].tolist()
+        next_ids = self.next_states[state_ids, actions].tolist()
+        states = self.states
+        return [(states[state_id], action, reward, states[next_id]) for state_id, action, reward, next_id
+                in zip(state_ids.tolist(), actions.tolist(), rewards, next_ids)]
+
+    def predecessors(self, state) -> list[int]:
+        """Return the pairs whose modelled next state is state.
+        Outdated and repeated edges met on the way are unlinked, so later calls skip them."""
+        state_id = self.state_ids.get(state)
+        if state_id is None:
+            return []
+        pairs, seen = [], set()
+        last_kept = -1
+        edge = int(self.last_edge[state_id])
+        while edge >= 0:
+            pair, previous = int(self.edge_pairs[edge]), int(self.edge_previous[edge])
+            if self.next_states.flat[pair] == state_id and pair not in seen:
+                pairs.append(pair)
+                seen.add(pair)
+                last_kept = edge
+            elif last_kept < 0:
+                self.last_edge[state_id] = previous
+            else:
+                self.edge_previous[last_kept] = previous
+            edge = previous
+        return pairs
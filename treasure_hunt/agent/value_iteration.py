@@ -0,0 +1,196 @@
+"""Exact model-based planner solving treasure hunt environments by value iteration."""
+
+import hashlib
+
+import numpy as np
+import gymnasium as gym
+
+from ..environment import FixedTreasureHuntEnv, hero_transition_tables
+from .tabular_qlearner import TabularQLearner
+
+
+class ValueIterationPlanner:
+    """
+    Planner computing the optimal Q-values of a treasure hunt environment from its known dynamics.
+    Same interface as TabularQLearner: learn solves the model once, predict is greedy.
+
+    States are (monster layout, hero position) pairs for the treasure position set by the env.
+    Only the monster layouts reachable from the env's initial layouts are considered.
+    """
+
+    def __init__(self, env: gym.Env, discount_factor=0.99, tolerance=1e-4, max_iterations=10000):
+        self.env = env
+        self.discount_factor = discount_factor
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+        unwrapped = env.unwrapped
+        if unwrapped.obs_mode != "dict":
+            raise ValueError(f"The planner needs dict observations, got {unwrapped.obs_mode}.")
+        self.env_size = unwrapped.ENV_SIZE
+        self.n_cells = self.env_size**2
+        self.n_monsters = unwrapped.n_monsters
+        self.treasure_position = self.n_cells - 1
+
+        self.layouts = None  # (n_layouts, n_monsters) array of encoded monster positions
+        self.layout_index = None  # Layout code to row of self.layouts, -1 if unreachable
+        self.q_values = None  # (n_layouts, n_cells, n_actions) optimal Q-values
+        self.iterations = 0
+
+    def _layout_codes(self, layouts: np.ndarray) -> np.ndarray:
+        """Encode monster layouts (last axis) as single integers."""
+        return layouts @ (self.n_cells ** np.arange(self.n_monsters - 1, -1, -1))
+
+    def _decode_layouts(self, codes: np.ndarray) -> np.ndarray:
+        """Decode layout codes back to (len(codes), n_monsters) arrays of positions."""
+        return np.stack(np.unravel_index(codes, (self.n_cells,) * self.n_monsters), axis=1)
+
+    def _initial_layouts(self) -> np.ndarray:
+        """Return the monster layouts the env can start from."""
+        unwrapped = self.env.unwrapped
+        if isinstance(unwrapped, FixedTreasureHuntEnv):
+            return np.array([unwrapped.FIXED_LAYOUT["monster_positions"]])
+        layouts = self._decode_layouts(np.arange(self.n_cells**self.n_monsters))
+        return layouts[~np.any(layouts == self.treasure_position, axis=1)]
+
+    def _build_model(self):
+        """Enumerate the reachable monster layouts and their transition probabilities.
+        Return the (n_layouts, n_outcomes) successor rows and probabilities."""
+        if self.n_cells**self.n_monsters > 10**8:
+            raise ValueError(f"{self.n_monsters} monsters on a {self.env_size}x{self.env_size} "
+                             "grid is too large for exact planning.")
+        strategy = self.env.unwrapped.monster_strategy
+        layout_index = np.full(self.n_cells**self.n_monsters, -1, dtype=np.int64)
+        frontier = self._initial_layouts()
+        layout_index[self._layout_codes(frontier)] = np.arange(len(frontier))
+        layouts, successors, probabilities = [frontier], [], []
+        n_layouts = len(frontier)
+        while len(frontier) > 0:
+            proposals, proposal_probabilities = strategy.proposal_distribution(
+                frontier, self.env_size)
+            # The env rejects the whole move if a monster enters the treasure or two collide
+            sorted_proposals = np.sort(proposals, axis=2)
+            rejected = (np.any(proposals == self.treasure_position, axis=2)
+                        | np.any(sorted_proposals[..., 1:] == sorted_proposals[..., :-1], axis=2))
+            proposals = np.where(rejected[..., None], frontier[:, None, :], proposals)
+            codes = self._layout_codes(proposals)
+            new_codes = np.unique(codes[layout_index[codes] < 0])
+            layout_index[new_codes] = np.arange(n_layouts, n_layouts + len(new_codes))
+            n_layouts += len(new_codes)
+            successors.append(codes)
+            probabilities.append(proposal_probabilities)
+            frontier = self._decode_layouts(new_codes)
+            layouts.append(frontier)
+
+        self.layouts = np.concatenate(layouts)
+        self.layout_index = layout_index
+        return layout_index[np.concatenate(successors)], np.concatenate(probabilities)
+
+    def solve(self):
+        """Compute the optimal Q-values by value iteration over all states at once."""
+        unwrapped = self.env.unwrapped
+        successors, probabilities = self._build_model()
+        n_layouts = len(self.layouts)
+        next_position, is_invalid = hero_transition_tables(self.env_size)
+
+        # occupied[cell, layout]: a monster of the layout stands on the cell
+        occupied = np.zeros((self.n_cells, n_layouts), dtype=bool)
+        occupied[self.layouts, np.arange(n_layouts)[:, None]] = True
+        # Probability for a hero standing on a cell to be caught by the monsters' move
+        caught_after = np.zeros((self.n_cells, n_layouts))
+        for outcome in range(successors.shape[1]):
+            caught_after += occupied[:, successors[:, outcome]] * probabilities[:, outcome]
+
+        # Arrays indexed by (hero position, action, layout), following BaseTreasureHuntEnv.step
+        found = (next_position == self.treasure_position)[:, :, None]
+        caught_before = occupied[next_position]
+        caught_next = caught_after[next_position]
+        step_reward = np.where(is_invalid, unwrapped.INVALID_MOVE_PENALTY,
+                               unwrapped.SLACK_PENALTY)[:, :, None]
+        immediate = np.where(
+            found, unwrapped.TREASURE_REWARD,
+            np.where(caught_before, unwrapped.CAUGHT_BY_MONSTER_PENALTY,
+                     unwrapped.CAUGHT_BY_MONSTER_PENALTY * caught_next
+                     + step_reward * (1 - caught_next)))
+        continues = ~found & ~caught_before
+
+        values = np.zeros((self.n_cells, n_layouts))
+        for self.iterations in range(1, self.max_iterations + 1):
+            # Expected value of the next state, counting only outcomes where the hero survives
+            surviving_values = np.where(occupied, 0, values)
+            expected = np.zeros_like(values)
+            for outcome in range(successors.shape[1]):
+                expected += surviving_values[:, successors[:, outcome]] * probabilities[:, outcome]
+            q_values = immediate + self.discount_factor * continues * expected[next_position]
+            new_values = q_values.max(axis=1)
+            delta = np.max(np.abs(new_values - values))
+            values = new_values
+            if delta < self.tolerance:
+                break
+
+        self.q_values = q_values.transpose(2, 0, 1).astype(np.float32)
+
+    def learn(self, total_timesteps=None):
+        """Solve the model if needed. The number of timesteps is ignored."""
+        if self.q_values is None:
+            self.solve()
+
+    def _layout_row(self, monster_positions) -> int:
+        """Return the row of self.q_values for a monster layout."""
+        row = self.layout_index[self._layout_codes(np.asarray(monster_positions))]
+        if row < 0:
+            raise ValueError(f"Monster layout {monster_positions} is not reachable.")
+        return row
+
+    def predict(self, observation, deterministic=True):
+        """
+        Predict the optimal action given the observation.
+        SB3-compatible interface. The policy is always greedy.
+        """
+        self.learn()
+        if observation["treasure_position"] != self.treasure_position:
+            raise ValueError(f"Planned for a treasure at {self.treasure_position}, "
+                             f"got {observation['treasure_position']}.")
+        row = self._layout_row(observation["monster_positions"])
+        return np.argmax(self.q_values[row, observation["hero_position"]]), None
+
+    def greedy_policy_key(self) -> str:
+        """Hash of the optimal actions, see TabularQLearner.greedy_policy_key."""
+        self.learn()
+        return hashlib.blake2b(np.argmax(self.q_values, axis=2).tobytes(), digest_size=16).hexdigest()
+
+    def warm_start(self, agent: TabularQLearner):
+        """Copy the optimal Q-values into the Q-table of a TabularQLearner."""
+        if getattr(agent, "reducer", None) is not None:
+            raise ValueError("Optimal Q-values are only defined for unreduced states.")
+        self.learn()
+        for row, layout in enumerate(self.layouts):
+            monster_positions = tuple(int(pos) for pos in layout)
+            for hero_position in range(self.n_cells):
+                if hero_position == self.treasure_position or hero_position in monster_positions:
+                    continue  # Terminal, never observed
+                state = agent._serialize_state({  # pylint: disable=protected-access
+                    "hero_position": hero_position,
+                    "treasure_position": self.treasure_position,
+                    "monster_positions": monster_positions,
+                })
+                # A copy, or TD updates of a dict Q-table would write into q_values
+                agent.q_table[state] = self.q_values[row, hero_position].copy()
+
+    def save(self, path):
+        """
+        Save the solved Q-values and layouts.
+        """
+        self.learn()
+        with open(path, 'wb') as f:
+            np.savez(f, q_values=self.q_values, layouts=self.layouts)
+
+    def load(self, path):
+        """
+        Load solved Q-values and layouts.
+        """
+        with np.load(path) as data:
+            self.q_values = data["q_values"]
+            self.layouts = data["layouts"]
+        self.layout_index = np.full(self.n_cells**self.n_monsters, -1, dtype=np.int64)
+        self.layout_index[self._layout_codes(self.layouts)] = np.arange(len(self.layouts))
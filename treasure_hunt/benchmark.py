@@ -0,0 +1,317 @@
+"""Micro-benchmarks of the environment and agent hot paths, and comparison against a baseline."""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import AbstractContextManager, ExitStack, contextmanager
+from datetime import datetime
+
+import numpy as np
+from gymnasium import make, registry
+
+from .agent import SimplifierQLearner, TabularQLearner
+from .agent.env_reducer import NearSightedReducer, ObliviousReducer
+from .environment import FlattenTreasureWrapper
+
+SEED = 0
+N_OBSERVATIONS = 1024  # Observations cycled through by the observation benchmarks
+N_SAVED_STATES = 10000  # States in the Q-table of the save and load benchmarks
+
+
+def environment_ids():
+    """IDs of the registered treasure hunt environments."""
+    return sorted(env_id for env_id, spec in registry.items()
+                  if isinstance(spec.entry_point, str) and spec.entry_point.startswith("treasure_hunt."))
+
+
+def _make_env(env_id="RandomMonsterTreasureHunt-v0"):
+    """Create and seed an environment."""
+    env = make(env_id, max_episode_steps=500)
+    env.reset(seed=SEED)
+    env.action_space.seed(SEED)
+    return env
+
+
+def _sample_observations(env, n_observations=N_OBSERVATIONS):
+    """Collect observations along random episodes."""
+    observations = [env.reset(seed=SEED)[0]]
+    while len(observations) < n_observations:
+        obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        observations.append(env.reset()[0] if terminated or truncated else obs)
+    return observations
+
+
+def _trained_agent(env, n_states=N_SAVED_STATES):
+    """Tabular agent with n_states random Q-table rows."""
+    agent = TabularQLearner(env)
+    rng = np.random.default_rng(SEED)
+    space = env.observation_space
+    for hero, treasure, *monsters in rng.integers(
+            0, space["hero_position"].n, size=(n_states, 2 + len(space["monster_positions"]))):
+        agent.q_table[(int(hero), int(treasure), tuple(int(pos) for pos in monsters))] = \
+            rng.random(env.action_space.n)
+    return agent
+
+
+def bench_env_step(env_id):
+    """env.step with random actions, resetting finished episodes."""
+    env = _make_env(env_id)
+    actions = itertools.cycle(np.random.default_rng(SEED).integers(0, env.action_space.n, 4096))
+
+    def step():
+        _, _, terminated, truncated, _ = env.step(next(actions))
+        if terminated or truncated:
+            env.reset()
+    return step
+
+
+def bench_env_reset(env_id):
+    """env.reset without a seed."""
+    env = _make_env(env_id)
+    return env.reset
+
+
+def bench_flatten_observation():
+    """FlattenTreasureWrapper.observation."""
+    env = FlattenTreasureWrapper(_make_env())
+    observations = itertools.cycle(_sample_observations(env.unwrapped))
+    return lambda: env.observation(next(observations))
+
+
+def bench_reducer(reducer_class):
+    """reduce_observation of an environment reducer."""
+    env = _make_env()
+    reducer = reducer_class(env.unwrapped)
+    observations = itertools.cycle(_sample_observations(env))
+    return lambda: reducer.reduce_observation(next(observations))
+
+
+def bench_reduce_batch(reducer_class):
+    """reduce_batch of an environment reducer on N_OBSERVATIONS flattened observations per call."""
+    env = _make_env()
+    reducer = reducer_class(env.unwrapped)
+    flatten = FlattenTreasureWrapper(env)
+    observations = np.array([flatten.observation(obs) for obs in _sample_observations(env)])
+    return lambda: reducer.reduce_batch(observations)
+
+
+def bench_update_q_value():
+    """TabularQLearner._update_q_value on consecutive states."""
+    env = _make_env()
+    agent = TabularQLearner(env)
+    states = [agent._serialize_state(obs)  # pylint: disable=protected-access
+              for obs in _sample_observations(env)]
+    transitions = itertools.cycle(zip(states, np.random.default_rng(SEED).integers(
+        0, env.action_space.n, len(states)), states[1:]))
+
+    def update():
+        state, action, next_state = next(transitions)
+        agent._update_q_value(state, action, -1, next_state)  # pylint: disable=protected-access
+    return update
+
+
+def bench_select_action():
+    """TabularQLearner._select_action with exploration."""
+    env = _make_env()
+    agent = TabularQLearner(env, exploration_rate=0.5)
+    states = itertools.cycle([agent._serialize_state(obs)  # pylint: disable=protected-access
+                              for obs in _sample_observations(env)])
+    np.random.seed(SEED)
+    return lambda: agent._select_action(next(states), deterministic=False)  # pylint: disable=protected-access
+
+
+def bench_predict():
+    """TabularQLearner.predict, greedy."""
+    env = _make_env()
+    agent = TabularQLearner(env)
+    observations = itertools.cycle(_sample_observations(env))
+    return lambda: agent.predict(next(observations), deterministic=True)
+
+
+def bench_compiled_predict():
+    """TabularQLearner.predict on the compiled policy of N_SAVED_STATES states, greedy."""
+    env = _make_env()
+    agent = _trained_agent(env)
+    agent.compile_policy()
+    observations = itertools.cycle(_sample_observations(env))
+    return lambda: agent.predict(next(observations), deterministic=True)
+
+
+def bench_predict_batch():
+    """Greedy SimplifierQLearner.predict with a near-sighted dense Q-table on N_OBSERVATIONS
+    flattened observations per call."""
+    env = _make_env()
+    agent = SimplifierQLearner(env, NearSightedReducer(env.unwrapped), q_table_backend="dense")
+    agent.q_table[:] = np.random.default_rng(SEED).random(agent.q_table.shape)
+    flatten = FlattenTreasureWrapper(env)
+    observations = np.array([flatten.observation(obs) for obs in _sample_observations(env)])
+    return lambda: agent.predict(observations, deterministic=True)
+
+
+@contextmanager
+def bench_save():
+    """TabularQLearner.save of a Q-table of N_SAVED_STATES states."""
+    agent = _trained_agent(_make_env())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "agent")
+        yield lambda: agent.save(path)
+
+
+@contextmanager
+def bench_load():
+    """TabularQLearner.load of a Q-table of N_SAVED_STATES states, then a lookup."""
+    env = _make_env()
+    agent = TabularQLearner(env)
+    observation = env.reset(seed=SEED)[0]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "agent")
+        _trained_agent(env).save(path)
+
+        def load():
+            agent.load(path)
+            agent.predict(observation)
+        yield load
+
+
+def benchmarks():
+    """Name and setup function of every benchmark. A setup function returns the timed callable,
+    or a context manager giving it and cleaning up after the timing, e.g. temporary files."""
+    cases = {}
+    for env_id in environment_ids():
+        cases[f"env_step[{env_id}]"] = lambda env_id=env_id: bench_env_step(env_id)
+        cases[f"env_reset[{env_id}]"] = lambda env_id=env_id: bench_env_reset(env_id)
+    cases.update({
+        "flatten_observation": bench_flatten_observation,
+        "near_sighted_reduce": lambda: bench_reducer(NearSightedReducer),
+        "oblivious_reduce": lambda: bench_reducer(ObliviousReducer),
+        "near_sighted_reduce_batch": lambda: bench_reduce_batch(NearSightedReducer),
+        "oblivious_reduce_batch": lambda: bench_reduce_batch(ObliviousReducer),
+        "q_update": bench_update_q_value,
+        "select_action": bench_select_action,
+        "predict": bench_predict,
+        "compiled_predict": bench_compiled_predict,
+        "predict_batch": bench_predict_batch,
+        "save": bench_save,
+        "load": bench_load,
+    })
+    return cases
+
+
+def time_callable(function, min_time=0.2, repeat=5):
+    """
+    Return the best time per call of function over repeat runs.
+    The number of calls per run is doubled until a run lasts at least min_time.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    runs = [elapsed]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        runs.append(time.perf_counter() - start)
+    return min(runs) / number, number
+
+
+def run_benchmarks(selected=None, min_time=0.2, repeat=5, verbose=True):
+    """Run the benchmarks whose name contains one of the selected substrings (all by default).
+    Return the results, with the machine's description."""
+    results = {}
+    for name, setup in benchmarks().items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        np.random.seed(SEED)
+        with ExitStack() as stack:
+            function = setup()
+            if isinstance(function, AbstractContextManager):
+                function = stack.enter_context(function)
+            seconds, number = time_callable(function, min_time=min_time, repeat=repeat)
+        results[name] = {"ops_per_second": 1 / seconds, "seconds_per_op": seconds,
+                         "calls_per_run": number, "runs": repeat}
+        if verbose:
+            print(f"{name:50s} {1 / seconds:14,.0f} ops/s")
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold=0.1):
+    """
+    Compare the throughput of the benchmarks run in both baseline and current.
+    Return one row per benchmark, flagged as a regression if current is slower than
+    baseline by more than the threshold (a fraction of the baseline throughput).
+    """
+    rows = []
+    for name in baseline["results"].keys() & current["results"].keys():
+        before = baseline["results"][name]["ops_per_second"]
+        after = current["results"][name]["ops_per_second"]
+        rows.append({"name": name, "baseline": before, "current": after,
+                     "change": after / before - 1, "regression": after < before * (1 - threshold)})
+    return sorted(rows, key=lambda row: row["name"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the environment and agent hot paths, or compare two benchmark files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save their results as JSON.")
+    run_parser.add_argument("--output", default=os.path.join("results", "benchmarks.json"),
+                            help="Path of the results file.")
+    run_parser.add_argument("--filter", nargs="+", default=None,
+                            help="Only run the benchmarks whose name contains one of these strings.")
+    run_parser.add_argument("--min-time", type=float, default=0.2,
+                            help="Minimum duration in seconds of a timed run.")
+    run_parser.add_argument("--repeat", type=int, default=5,
+                            help="Number of timed runs per benchmark, the best one is kept.")
+
+    compare_parser = commands.add_parser(
+        "compare", help="Flag the benchmarks slower than in a baseline. Exits with 1 on regressions.")
+    compare_parser.add_argument("baseline", help="Baseline results file.")
+    compare_parser.add_argument("current", help="Current results file.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Tolerated throughput loss, as a fraction of the baseline.")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmarks(args.filter, min_time=args.min_time, repeat=args.repeat)
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to '{args.output}'.")
+        return
+
+    with open(args.baseline, encoding='utf8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf8') as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:50s} {row['baseline']:14,.0f} -> {row['current']:14,.0f} ops/s "
+              f"{row['change']:+7.1%} {flag}")
+    regressions = [row["name"] for row in rows if row["regression"]]
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}.")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Convert the legacy pickled Q-table checkpoints under a results folder to the Q-table file format."""
+import argparse
+import os
+import sys
+
+from .agent.q_table_file import convert_legacy_checkpoint
+
+
+def convert_results(results_root='results'):
+    """
+    Convert every legacy `agent` file under results_root in place.
+    A file failing to convert is reported and left as is, the others are still converted.
+    Return the converted paths, and the error of every failed path.
+    """
+    converted, failed = [], {}
+    for folder, _, files in os.walk(results_root):
+        if 'agent' in files:
+            path = os.path.join(folder, 'agent')
+            try:
+                if convert_legacy_checkpoint(path):
+                    converted.append(path)
+                    print(f"Converted '{path}'.")
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                failed[path] = repr(error)
+                print(f"Failed to convert '{path}': {error!r}")
+    return converted, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert legacy pickled Q-table checkpoints to the memory-mapped format. "
+                    "Checkpoints are unpickled, only convert trusted files.")
+    parser.add_argument("--results-root", default="results",
+                        help="Folder holding the results of every run.")
+
+    args = parser.parse_args()
+
+    converted, failed = convert_results(args.results_root)
+    print(f"{len(converted)} checkpoint(s) converted, {len(failed)} failed.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
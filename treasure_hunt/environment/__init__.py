@@ -2,3 +2,6 @@
 from .fixed_treasure_hunt_env import FixedTreasureHuntEnv
 from .base_treasure_hunt_env import BaseTreasureHuntEnv
 from .flatten_treasure_wrapper import FlattenTreasureWrapper
+from .canonical_treasure_wrapper import CanonicalTreasureWrapper
+from .batched_treasure_hunt_env import BatchedTreasureHuntEnv, BatchedFixedTreasureHuntEnv
+from .transitions import hero_transition_tables, monster_neighbor_tables, symmetry_tables
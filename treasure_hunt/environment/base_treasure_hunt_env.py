@@ -1,11 +1,15 @@
 """Base Implementation of a TreasureHuntEnv with logic common to all environments."""
 
 import gymnasium as gym
+import numpy as np
 from gymnasium import spaces
 from gymnasium import register
 import pygame
 
+from .frames import HERO_COLOR, MONSTER_COLOR, TREASURE_COLOR, FrameCanvas
+from .layouts import sample_layouts
 from .monster_strategy import MonsterMovementStrategy, StationaryStrategy
+from .transitions import hero_transition_tables
 
 
 class BaseTreasureHuntEnv(gym.Env):
@@ -14,29 +18,57 @@ class BaseTreasureHuntEnv(gym.Env):
     TREASURE_REWARD = 200  # Won the game
     CAUGHT_BY_MONSTER_PENALTY = -50  # Lost the game
     SLACK_PENALTY = -1  # Penalty for each step to encourage fast solves
-    ENV_SIZE = 10  # Constant for now, might change in the future
+    ENV_SIZE = 10  # Default grid size, overridden per instance by the env_size parameter
+    N_MONSTERS = 2  # Default number of monsters
+    VECTORIZED_MONSTER_COUNT = 32  # Monster moves are checked with arrays from this many monsters on
 
-    metadata = {"render_modes": ["ansi", "human"], 'render_fps': 5}
+    # "dict": dict of positions, "index": single integer state id,
+    # "array": int32 [hero, treasure, *monsters] vector, "one_hot": float32 one-hot positions
+    OBS_MODES = ("dict", "index", "array", "one_hot")
 
-    def __init__(self, render_mode=None, monster_strategy: MonsterMovementStrategy = None):
+    RGB_CELL_SIZE = 8  # Pixels per cell of rgb_array frames
+
+    metadata = {"render_modes": ["ansi", "human", "rgb_array"], 'render_fps': 5}
+
+    def __init__(self, render_mode=None, monster_strategy: MonsterMovementStrategy = None,
+                 env_size: int = None, n_monsters: int = None, layout_pool_size: int = 0,
+                 obs_mode: str = "dict"):
         super().__init__()
+        self.ENV_SIZE = self.ENV_SIZE if env_size is None else env_size  # pylint: disable=invalid-name
+        self.n_monsters = self.N_MONSTERS if n_monsters is None else n_monsters
+        if self.ENV_SIZE < 2 or not 0 < self.n_monsters <= self.ENV_SIZE**2 - 2:
+            raise ValueError(f"Cannot place {self.n_monsters} monsters, a hero and a treasure "
+                             f"on a {self.ENV_SIZE}x{self.ENV_SIZE} grid.")
 
         # Define the observation space: hero, treasure, monsters
-        self.observation_space = spaces.Dict({
-            # Flattened 10x10 grid
+        self.dict_observation_space = spaces.Dict({
+            # Flattened ENV_SIZE x ENV_SIZE grid
             "hero_position": spaces.Discrete(self.ENV_SIZE**2),
             "treasure_position": spaces.Discrete(self.ENV_SIZE**2),
-            # 2 monsters
-            "monster_positions": spaces.Tuple([spaces.Discrete(self.ENV_SIZE**2)] * 2),
+            "monster_positions": spaces.Tuple([spaces.Discrete(self.ENV_SIZE**2)] * self.n_monsters),
         })
+        self.obs_mode = obs_mode
+        self.observation_space = self._make_observation_space()
 
         # Define the action space: 4 directions
         # 0: up, 1: down, 2: left, 3: right
         self.action_space = spaces.Discrete(4)
+        # Hero moves are looked up rather than computed, see hero_transition_tables
+        self.next_position, self.is_invalid = hero_transition_tables(self.ENV_SIZE)
 
         self.hero_position = None
         self.treasure_position = None
-        self.monster_positions = None
+        # Monster positions are kept as a tuple, an array and a cell occupancy map,
+        # so collision checks are lookups rather than scans, see the monster_positions setter
+        self._monster_tuple = None
+        self._monster_array = np.zeros(0, dtype=np.int64)
+        self._occupied = np.zeros(self.ENV_SIZE**2, dtype=np.bool_)
+
+        # Optional pool of pre-sampled monster layouts, refilled layout_pool_size at a time
+        self.layout_pool_size = layout_pool_size
+        self._layout_pool = np.zeros((0, self.n_monsters), dtype=np.int64)
+        self._layout_pool_next = 0
+        self._layout_pool_excluded = None  # Cells the pooled layouts avoid
 
         if monster_strategy is not None:
             self.monster_strategy = monster_strategy
@@ -51,44 +83,81 @@ class BaseTreasureHuntEnv(gym.Env):
         if self.render_mode == "human":
             pygame.init()
             self.window_size = 600  # Size of the window
-            self.cell_size = self.window_size // self.ENV_SIZE
+            self.cell_size = max(1, self.window_size // self.ENV_SIZE)
             self.screen = pygame.display.set_mode(
                 (self.window_size, self.window_size))
             pygame.display.set_caption("Treasure Hunt")
+        elif self.render_mode == "rgb_array":
+            self.canvas = FrameCanvas(self.ENV_SIZE, self.RGB_CELL_SIZE)
 
     def reset(self, *, seed=None, options=None):
         super().reset(seed=seed, options=options)
         if seed is not None:
-            # Pass the seed to the observation space for reproducibility
-            self.observation_space.seed(seed)
+            # Layouts pooled before reseeding would break reproducibility
+            self._layout_pool_next = len(self._layout_pool)
 
         # Hero starts at the top-left corner
         self.hero_position = 0
         # Treasure is at the bottom-right corner
-        self.treasure_position = self.observation_space["treasure_position"].n - 1
+        self.treasure_position = self.ENV_SIZE**2 - 1
 
         # Initialize monster positions randomly
         self._initialize_monster_positions()
 
         return self._get_obs(), {}
 
+    @property
+    def deterministic(self) -> bool:
+        """Whether every episode unfolds the same for the same actions, so that a
+        deterministic policy always plays the same episode. Monster layouts are random here."""
+        return False
+
     def _initialize_monster_positions(self):
         """Setup the monster positions.
-        Unless overridden, this method initializes the monster positions randomly."""
-        position_ok = False
-        while not position_ok:  # Keep trying until monsters don't overlap with other objects
-            self.monster_positions = tuple(
-                self.observation_space["monster_positions"].sample())
-            if self._is_valid_state():
-                position_ok = True
-
-        return self._get_obs(), {}
+        Unless overridden, this method draws distinct monster positions uniformly
+        among the cells free of the hero and the treasure."""
+        excluded = (self.hero_position, self.treasure_position)
+        if not self.layout_pool_size:
+            self.monster_positions = sample_layouts(
+                self.np_random, self.ENV_SIZE**2, self.n_monsters, excluded)[0]
+            return
+
+        if self._layout_pool_next >= len(self._layout_pool) or excluded != self._layout_pool_excluded:
+            self._layout_pool = sample_layouts(self.np_random, self.ENV_SIZE**2, self.n_monsters,
+                                               excluded, n_layouts=self.layout_pool_size)
+            self._layout_pool_next = 0
+            self._layout_pool_excluded = excluded
+        self.monster_positions = self._layout_pool[self._layout_pool_next]
+        self._layout_pool_next += 1
+
+    @property
+    def monster_positions(self) -> tuple:
+        """Encoded positions of the monsters."""
+        return self._monster_tuple
+
+    @monster_positions.setter
+    def monster_positions(self, positions):
+        if positions is None:
+            self._monster_tuple = None
+            self._occupied[self._monster_array] = False
+            self._monster_array = np.zeros(0, dtype=np.int64)
+            return
+        # A copy, updated in place when monsters move, see _relocate_monsters
+        positions = np.array(positions, dtype=np.int64)
+        self._occupied[self._monster_array] = False
+        self._occupied[positions] = True
+        self._monster_array = positions
+        self._monster_tuple = tuple(positions.tolist())
+
+    def _is_on_monster(self, position: int) -> bool:
+        """Check if a monster stands on the (encoded) position."""
+        return bool(self._occupied[position])
 
     def _is_valid_state(self):
         """Check if the current state is valid."""
         return (self.hero_position != self.treasure_position
-                and self.hero_position not in self.monster_positions
-                and self.treasure_position not in self.monster_positions)
+                and not self._is_on_monster(self.hero_position)
+                and not self._is_on_monster(self.treasure_position))
 
     def step(self, action):
         # Takes a full turn of the hero, then the monsters
@@ -104,7 +173,7 @@ class BaseTreasureHuntEnv(gym.Env):
             terminated = True  # End the episode
 
         # Check if the hero has ran into a monster
-        elif self.hero_position in self.monster_positions:
+        elif self._is_on_monster(self.hero_position):
             # Negative reward for encountering a monster
             reward = self.CAUGHT_BY_MONSTER_PENALTY
             terminated = True  # End the episode
@@ -112,7 +181,7 @@ class BaseTreasureHuntEnv(gym.Env):
         self._move_monsters()
 
         # Check if the monsters caught the hero
-        if self.hero_position in self.monster_positions:
+        if self._is_on_monster(self.hero_position):
             # Negative reward for encountering a monster
             reward = self.CAUGHT_BY_MONSTER_PENALTY
             terminated = True  # End the episode
@@ -120,33 +189,55 @@ class BaseTreasureHuntEnv(gym.Env):
         return self._get_obs(), reward, terminated, truncated, info
 
     def _hero_move(self, action: int):
-        row, col = self.decode_position(self.hero_position)
-        if action == 0:  # Move up
-            row -= 1
-        elif action == 1:  # Move down
-            row += 1
-        elif action == 2:  # Move left
-            col -= 1
-        elif action == 3:  # Move right
-            col += 1
-        else:
+        # 0: up, 1: down, 2: left, 3: right
+        if not 0 <= action < self.action_space.n:
             raise ValueError(f"Invalid action {action}.")
-        if self._is_valid_position(row, col):
-            reward = self.SLACK_PENALTY
-            self.hero_position = self._encode_position(row, col)
-        else:
-            reward = self.INVALID_MOVE_PENALTY
-        return reward
+        if self.is_invalid[self.hero_position, action]:
+            return self.INVALID_MOVE_PENALTY
+        self.hero_position = int(self.next_position[self.hero_position, action])
+        return self.SLACK_PENALTY
 
     def _move_monsters(self):
         """Moves the monsters according to strategy."""
-        proposed_positions = self.monster_strategy.move_monsters(
-            [self.decode_position(pos) for pos in self.monster_positions],
-            self.hero_position, self.ENV_SIZE, self.np_random)
-        if self._is_valid_monster_move(proposed_positions):
+        # Encoded positions as a batch of one, see MonsterMovementStrategy.move_monsters_batch
+        current = self._monster_array[None, :]
+        proposed_positions = self.monster_strategy.move_monsters_batch(
+            current, np.array([self.hero_position]), self.ENV_SIZE, self.np_random)
+        # Nothing to check or update if the positions are returned as is, e.g. by StationaryStrategy
+        if proposed_positions is current:
+            return
+        proposed_positions = proposed_positions[0]
+        if self.n_monsters < self.VECTORIZED_MONSTER_COUNT:
+            # Plain Python is faster than arrays on a few monsters
+            proposed_positions = tuple(proposed_positions.tolist())
+            if proposed_positions == self._monster_tuple:
+                return
+        elif np.array_equal(proposed_positions, self._monster_array):
+            return
+        if self._is_valid_encoded_monster_move(proposed_positions):
             # Move if the proposed monster positions are valid, stay otherwise
-            self.monster_positions = tuple(
-                self._encode_position(*pos) for pos in proposed_positions)
+            self._relocate_monsters(proposed_positions)
+
+    def _relocate_monsters(self, positions):
+        """Move the monsters to valid new encoded positions, only updating the cells
+        and entries of the monsters that moved."""
+        if self.n_monsters < self.VECTORIZED_MONSTER_COUNT:
+            occupied, monster_array = self._occupied, self._monster_array
+            moved = [(i, before, after) for i, (before, after)
+                     in enumerate(zip(self._monster_tuple, positions)) if before != after]
+            # Free every vacated cell first, a monster may step into the cell of another
+            for _, before, _ in moved:
+                occupied[before] = False
+            for i, _, after in moved:
+                occupied[after] = True
+                monster_array[i] = after
+            self._monster_tuple = tuple(positions)
+            return
+        moved = np.flatnonzero(positions != self._monster_array)
+        self._occupied[self._monster_array[moved]] = False
+        self._occupied[positions[moved]] = True
+        self._monster_array[moved] = positions[moved]
+        self._monster_tuple = tuple(self._monster_array.tolist())
 
     def _is_valid_position(self, row, col):
         """Takes a proposed (decoded) position and checks if it's valid."""
@@ -162,36 +253,83 @@ class BaseTreasureHuntEnv(gym.Env):
                 repr(self.decode_position(pos)) for pos in self.monster_positions)}")
         elif self.render_mode == "human":
             self._render_human()
+        elif self.render_mode == "rgb_array":
+            # The canvas only repaints the cells that changed, copy so callers can keep frames
+            return self.canvas.draw(self.hero_position, self.treasure_position,
+                                    self.monster_positions).copy()
+        return None
 
     def _render_human(self):
         self.screen.fill((255, 255, 255))  # Fill the screen with white
 
         # Draw the hero
         hero_row, hero_col = self.decode_position(self.hero_position)
-        pygame.draw.rect(self.screen, (0, 0, 255), (hero_col * self.cell_size,
+        pygame.draw.rect(self.screen, HERO_COLOR, (hero_col * self.cell_size,
                          hero_row * self.cell_size, self.cell_size, self.cell_size))
 
         # Draw the treasure
         treasure_row, treasure_col = self.decode_position(
             self.treasure_position)
-        pygame.draw.rect(self.screen, (255, 215, 0), (treasure_col * self.cell_size,
+        pygame.draw.rect(self.screen, TREASURE_COLOR, (treasure_col * self.cell_size,
                          treasure_row * self.cell_size, self.cell_size, self.cell_size))
 
         # Draw the monsters
         for pos in self.monster_positions:
             monster_row, monster_col = self.decode_position(pos)
-            pygame.draw.rect(self.screen, (255, 0, 0), (monster_col * self.cell_size,
+            pygame.draw.rect(self.screen, MONSTER_COLOR, (monster_col * self.cell_size,
                              monster_row * self.cell_size, self.cell_size, self.cell_size))
 
         pygame.display.flip()
 
+    def _make_observation_space(self):
+        """Build the observation space of the obs_mode, and the buffers of the array modes."""
+        n_cells = self.ENV_SIZE**2
+        n_objects = 2 + self.n_monsters  # Hero, treasure and monsters
+        if self.obs_mode == "dict":
+            return self.dict_observation_space
+        if self.obs_mode == "index":
+            # Mixed-radix digits in the dict space's (sorted key) order: hero, monsters, treasure,
+            # as a StateIndexer over the dict space would number the states
+            n_states = n_cells**n_objects
+            if n_states > np.iinfo(np.int64).max:
+                raise ValueError(f"{n_states} states do not fit in int64 state ids.")
+            self._hero_stride = n_cells**(n_objects - 1)
+            self._monster_strides = n_cells ** np.arange(n_objects - 2, 0, -1, dtype=np.int64)
+            return spaces.Discrete(n_states)
+        if self.obs_mode == "array":
+            # Filled in place by _get_obs
+            self._obs_buffer = np.zeros(n_objects, dtype=np.int32)
+            return spaces.MultiDiscrete([n_cells] * n_objects, dtype=np.int32)
+        if self.obs_mode == "one_hot":
+            self._obs_buffer = np.zeros(n_objects * n_cells, dtype=np.float32)
+            self._one_hot_offsets = np.arange(n_objects, dtype=np.int64) * n_cells
+            self._one_hot_active = np.zeros(0, dtype=np.int64)  # Indices currently set to 1
+            return spaces.Box(0, 1, shape=(n_objects * n_cells,), dtype=np.float32)
+        raise ValueError(f"Unknown observation mode {self.obs_mode}, expected one of {self.OBS_MODES}.")
+
     def _get_obs(self):
-        """Return the current observation."""
-        return {
-            "hero_position": self.hero_position,
-            "treasure_position": self.treasure_position,
-            "monster_positions": tuple(self.monster_positions),
-        }
+        """Return the current observation, in the format of the obs_mode.
+        The array modes return the same buffer every time, updated in place."""
+        if self.obs_mode == "dict":
+            return {
+                "hero_position": self.hero_position,
+                "treasure_position": self.treasure_position,
+                "monster_positions": self.monster_positions,
+            }
+        if self.obs_mode == "index":
+            return (self.hero_position * self._hero_stride
+                    + int(self._monster_array @ self._monster_strides) + self.treasure_position)
+        if self.obs_mode == "array":
+            self._obs_buffer[0] = self.hero_position
+            self._obs_buffer[1] = self.treasure_position
+            self._obs_buffer[2:] = self._monster_array
+            return self._obs_buffer
+        active = self._one_hot_offsets + np.concatenate(
+            ([self.hero_position, self.treasure_position], self._monster_array))
+        self._obs_buffer[self._one_hot_active] = 0
+        self._obs_buffer[active] = 1
+        self._one_hot_active = active
+        return self._obs_buffer
 
     def _encode_position(self, row: int, col: int):
         """Convert row, col to a single integer position."""
@@ -216,22 +354,39 @@ class BaseTreasureHuntEnv(gym.Env):
         if len(proposed_positions) != len(self.monster_positions):
             return False
 
-        # Ensure positions are within bounds
-        if not all(self._is_valid_position(*pos) for pos in proposed_positions):
-            return False
+        # Off-grid positions are encoded as -1
+        return self._is_valid_encoded_monster_move(tuple(
+            self._encode_position(*pos) if self._is_valid_position(*pos) else -1
+            for pos in proposed_positions))
 
-        # Ensure no overlap with the treasure
-        if self.decode_position(self.treasure_position) in proposed_positions:
+    def _is_valid_encoded_monster_move(self, proposed_positions):
+        """
+        Check if all proposed monster positions are valid.
+        :param proposed_positions: Tuple of new encoded monster positions, -1 if off the grid,
+            or an array from VECTORIZED_MONSTER_COUNT monsters on.
+        :return: True if all positions are valid, False otherwise.
+        """
+        # Ensure the correct number of positions are provided
+        if len(proposed_positions) != len(self._monster_array):
             return False
 
-        # Ensure no two monsters share the same position
-        if len(proposed_positions) != len(set(proposed_positions)):
-            return False
+        if len(proposed_positions) < self.VECTORIZED_MONSTER_COUNT:
+            # Within bounds, no overlap with the treasure, no two monsters on the same cell
+            return (min(proposed_positions) >= 0
+                    and self.treasure_position not in proposed_positions
+                    and len(set(proposed_positions)) == len(proposed_positions))
 
-        return True
+        proposed_positions = np.asarray(proposed_positions)
+        # Ensure positions are within bounds and do not overlap with the treasure
+        if np.any(proposed_positions < 0) or np.any(proposed_positions == self.treasure_position):
+            return False
 
+        # Ensure no two monsters share the same position
+        sorted_positions = np.sort(proposed_positions)
+        return not np.any(sorted_positions[1:] == sorted_positions[:-1])
 
 register(
     id="BaseTreasureHunt-v0",
     entry_point="treasure_hunt.environment:BaseTreasureHuntEnv",
+    vector_entry_point="treasure_hunt.environment:BatchedTreasureHuntEnv",
 )
@@ -0,0 +1,169 @@
+"""Vectorized implementation of the TreasureHuntEnv stepping N grids at once."""
+
+import numpy as np
+from gymnasium.utils import seeding
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from .base_treasure_hunt_env import BaseTreasureHuntEnv
+from .fixed_treasure_hunt_env import FixedTreasureHuntEnv
+from .layouts import sample_layouts
+from .monster_strategy import MonsterMovementStrategy
+from .transitions import hero_transition_tables
+
+
+class BatchedTreasureHuntEnv(VectorEnv):
+    """Run N independent TreasureHuntEnv grids as NumPy arrays.
+
+    Sub-environment i behaves exactly like a scalar env reset with seed `seed + i`,
+    wrapped in a TimeLimit if `max_episode_steps` is set.
+    Finished sub-environments are reset on the next step (next-step autoreset).
+    """
+    single_env_class = BaseTreasureHuntEnv
+
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs: int, monster_strategy: MonsterMovementStrategy = None,
+                 max_episode_steps: int = None, env_size: int = None, n_monsters: int = None):
+        super().__init__()
+        self.num_envs = num_envs
+        self.max_episode_steps = max_episode_steps
+
+        # One scalar env is kept only for its spaces and constants
+        template = self.single_env_class(monster_strategy=monster_strategy, env_size=env_size,
+                                         n_monsters=n_monsters)
+        self.env_size = template.ENV_SIZE
+        self.next_position, self.is_invalid = hero_transition_tables(self.env_size)
+        self.monster_strategy = template.monster_strategy
+        self.single_observation_space = template.observation_space
+        self.single_action_space = template.action_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.n_monsters = len(self.single_observation_space["monster_positions"])
+
+        # Per sub-env random state, mirroring the scalar env's np_random
+        self._np_randoms = [None] * num_envs
+
+        self.hero_positions = np.zeros(num_envs, dtype=np.int64)
+        self.treasure_positions = np.zeros(num_envs, dtype=np.int64)
+        self.monster_positions = np.zeros((num_envs, self.n_monsters), dtype=np.int64)
+        self._elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self._autoreset_envs = np.zeros(num_envs, dtype=np.bool_)
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed, options=options)
+        if seed is None:
+            seeds = [None] * self.num_envs
+        elif isinstance(seed, int):
+            seeds = [seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+        if len(seeds) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} seeds, got {len(seeds)}.")
+
+        for i, env_seed in enumerate(seeds):
+            self._reset_env(i, env_seed)
+        self._autoreset_envs[:] = False
+        return self._get_obs(), {}
+
+    def _reset_env(self, index: int, seed=None):
+        """Reset a single sub-environment, consuming its random state like the scalar env."""
+        if seed is not None or self._np_randoms[index] is None:
+            self._np_randoms[index], _ = seeding.np_random(seed)
+
+        self.hero_positions[index] = 0
+        self.treasure_positions[index] = self.env_size**2 - 1
+        self._elapsed_steps[index] = 0
+        self._initialize_monster_positions(index)
+
+    def _initialize_monster_positions(self, index: int):
+        """Draw the monster positions of a sub-environment, like the scalar env without a pool."""
+        self.monster_positions[index] = sample_layouts(
+            self._np_randoms[index], self.env_size**2, self.n_monsters,
+            (self.hero_positions[index], self.treasure_positions[index]))[0]
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if np.any((actions < 0) | (actions >= self.single_action_space.n)):
+            raise ValueError(f"Invalid actions {actions}.")
+
+        resetting = self._autoreset_envs
+        active = ~resetting
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminated = np.zeros(self.num_envs, dtype=np.bool_)
+
+        # Hero moves, all sub-envs at once
+        invalid = self.is_invalid[self.hero_positions, actions]
+        self.hero_positions[active] = self.next_position[self.hero_positions, actions][active]
+        rewards[active] = np.where(invalid[active], self.single_env_class.INVALID_MOVE_PENALTY,
+                                   self.single_env_class.SLACK_PENALTY)
+
+        found = active & (self.hero_positions == self.treasure_positions)
+        rewards[found] = self.single_env_class.TREASURE_REWARD
+        terminated |= found
+        bumped = active & ~found & self._hero_on_monster()
+        rewards[bumped] = self.single_env_class.CAUGHT_BY_MONSTER_PENALTY
+        terminated |= bumped
+
+        self._move_monsters(active)
+
+        caught = active & self._hero_on_monster()
+        rewards[caught] = self.single_env_class.CAUGHT_BY_MONSTER_PENALTY
+        terminated |= caught
+
+        self._elapsed_steps[active] += 1
+        truncated = np.zeros(self.num_envs, dtype=np.bool_)
+        if self.max_episode_steps is not None:
+            truncated = active & (self._elapsed_steps >= self.max_episode_steps)
+
+        for index in np.flatnonzero(resetting):
+            self._reset_env(index)
+
+        self._autoreset_envs = terminated | truncated
+        return self._get_obs(), rewards, terminated, truncated, {}
+
+    def _hero_on_monster(self):
+        """Return a mask of the sub-envs where the hero shares a cell with a monster."""
+        return np.any(self.monster_positions == self.hero_positions[:, None], axis=1)
+
+    def _move_monsters(self, active):
+        """Move the monsters of the active sub-envs according to strategy."""
+        indices = np.flatnonzero(active)
+        if len(indices) == 0:
+            return
+        # Each sub-env draws from its own generator, like the scalar env would
+        proposed = self.monster_strategy.move_monsters_batch(
+            self.monster_positions[indices], self.hero_positions[indices], self.env_size,
+            [self._np_randoms[index] for index in indices])
+
+        # Same rules as BaseTreasureHuntEnv._is_valid_monster_move, on every row at once
+        valid = ~np.any(proposed < 0, axis=1)
+        valid &= ~np.any(proposed == self.treasure_positions[indices, None], axis=1)
+        sorted_proposed = np.sort(proposed, axis=1)
+        valid &= ~np.any(sorted_proposed[:, 1:] == sorted_proposed[:, :-1], axis=1)
+        self.monster_positions[indices[valid]] = proposed[valid]
+
+    def _get_obs(self):
+        """Return the current batched observation."""
+        return {
+            "hero_position": self.hero_positions.copy(),
+            "monster_positions": tuple(self.monster_positions[:, i].copy()
+                                       for i in range(self.n_monsters)),
+            "treasure_position": self.treasure_positions.copy(),
+        }
+
+
+class BatchedFixedTreasureHuntEnv(BatchedTreasureHuntEnv):
+    """Vectorized FixedTreasureHuntEnv: every sub-env starts from the fixed layout."""
+    single_env_class = FixedTreasureHuntEnv
+
+    def _reset_env(self, index: int, seed=None):
+        super()._reset_env(index, seed)
+        layout = self.single_env_class.FIXED_LAYOUT
+        self.hero_positions[index] = layout["hero_position"]
+        self.treasure_positions[index] = layout["treasure_position"]
+
+    def _initialize_monster_positions(self, index: int):
+        """The monsters always start from the fixed layout, without drawing from the random
+        state, so moving monsters draw the same moves as in the scalar env."""
+        self.monster_positions[index] = self.single_env_class.FIXED_LAYOUT["monster_positions"]
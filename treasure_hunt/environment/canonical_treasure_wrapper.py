@@ -0,0 +1,65 @@
+"""Wrapper mapping observations to canonical representatives of their symmetry class."""
+import gymnasium as gym
+import numpy as np
+
+from .transitions import GRID_SYMMETRIES, symmetry_tables
+
+# Grid symmetries tried by each canonicalization, monsters are always sorted
+SYMMETRY_GROUPS = {
+    "monsters": ("identity",),
+    "transpose": ("identity", "transpose"),
+    "dihedral": tuple(GRID_SYMMETRIES),
+}
+
+
+class CanonicalTreasureWrapper(gym.Wrapper):
+    """
+    A wrapper that gives equivalent states the same observation, so tabular agents store one
+    Q-table row per class of states rather than one per state.
+
+    Monsters all behave the same, so their positions are sorted. With symmetries="transpose",
+    the grid may also be transposed across the main diagonal, which keeps the default hero
+    start and treasure in place; with "dihedral", any of the 8 symmetries of the square applies.
+    Among these transforms, the one giving the smallest (treasure, hero, monsters) positions
+    is used, and the agent's actions are taken in the transformed frame: step maps them back
+    to the environment's frame. Monster moves of the built-in strategies commute with every
+    grid symmetry, so the transformed states have the same values.
+    """
+
+    def __init__(self, env: gym.Env, symmetries: str = "monsters"):
+        super().__init__(env)
+        if env.unwrapped.obs_mode != "dict":
+            raise ValueError(f"Canonical observations need dict observations, got {env.unwrapped.obs_mode}.")
+        if symmetries not in SYMMETRY_GROUPS:
+            raise ValueError(f"Unknown symmetries {symmetries}.")
+        self.symmetries = symmetries
+        positions, actions = symmetry_tables(env.unwrapped.ENV_SIZE, SYMMETRY_GROUPS[symmetries])
+        # Plain lists are faster than arrays to index one value at a time
+        self._positions = positions.tolist()
+        # Action in the environment's frame of every action in a transformed frame
+        self._env_actions = np.argsort(actions, axis=1).tolist()
+        self._transform = 0  # Symmetry of the current observation
+
+    def canonicalize(self, observation: dict) -> tuple[dict, int]:
+        """Return the canonical observation and the index of the symmetry applied to get it."""
+        hero, treasure = observation["hero_position"], observation["treasure_position"]
+        monsters = observation["monster_positions"]
+        best, best_transform = None, 0
+        for transform, table in enumerate(self._positions):
+            # The treasure compares first, so it lands on the same cell in every state it starts from
+            candidate = (table[treasure], table[hero], tuple(sorted([table[pos] for pos in monsters])))
+            if best is None or candidate < best:
+                best, best_transform = candidate, transform
+        return {"hero_position": best[1], "treasure_position": best[0],
+                "monster_positions": best[2]}, best_transform
+
+    def reset(self, *, seed=None, options=None):
+        observation, info = self.env.reset(seed=seed, options=options)
+        observation, self._transform = self.canonicalize(observation)
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(
+            self._env_actions[self._transform][int(action)])
+        observation, self._transform = self.canonicalize(observation)
+        return observation, reward, terminated, truncated, info
@@ -16,6 +16,23 @@ class FixedTreasureHuntEnv(BaseTreasureHuntEnv):
         "monster_positions": (45, 55),
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        layout = self.FIXED_LAYOUT
+        positions = [layout["hero_position"], layout["treasure_position"], *layout["monster_positions"]]
+        if len(layout["monster_positions"]) != self.n_monsters or max(positions) >= self.ENV_SIZE**2:
+            raise ValueError(f"The fixed layout does not fit {self.n_monsters} monsters "
+                             f"on a {self.ENV_SIZE}x{self.ENV_SIZE} grid.")
+
+    @property
+    def deterministic(self) -> bool:
+        """The layout is fixed, so episodes only vary if the monsters move randomly."""
+        return self.monster_strategy.DETERMINISTIC
+
+    def _initialize_monster_positions(self):
+        """The monsters always start from the fixed layout."""
+        self.monster_positions = self.FIXED_LAYOUT["monster_positions"]
+
     def reset(self, *, seed=None, options=None):
         super().reset(seed=seed, options=options)
 
@@ -30,4 +47,5 @@ class FixedTreasureHuntEnv(BaseTreasureHuntEnv):
 register(
     id="FixedTreasureHunt-v0",
     entry_point="treasure_hunt.environment:FixedTreasureHuntEnv",
+    vector_entry_point="treasure_hunt.environment:BatchedFixedTreasureHuntEnv",
 )
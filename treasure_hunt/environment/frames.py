@@ -0,0 +1,67 @@
+"""Drawing of treasure hunt states into RGB frames with NumPy only, so no display is needed."""
+
+import numpy as np
+
+BACKGROUND_COLOR = (255, 255, 255)
+HERO_COLOR = (0, 0, 255)
+TREASURE_COLOR = (255, 215, 0)
+MONSTER_COLOR = (255, 0, 0)
+
+
+def frame_shape(env_size: int, cell_size: int) -> tuple[int, int, int]:
+    """Shape of the frames of a grid, each cell being cell_size pixels wide."""
+    return env_size * cell_size, env_size * cell_size, 3
+
+
+def render_frames(env_size: int, cell_size: int, hero_positions, treasure_positions,
+                  monster_positions) -> np.ndarray:
+    """
+    Draw a batch of states at once.
+    :param hero_positions: (N,) encoded hero positions.
+    :param treasure_positions: (N,) encoded treasure positions.
+    :param monster_positions: (N, n_monsters) encoded monster positions.
+    :return: (N, height, width, 3) uint8 frames. Monsters are drawn over the hero and treasure.
+    """
+    n_frames = len(hero_positions)
+    frames = np.arange(n_frames)
+    # One pixel per cell first, then every cell is scaled up to cell_size pixels
+    cells = np.empty((n_frames, env_size**2, 3), dtype=np.uint8)
+    cells[:] = BACKGROUND_COLOR
+    cells[frames, hero_positions] = HERO_COLOR
+    cells[frames, treasure_positions] = TREASURE_COLOR
+    cells[frames[:, None], monster_positions] = MONSTER_COLOR
+    scaled = np.empty((n_frames, env_size, cell_size, env_size, cell_size, 3), dtype=np.uint8)
+    scaled[:] = cells.reshape(n_frames, env_size, 1, env_size, 1, 3)
+    return scaled.reshape(n_frames, *frame_shape(env_size, cell_size))
+
+
+class FrameCanvas:
+    """
+    Frame buffer of a single environment, updated in place: only the cells whose
+    content changed since the previous frame are repainted.
+    """
+
+    def __init__(self, env_size: int, cell_size: int):
+        self.env_size = env_size
+        self.cell_size = cell_size
+        self.frame = np.empty(frame_shape(env_size, cell_size), dtype=np.uint8)
+        self.frame[:] = BACKGROUND_COLOR
+        self.painted = {}  # Color of every non-background cell
+
+    def _paint(self, position: int, color):
+        """Fill the pixels of a cell with a color."""
+        row, col = divmod(position, self.env_size)
+        size = self.cell_size
+        self.frame[row * size:(row + 1) * size, col * size:(col + 1) * size] = color
+
+    def draw(self, hero_position: int, treasure_position: int, monster_positions) -> np.ndarray:
+        """Draw a state and return the frame buffer. Monsters are drawn over the hero and treasure."""
+        cells = {hero_position: HERO_COLOR, treasure_position: TREASURE_COLOR}
+        cells.update((position, MONSTER_COLOR) for position in monster_positions)
+        for position in self.painted.keys() - cells.keys():
+            self._paint(position, BACKGROUND_COLOR)
+        for position, color in cells.items():
+            if self.painted.get(position) != color:
+                self._paint(position, color)
+        self.painted = cells
+        return self.frame
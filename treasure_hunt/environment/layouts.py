@@ -0,0 +1,52 @@
+"""Direct sampling of valid monster layouts, shared by the scalar and batched environments."""
+
+import numpy as np
+
+
+def sample_layouts(rng: np.random.Generator, n_cells: int, n_monsters: int, excluded_cells,
+                   n_layouts: int = 1) -> np.ndarray:
+    """Draw monster layouts uniformly among those with distinct cells, none of them excluded.
+
+    Sparse layouts are drawn with replacement, then the repeated cells of each row are
+    redrawn until all cells differ, which keeps the sets uniform. A single layout is fixed up
+    in plain Python, which is faster than NumPy for a few monsters. Crowded layouts, where
+    redrawing would take many rounds, are read from random permutations of the free cells.
+    :return: (n_layouts, n_monsters) array of encoded positions.
+    """
+    excluded_cells = sorted({int(cell) for cell in excluded_cells})
+    n_free = n_cells - len(excluded_cells)
+    if n_monsters > n_free:
+        raise ValueError(f"Cannot place {n_monsters} monsters on {n_free} free cells.")
+
+    if 2 * n_monsters > n_free:
+        free_cells = np.tile(np.arange(n_free), (n_layouts, 1))
+        layouts = rng.permuted(free_cells, axis=1)[:, :n_monsters]
+    elif n_layouts == 1:
+        cells = rng.integers(0, n_free, size=n_monsters).tolist()
+        taken = set()
+        for i, cell in enumerate(cells):
+            while cell in taken:
+                cell = int(rng.integers(0, n_free))
+            taken.add(cell)
+            for excluded in excluded_cells:
+                cell += cell >= excluded
+            cells[i] = cell
+        return np.array([cells], dtype=np.int64)
+    else:
+        layouts = rng.integers(0, n_free, size=(n_layouts, n_monsters))
+        while True:
+            # A cell is repeated if it equals the previous one in sorted order
+            order = np.argsort(layouts, axis=1, kind="stable")
+            sorted_layouts = np.take_along_axis(layouts, order, axis=1)
+            repeated_sorted = np.zeros(layouts.shape, dtype=np.bool_)
+            repeated_sorted[:, 1:] = sorted_layouts[:, 1:] == sorted_layouts[:, :-1]
+            if not repeated_sorted.any():
+                break
+            repeated = np.empty_like(repeated_sorted)
+            np.put_along_axis(repeated, order, repeated_sorted, axis=1)
+            layouts[repeated] = rng.integers(0, n_free, size=int(repeated.sum()))
+
+    # Map the i-th free cell to its position, skipping the excluded cells in increasing order
+    for cell in excluded_cells:
+        layouts += layouts >= cell
+    return layouts
@@ -1,11 +1,16 @@
 """Interface for monster movement strategies."""
 
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+
+import numpy as np
 
 
 class MonsterMovementStrategy(ABC):
     """Abstract base class for monster movement strategies."""
 
+    DETERMINISTIC = False  # Whether the moves never depend on the rng
+
     @abstractmethod
     def move_monsters(self, monster_positions: list[tuple[int, int]], hero_position: tuple[int, int], env_size, rng) -> bool:
         """
@@ -16,3 +21,42 @@ class MonsterMovementStrategy(ABC):
         :param env_size: Size of the grid (e.g., 10x10).
         :return: New position of the monster.
         """
+
+    def move_monsters_batch(self, monster_positions: np.ndarray, hero_positions: np.ndarray,
+                            env_size: int, rng) -> np.ndarray:
+        """
+        Move the monsters of N environments at once, on encoded positions.
+        Unless overridden, this calls move_monsters once per environment.
+        :param monster_positions: (N, M) array of encoded monster positions.
+        :param hero_positions: (N,) array of encoded hero positions.
+        :param env_size: Size of the grid (e.g., 10x10).
+        :param rng: A Generator shared by all rows, or a sequence of one Generator per row.
+        :return: (N, M) array of proposed positions, -1 where a proposal is off the grid.
+        """
+        proposed = np.full_like(monster_positions, -1)
+        for i, (positions, hero_position) in enumerate(zip(monster_positions, hero_positions)):
+            new_positions = self.move_monsters(
+                [divmod(int(pos), env_size) for pos in positions], int(hero_position),
+                env_size, self._row_rng(rng, i))
+            if len(new_positions) != len(positions):
+                continue
+            proposed[i] = [row * env_size + col if 0 <= row < env_size and 0 <= col < env_size
+                           else -1 for row, col in new_positions]
+        return proposed
+
+    def proposal_distribution(self, monster_positions: np.ndarray, env_size: int):
+        """
+        Describe the distribution of the positions proposed by move_monsters, for planners.
+        :param monster_positions: (K, M) array of encoded monster positions.
+        :param env_size: Size of the grid (e.g., 10x10).
+        :return: (K, C, M) array of proposed positions and (K, C) array of their probabilities.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not describe its proposal distribution.")
+
+    @staticmethod
+    def _row_rng(rng, index: int):
+        """Return the Generator to use for the given row of a batch."""
+        if isinstance(rng, Sequence):
+            return rng[index]
+        return rng
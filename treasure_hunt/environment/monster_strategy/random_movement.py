@@ -1,34 +1,47 @@
 """Module for the RandomMovementStrategy class."""
+from collections.abc import Sequence
+
 from gymnasium import register
+import numpy as np
 
 from .base_strategy import MonsterMovementStrategy
+from ..transitions import monster_neighbor_tables
 
 
 class RandomMovementStrategy(MonsterMovementStrategy):
     """Each monster moves randomly in one of the four directions or stays in place."""
 
     def move_monsters(self, monster_positions, hero_position, env_size, rng):
-        proposed_positions = []
-        for row, col in monster_positions:
-            possible_moves = [
-                (row - 1, col),  # Up
-                (row + 1, col),  # Down
-                (row, col - 1),  # Left
-                (row, col + 1),  # Right
-                (row, col),      # Stay in place
-            ]
-            # Filter out-of-bounds moves
-            valid_moves = [
-                (r, c) for r, c in possible_moves if 0 <= r < env_size and 0 <= c < env_size
-            ]
-            # Choose a random valid move
-            new_row, new_col = rng.choice(valid_moves)
-            proposed_positions.append((new_row, new_col))
-        return proposed_positions
+        encoded = np.array([[row * env_size + col for row, col in monster_positions]],
+                           dtype=np.int64).reshape(1, -1)
+        proposed = self.move_monsters_batch(encoded, np.array([hero_position]), env_size, rng)
+        return [divmod(int(pos), env_size) for pos in proposed[0]]
+
+    def move_monsters_batch(self, monster_positions, hero_positions, env_size, rng):
+        neighbors, n_neighbors = monster_neighbor_tables(env_size)
+        # Pick uniformly among the on-grid neighbors of each monster
+        counts = n_neighbors[monster_positions]
+        if isinstance(rng, Sequence):
+            choices = np.stack([row_rng.integers(0, row_counts)
+                                for row_rng, row_counts in zip(rng, counts)]).reshape(counts.shape)
+        else:
+            choices = rng.integers(0, counts)
+        return neighbors[monster_positions, choices]
+
+    def proposal_distribution(self, monster_positions, env_size):
+        neighbors, n_neighbors = monster_neighbor_tables(env_size)
+        n_monsters = monster_positions.shape[1]
+        # Every combination of neighbor slots, one per monster
+        choices = np.indices((neighbors.shape[1],) * n_monsters).reshape(n_monsters, -1).T
+        proposals = neighbors[monster_positions[:, None, :], choices[None, :, :]]
+        counts = n_neighbors[monster_positions][:, None, :]
+        probabilities = np.where(choices[None, :, :] < counts, 1 / counts, 0).prod(axis=2)
+        return proposals, probabilities
 
 
 register(
     id="RandomMonsterTreasureHunt-v0",
     entry_point="treasure_hunt.environment:BaseTreasureHuntEnv",
+    vector_entry_point="treasure_hunt.environment:BatchedTreasureHuntEnv",
     kwargs={"monster_strategy": RandomMovementStrategy()},
 )
@@ -1,5 +1,6 @@
 """This module contains the stationary strategy for the monster movement."""
 from gymnasium import register
+import numpy as np
 
 from .base_strategy import MonsterMovementStrategy
 
@@ -7,12 +8,21 @@ from .base_strategy import MonsterMovementStrategy
 class StationaryStrategy(MonsterMovementStrategy):
     """Do not move."""
 
+    DETERMINISTIC = True
+
     def move_monsters(self, monster_positions, hero_position, env_size, rng):
         return monster_positions
 
+    def move_monsters_batch(self, monster_positions, hero_positions, env_size, rng):
+        return monster_positions
+
+    def proposal_distribution(self, monster_positions, env_size):
+        return monster_positions[:, None, :], np.ones((len(monster_positions), 1))
+
 
 register(
     id="StationaryMonsterTreasureHunt-v0",
     entry_point="treasure_hunt.environment:BaseTreasureHuntEnv",
+    vector_entry_point="treasure_hunt.environment:BatchedTreasureHuntEnv",
     kwargs={"monster_strategy": StationaryStrategy()},
 )
@@ -0,0 +1,87 @@
+"""Precomputed movement tables, shared by the environments, planners and agents."""
+
+from functools import lru_cache
+
+import numpy as np
+
+# Row and column offsets of the hero actions 0: up, 1: down, 2: left, 3: right
+ACTION_DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+@lru_cache
+def hero_transition_tables(env_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the `next_position[pos, action]` and `is_invalid[pos, action]` tables of a grid.
+
+    Positions are encoded as `row * env_size + col`. An invalid move (off the grid)
+    leaves the hero in place. Tables are computed once per grid size and read-only.
+    """
+    rows, cols = np.divmod(np.arange(env_size**2), env_size)
+    deltas = np.array(ACTION_DELTAS)
+    next_rows = rows[:, None] + deltas[:, 0]
+    next_cols = cols[:, None] + deltas[:, 1]
+    is_invalid = ((next_rows < 0) | (next_rows >= env_size)
+                  | (next_cols < 0) | (next_cols >= env_size))
+    next_position = np.where(is_invalid, np.arange(env_size**2)[:, None],
+                             next_rows * env_size + next_cols)
+    next_position.flags.writeable = False
+    is_invalid.flags.writeable = False
+    return next_position, is_invalid
+
+
+@lru_cache
+def monster_neighbor_tables(env_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the `neighbors[pos, k]` and `n_neighbors[pos]` tables of a grid.
+
+    The neighbors of a cell are, in order, the on-grid cells up, down, left and right of it,
+    then the cell itself (staying in place). Rows are padded with the cell itself.
+    """
+    next_position, is_invalid = hero_transition_tables(env_size)
+    positions = np.arange(env_size**2)
+    candidates = np.concatenate([next_position, positions[:, None]], axis=1)
+    valid = np.concatenate([~is_invalid, np.ones((env_size**2, 1), dtype=bool)], axis=1)
+    # Stable sort moves the valid candidates first while keeping their order
+    order = np.argsort(~valid, axis=1, kind="stable")
+    neighbors = np.take_along_axis(candidates, order, axis=1)
+    n_neighbors = valid.sum(axis=1)
+    neighbors = np.where(np.arange(5) < n_neighbors[:, None], neighbors, positions[:, None])
+    neighbors.flags.writeable = False
+    n_neighbors.flags.writeable = False
+    return neighbors, n_neighbors
+
+
+# Symmetries of the square grid, as maps of (row, col) with last = env_size - 1
+GRID_SYMMETRIES = {
+    "identity": lambda row, col, last: (row, col),
+    "transpose": lambda row, col, last: (col, row),
+    "anti_transpose": lambda row, col, last: (last - col, last - row),
+    "flip_rows": lambda row, col, last: (last - row, col),
+    "flip_cols": lambda row, col, last: (row, last - col),
+    "rotate_90": lambda row, col, last: (col, last - row),
+    "rotate_180": lambda row, col, last: (last - row, last - col),
+    "rotate_270": lambda row, col, last: (last - col, row),
+}
+
+
+@lru_cache
+def symmetry_tables(env_size: int, names: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the `positions[g, pos]` and `actions[g, action]` tables of grid symmetries.
+
+    positions[g] is the image of every encoded position under the g-th named symmetry, and
+    actions[g] the action moving in the image of the direction of every action, so moves
+    commute with the symmetry: next_position[positions[g, p], actions[g, a]] is the image
+    of next_position[p, a]. Tables are computed once per grid size and read-only.
+    """
+    last = env_size - 1
+    rows, cols = np.divmod(np.arange(env_size**2), env_size)
+    positions = np.empty((len(names), env_size**2), dtype=np.int64)
+    actions = np.empty((len(names), len(ACTION_DELTAS)), dtype=np.int64)
+    for g, name in enumerate(names):
+        symmetry = GRID_SYMMETRIES[name]
+        new_rows, new_cols = symmetry(rows, cols, last)
+        positions[g] = new_rows * env_size + new_cols
+        origin = np.array(symmetry(0, 0, last))
+        for action, delta in enumerate(ACTION_DELTAS):
+            actions[g, action] = ACTION_DELTAS.index(tuple((np.array(symmetry(*delta, last)) - origin).tolist()))
+    positions.flags.writeable = False
+    actions.flags.writeable = False
+    return positions, actions
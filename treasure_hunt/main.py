@@ -5,9 +5,13 @@ from gymnasium import make
 from stable_baselines3 import DQN, PPO
 
 from .environment import BaseTreasureHuntEnv, FixedTreasureHuntEnv
-from .agent import SimplifierQLearner, TabularQLearner
+from .agent import SimplifierQLearner, TabularQLearner, ValueIterationPlanner
 from .agent.env_reducer import NearSightedReducer, ObliviousReducer
-from .environment import FlattenTreasureWrapper
+from .environment import CanonicalTreasureWrapper, FlattenTreasureWrapper
+from .environment.canonical_treasure_wrapper import SYMMETRY_GROUPS
+from .recorder import EpisodeRecorder
+from .sequential import SequentialTest
+from .stopping import add_stopping_arguments, make_stopping_rules
 from .utils import AdaptiveRLRunner, run_with_render
 
 ENVIRONMENTS = {
@@ -17,34 +21,62 @@ ENVIRONMENTS = {
 }
 
 
-def make_agent(agent_name, env, load_model=None):
+def network_env(env):
+    """Flatten dict observations for the SB3 networks, other observation modes already are."""
+    if env.unwrapped.obs_mode == "dict":
+        return FlattenTreasureWrapper(env)
+    return env
+
+
+def make_agent(agent_name, env, load_model=None, q_table_backend="dict", planning_steps=0,
+               planning="uniform", hyperparameters=None, symmetries=None):
     """Create an agent based on the agent name.
     Optionally load a pre-trained model.
+    The Q-table backend, planning and symmetries (see CanonicalTreasureWrapper) only apply to tabular agents.
+    Hyperparameters override the constructor arguments of tabular agents, except
+    focus_distance which goes to the near-sighted reducer, and net_arch which replaces
+    the network layers of SB3 agents.
     Return the agent and appropriately wrapped environment."""
+    hyperparameters = dict(hyperparameters or {})
+    focus_distance = hyperparameters.pop("focus_distance", 2)
+    net_arch = hyperparameters.pop("net_arch", None)
+    tabular_kwargs = {"q_table_backend": q_table_backend, "planning_steps": planning_steps,
+                      "planning": planning, **hyperparameters}
+
+    def policy_kwargs(default_net_arch=None):
+        """Network layers of SB3 agents, None keeps the SB3 default."""
+        layers = net_arch or default_net_arch
+        return {"net_arch": list(layers)} if layers else None
+
+    if symmetries is not None and agent_name in ("tabular_q", "near_sighted", "oblivious"):
+        env = CanonicalTreasureWrapper(env, symmetries)
+
     if agent_name == "tabular_q":
-        agent = TabularQLearner(env)
+        agent = TabularQLearner(env, **tabular_kwargs)
     elif agent_name == "near_sighted":
-        agent = SimplifierQLearner(env, NearSightedReducer(env.unwrapped))
+        agent = SimplifierQLearner(env, NearSightedReducer(env.unwrapped, focus_distance), **tabular_kwargs)
     elif agent_name == "oblivious":
-        agent = SimplifierQLearner(env, ObliviousReducer(env.unwrapped))
+        agent = SimplifierQLearner(env, ObliviousReducer(env.unwrapped), **tabular_kwargs)
+    elif agent_name == "value_iteration":
+        agent = ValueIterationPlanner(env)
     elif agent_name == "DQN":
-        env = FlattenTreasureWrapper(env)
-        agent = DQN("MlpPolicy", env)
+        env = network_env(env)
+        agent = DQN("MlpPolicy", env, policy_kwargs=policy_kwargs())
     elif agent_name == "DQN-smaller":
-        env = FlattenTreasureWrapper(env)
-        agent = DQN("MlpPolicy", env, policy_kwargs={"net_arch": [64, 64]})
+        env = network_env(env)
+        agent = DQN("MlpPolicy", env, policy_kwargs=policy_kwargs([64, 64]))
     elif agent_name == "DQN-larger":
-        env = FlattenTreasureWrapper(env)
-        agent = DQN("MlpPolicy", env, policy_kwargs={"net_arch": [256, 256]})
+        env = network_env(env)
+        agent = DQN("MlpPolicy", env, policy_kwargs=policy_kwargs([256, 256]))
     elif agent_name == "PPO":
-        env = FlattenTreasureWrapper(env)
-        agent = PPO("MlpPolicy", env)
+        env = network_env(env)
+        agent = PPO("MlpPolicy", env, policy_kwargs=policy_kwargs())
     elif agent_name == "PPO-smaller":
-        env = FlattenTreasureWrapper(env)
-        agent = PPO("MlpPolicy", env, policy_kwargs={"net_arch": [64, 64]})
+        env = network_env(env)
+        agent = PPO("MlpPolicy", env, policy_kwargs=policy_kwargs([64, 64]))
     elif agent_name == "PPO-larger":
-        env = FlattenTreasureWrapper(env)
-        agent = PPO("MlpPolicy", env, policy_kwargs={"net_arch": [256, 256]})
+        env = network_env(env)
+        agent = PPO("MlpPolicy", env, policy_kwargs=policy_kwargs([256, 256]))
     else:
         raise ValueError(f"Unknown agent: {agent_name}")
 
@@ -56,7 +88,7 @@ def make_agent(agent_name, env, load_model=None):
 
 
 VALID_AGENTS = ["tabular_q", "near_sighted",
-                "oblivious", "DQN", "DQN-smaller", "DQN-larger", "PPO", "PPO-smaller", "PPO-larger"]
+                "oblivious", "value_iteration", "DQN", "DQN-smaller", "DQN-larger", "PPO", "PPO-smaller", "PPO-larger"]
 
 
 def main():
@@ -64,6 +96,13 @@ def main():
         description="Run agents on treasure hunt environments.")
     parser.add_argument("--environment", default=os.getenv("TH_ENVIRONMENT", "base"), choices=ENVIRONMENTS.keys(),
                         help="The environment to use. Can also be set via the TH_ENVIRONMENT env variable.")
+    parser.add_argument("--env-size", type=int, default=None,
+                        help="Side of the square grid, 10 by default.")
+    parser.add_argument("--n-monsters", type=int, default=None,
+                        help="Number of monsters, 2 by default.")
+    parser.add_argument("--obs-mode", default="dict", choices=BaseTreasureHuntEnv.OBS_MODES,
+                        help="Observation format: dict of positions, integer state id, int32 position "
+                        "vector or one-hot vector. Reduced agents and value_iteration need dict observations.")
     parser.add_argument("--agent", default=os.getenv("TH_AGENT", "near_sighted"), choices=VALID_AGENTS,
                         help="The agent to run. Can also be set via the TH_AGENT env variable.")
     parser.add_argument("--epochs", type=int, default=int(os.getenv("TH_EPOCHS", 1000)),
@@ -80,26 +119,84 @@ def main():
                         help="Random seed for reproducibility.")
     parser.add_argument("--no-show", action="store_true",
                         help="Do not show the plot (useful for batch run)")
+    parser.add_argument("--final-test-workers", type=int, default=int(os.getenv("TH_FINAL_TEST_WORKERS", 1)),
+                        help="Number of processes sharing the final test episodes. "
+                        "Can also be set via TH_FINAL_TEST_WORKERS env variable.")
+    parser.add_argument("--q-table", default=os.getenv("TH_Q_TABLE", "dict"), choices=["dict", "dense"],
+                        help="Q-table storage for tabular agents. 'dense' preallocates every state, "
+                        "use it with the reduced agents. Can also be set via TH_Q_TABLE env variable.")
+    parser.add_argument("--planning-steps", type=int, default=0,
+                        help="Model-based updates after every real step of tabular agents (Dyna-Q). 0 disables planning.")
+    parser.add_argument("--planning", default="uniform", choices=["uniform", "prioritized"],
+                        help="Replay modelled transitions sampled uniformly, or by TD error (prioritized sweeping).")
+    parser.add_argument("--symmetries", default=None, choices=list(SYMMETRY_GROUPS),
+                        help="Give tabular agents one Q-table row per class of equivalent states: sort the "
+                        "monsters, and also try transposing the grid or all its symmetries.")
+    parser.add_argument("--checkpoint-epochs", type=int, default=None,
+                        help="Save a checkpoint every this many epochs.")
+    parser.add_argument("--checkpoint-seconds", type=float, default=None,
+                        help="Save a checkpoint after the first epoch ending this many seconds "
+                        "after the previous checkpoint.")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Export throughput, latency and episode metrics to the results folder "
+                        "after every epoch (telemetry.jsonl and Prometheus metrics.prom).")
+    parser.add_argument("--record-episodes", type=int, default=0,
+                        help="Record the first episodes of every evaluation to the results folder, "
+                        "without a display. Also records the --render demo instead of opening a window.")
+    parser.add_argument("--record-video", action="store_true",
+                        help="Record episodes as animated GIFs rather than compressed frame arrays.")
+    parser.add_argument("--eval-precision", type=float, default=None,
+                        help="Stop every evaluation, including the final test, once the 95%% confidence "
+                        "interval of the mean reward is within this much of it.")
+    parser.add_argument("--eval-min-episodes", type=int, default=5,
+                        help="Episodes played by every evaluation before --eval-precision can stop it.")
+    parser.add_argument("--eval-max-episodes", type=int, default=100,
+                        help="Episodes played at most by an evaluation during training with --eval-precision.")
+    add_stopping_arguments(parser)
+    parser.add_argument("--resume", type=str, default=None,
+                        help="Results folder of a checkpointed run to continue. "
+                        "Use the same agent and environment as the original run.")
 
     args = parser.parse_args()
 
     env_id = ENVIRONMENTS[args.environment]
-    env = make(env_id, render_mode="human" if args.render else None,
-               max_episode_steps=500)
+    # Recorded demos need no window
+    env = make(env_id, render_mode="human" if args.render and not args.record_episodes else None,
+               max_episode_steps=500, env_size=args.env_size, n_monsters=args.n_monsters,
+               obs_mode=args.obs_mode)
 
-    agent, env = make_agent(args.agent, env, load_model=args.load_model)
+    agent, env = make_agent(args.agent, env, load_model=args.load_model,
+                            q_table_backend=args.q_table, planning_steps=args.planning_steps,
+                            planning=args.planning, symmetries=args.symmetries)
 
     runner = AdaptiveRLRunner(agent, env,
                               total_epochs=args.epochs,
                               eval_interval=args.timesteps,
                               experiment_name=f"{args.agent}_{
                                   args.environment}",
-                              seed=args.seed)
-    if args.load_model and not args.force_train:
+                              seed=args.seed,
+                              final_test_workers=args.final_test_workers,
+                              checkpoint_epochs=args.checkpoint_epochs,
+                              checkpoint_seconds=args.checkpoint_seconds,
+                              telemetry=args.telemetry,
+                              record_episodes=args.record_episodes,
+                              record_video=args.record_video,
+                              sequential_test=SequentialTest(args.eval_precision,
+                                                             min_episodes=args.eval_min_episodes,
+                                                             max_episodes=args.eval_max_episodes
+                                                             ) if args.eval_precision is not None else None,
+                              stopping_rules=make_stopping_rules(args.stop_target, args.stop_plateau,
+                                                                 args.stop_bound))
+    demo_recorder = EpisodeRecorder(os.path.join(runner.results_dir, "demo"), video=args.record_video
+                                    ) if args.record_episodes else None
+    if args.resume:
+        runner.resume(args.resume)
+        print(f"Resuming after epoch {runner.completed_epochs}")
+    if args.load_model and not args.force_train and not args.resume:
         print("Loaded pre-trained model")
         if args.render:
             print("Preloaded model and rendering is on: demo run")
-            run_with_render(env, agent, n_episodes=10)
+            run_with_render(env, agent, n_episodes=10, recorder=demo_recorder)
         else:
             print("Preloaded model and rendering is off: testing")
             # Only test when loading a model
@@ -109,7 +206,7 @@ def main():
     else:
         if args.render:
             print("Rendering is on: demo run (before training)")
-            run_with_render(env, agent, n_episodes=10)
+            run_with_render(env, agent, n_episodes=10, recorder=demo_recorder)
         runner.train_agent()
         runner.test_agent(final_test=True)
         if not args.no_show:
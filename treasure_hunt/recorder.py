@@ -0,0 +1,73 @@
+"""Capture of episodes to compressed frame files or animated GIFs, without a display."""
+
+import os
+
+import numpy as np
+
+from .environment.frames import render_frames
+
+
+class EpisodeRecorder:
+    """
+    Record episodes of a treasure hunt environment to files, up to episodes_per_file
+    episodes or max_frames frames per file.
+
+    Steps only record the positions. Frames are drawn for a whole file at once with
+    render_frames when it is written, so recording barely slows the episodes down.
+    Files are compressed .npz archives holding the frames and the index of the first
+    frame of every episode, or animated GIFs with video=True.
+    """
+
+    def __init__(self, directory, episodes_per_file=16, max_frames=2000, video=False,
+                 cell_size=4, fps=5):
+        self.directory = directory
+        self.episodes_per_file = episodes_per_file
+        self.max_frames = max_frames
+        self.video = video
+        self.cell_size = cell_size
+        self.fps = fps
+        self.env_size = None
+        self.states = []  # (hero, treasure, *monsters) positions of every recorded step
+        self.episode_starts = []  # Index of the first state of every episode
+        self.files = []  # Paths of the written files
+
+    def start_episode(self, env):
+        """Start an episode from the environment's current (reset) state."""
+        if (len(self.episode_starts) >= self.episodes_per_file
+                or len(self.states) >= self.max_frames):
+            self.flush()
+        self.episode_starts.append(len(self.states))
+        self.capture(env)
+
+    def capture(self, env):
+        """Record the environment's current state."""
+        unwrapped = env.unwrapped
+        self.env_size = unwrapped.ENV_SIZE
+        self.states.append((unwrapped.hero_position, unwrapped.treasure_position,
+                            *unwrapped.monster_positions))
+
+    def flush(self):
+        """Draw and write the recorded episodes, if any. Return the path of the written file."""
+        if not self.states:
+            return None
+        states = np.array(self.states, dtype=np.int64)
+        frames = render_frames(self.env_size, self.cell_size, states[:, 0], states[:, 1], states[:, 2:])
+        os.makedirs(self.directory, exist_ok=True)
+        extension = ".gif" if self.video else ".npz"
+        # Number files after the existing ones, e.g. of the run being resumed
+        index = len(self.files)
+        while os.path.exists(path := os.path.join(self.directory, f"episodes_{index:05d}{extension}")):
+            index += 1
+        if self.video:
+            # Pillow is only needed to write GIFs
+            from PIL import Image  # pylint: disable=import-outside-toplevel
+
+            images = [Image.fromarray(frame) for frame in frames]
+            images[0].save(path, save_all=True, append_images=images[1:],
+                           duration=1000 // self.fps, loop=0)
+        else:
+            np.savez_compressed(path, frames=frames, episode_starts=np.array(self.episode_starts))
+        self.files.append(path)
+        self.states = []
+        self.episode_starts = []
+        return path
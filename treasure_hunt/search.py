@@ -0,0 +1,200 @@
+"""Hyperparameter search with successive halving: epochs are only spent on promising trials."""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import partial
+
+import numpy as np
+from gymnasium import make
+
+from .main import ENVIRONMENTS, make_agent
+from .sweep import limit_threads, worker_thread_variables
+from .utils import AdaptiveRLRunner
+
+# Samplers of every hyperparameter, drawing from a numpy Generator
+TABULAR_SPACE = {
+    "learning_rate": lambda rng: float(10 ** rng.uniform(-2, np.log10(0.5))),
+    "discount_factor": lambda rng: float(rng.uniform(0.9, 0.999)),
+    "exploration_decay": lambda rng: float(1 - 10 ** rng.uniform(-5, -2)),
+    "min_exploration_rate": lambda rng: float(10 ** rng.uniform(-3, -1)),
+}
+NEAR_SIGHTED_SPACE = {
+    **TABULAR_SPACE,
+    "focus_distance": lambda rng: int(rng.integers(1, 5)),
+}
+NET_ARCHS = ([64, 64], [128, 128], [256, 256], [64, 64, 64])
+NETWORK_SPACE = {
+    "net_arch": lambda rng: NET_ARCHS[rng.integers(len(NET_ARCHS))],
+}
+SEARCH_SPACES = {
+    "tabular_q": TABULAR_SPACE,
+    "near_sighted": NEAR_SIGHTED_SPACE,
+    "oblivious": TABULAR_SPACE,
+    "DQN": NETWORK_SPACE,
+    "PPO": NETWORK_SPACE,
+}
+
+
+def sample_hyperparameters(agent_name, rng):
+    """Draw a configuration from the search space of an agent."""
+    if agent_name not in SEARCH_SPACES:
+        raise ValueError(f"No search space for agent: {agent_name}")
+    return {name: sampler(rng) for name, sampler in SEARCH_SPACES[agent_name].items()}
+
+
+def trial_name(agent_name, environment, seed, trial):
+    """Name of the results folder of a search trial."""
+    return f"search_{agent_name}_{environment}_seed{seed}_trial{trial:03d}"
+
+
+def run_trial(agent_name, environment, seed, hyperparameters, *, name, epochs, timesteps,
+              score_epochs=10, max_walltime=1800, results_root='results', results_dir=None):
+    """
+    Train a trial up to epochs epochs in total, continuing from the checkpoint in
+    results_dir if given, then checkpoint it again.
+    Return the results folder, the completed epochs and the score: the mean evaluation
+    reward of the last score_epochs epochs.
+    """
+    np.random.seed(seed)
+    env = make(ENVIRONMENTS[environment], max_episode_steps=500)
+    agent, env = make_agent(agent_name, env, hyperparameters=hyperparameters)
+    env.action_space.seed(seed)  # Exploration samples actions from it
+    if hasattr(agent, "set_random_seed"):  # SB3 agents
+        agent.set_random_seed(seed)
+
+    runner = AdaptiveRLRunner(agent, env,
+                              total_epochs=epochs,
+                              eval_interval=timesteps,
+                              experiment_name=name,
+                              seed=seed,
+                              verbose=False,
+                              max_walltime=max_walltime,
+                              results_root=results_root)
+    if results_dir is not None:
+        runner.resume(results_dir)
+    runner.train_agent()
+    runner.save_checkpoint()
+    env.close()
+    score = float(np.mean(runner.reward_history[-score_epochs:]))
+    return runner.results_dir, runner.completed_epochs, score
+
+
+def successive_halving(agent_name, environment, *, n_trials=27, min_epochs=1, eta=3, timesteps=10000,
+                       seed=0, workers=None, threads_per_worker=1, score_epochs=10, max_walltime=1800,
+                       results_root='results', leaderboard_path=None):
+    """
+    Search the hyperparameters of an agent with successive halving, then write a leaderboard CSV.
+
+    n_trials configurations are trained for min_epochs epochs, then the best 1/eta of them
+    continue from their checkpoints up to eta times as many epochs, and so on until a single
+    trial is left. Each rung runs on a process pool, or in the calling process with workers=1.
+    Return the leaderboard rows, best trial first.
+    """
+    rng = np.random.default_rng(seed)
+    trials = [{"trial": trial, "agent": agent_name, "environment": environment, "seed": seed + trial,
+               "hyperparameters": sample_hyperparameters(agent_name, rng), "status": "pending",
+               "rung": None, "epochs": 0, "score": None, "results_dir": None}
+              for trial in range(n_trials)]
+
+    def trial_call(trial, epochs):
+        """Picklable call of run_trial training a trial up to epochs epochs."""
+        return partial(run_trial, agent_name, environment, trial["seed"], trial["hyperparameters"],
+                       name=trial_name(agent_name, environment, seed, trial["trial"]), epochs=epochs,
+                       timesteps=timesteps, score_epochs=score_epochs, max_walltime=max_walltime,
+                       results_root=results_root, results_dir=trial["results_dir"])
+
+    with ExitStack() as stack:
+        pool = None
+        if workers != 1:
+            stack.enter_context(worker_thread_variables(threads_per_worker))
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers,
+                                                           mp_context=multiprocessing.get_context("spawn"),
+                                                           initializer=limit_threads,
+                                                           initargs=(threads_per_worker,)))
+        survivors = trials
+        rung = 0
+        while survivors:
+            epochs = min_epochs * eta**rung
+            if pool is None:
+                outcomes = ((trial, _outcome(trial_call(trial, epochs))) for trial in survivors)
+            else:
+                futures = {pool.submit(trial_call(trial, epochs)): trial for trial in survivors}
+                outcomes = ((futures[future], _outcome(future.result)) for future in as_completed(futures))
+            for trial, outcome in outcomes:
+                trial["rung"] = rung
+                trial.update(outcome)
+                result = (f"score {trial['score']:.4g} after {trial['epochs']} epochs"
+                          if trial["status"] == "done" else f"failed with {trial['error']}")
+                print(f"Rung {rung}, trial {trial['trial']}: {result}")
+
+            ranked = sorted((trial for trial in survivors if trial["status"] == "done"),
+                            key=lambda trial: trial["score"], reverse=True)
+            if len(ranked) <= 1:
+                break
+            survivors = ranked[:max(1, len(ranked) // eta)]
+            rung += 1
+
+    # Trials reaching later rungs rank first, then by score
+    leaderboard = sorted(trials, key=lambda trial: (trial["status"] == "done", trial["rung"] or 0,
+                                                    trial["score"] if trial["score"] is not None else -np.inf),
+                         reverse=True)
+    leaderboard_path = leaderboard_path or os.path.join(
+        results_root, f"search_{agent_name}_{environment}_leaderboard.csv")
+    os.makedirs(os.path.dirname(leaderboard_path) or '.', exist_ok=True)
+    fieldnames = ["trial", "agent", "environment", "seed", "status", "rung", "epochs", "score",
+                  "hyperparameters", "results_dir", "error"]
+    with open(leaderboard_path, 'w', encoding='utf8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows({**trial, "hyperparameters": json.dumps(trial["hyperparameters"])}
+                         for trial in leaderboard)
+    print(f"Search leaderboard saved to '{leaderboard_path}'.")
+    return leaderboard
+
+
+def _outcome(get_result):
+    """Fields of a trial after a rung, from the result of run_trial or its error."""
+    try:
+        results_dir, epochs, score = get_result()
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        return {"status": "failed", "error": repr(error)}
+    return {"status": "done", "results_dir": results_dir, "epochs": epochs, "score": score}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search the hyperparameters of an agent with successive halving.")
+    parser.add_argument("--agent", default="near_sighted", choices=list(SEARCH_SPACES),
+                        help="Agent whose hyperparameters are searched.")
+    parser.add_argument("--environment", default="base", choices=ENVIRONMENTS.keys(),
+                        help="Environment to train on.")
+    parser.add_argument("--trials", type=int, default=27,
+                        help="Number of configurations sampled for the first rung.")
+    parser.add_argument("--min-epochs", type=int, default=int(os.getenv("TH_EPOCHS", 10)),
+                        help="Epochs of the first rung. Can also be set via TH_EPOCHS env variable.")
+    parser.add_argument("--eta", type=int, default=3,
+                        help="Reduction factor: 1/eta of the trials continue, for eta times the epochs.")
+    parser.add_argument("--timesteps", type=int, default=int(os.getenv("TH_TIMESTEPS", 10000)),
+                        help="Number of timesteps to train each epoch. Can also be set via TH_TIMESTEPS env variable.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the sampled configurations, trial i trains with seed + i.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TH_WORKERS", os.cpu_count())),
+                        help="Number of worker processes. Can also be set via TH_WORKERS env variable.")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="Thread limit of each worker for torch, OpenMP and BLAS.")
+    parser.add_argument("--results-root", default="results",
+                        help="Folder holding the trial results and the leaderboard.")
+
+    args = parser.parse_args()
+
+    successive_halving(args.agent, args.environment, n_trials=args.trials, min_epochs=args.min_epochs,
+                       eta=args.eta, timesteps=args.timesteps, seed=args.seed, workers=args.workers,
+                       threads_per_worker=args.threads_per_worker, results_root=args.results_root)
+
+
+if __name__ == "__main__":
+    main()
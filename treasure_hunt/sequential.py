@@ -0,0 +1,55 @@
+"""Sequential test stopping an evaluation once its mean reward is estimated precisely enough."""
+from math import ceil, inf, sqrt
+from statistics import NormalDist
+
+
+class SequentialTest:
+    """
+    Keep the running mean and variance of the episode rewards of an evaluation with
+    Welford's updates, and tell when the confidence interval of the mean, with a normal
+    approximation, is at most 2 * half_width wide after at least min_episodes episodes.
+    Evaluations during training play at most max_episodes episodes.
+    """
+
+    def __init__(self, half_width: float, confidence: float = 0.95, min_episodes: int = 5,
+                 max_episodes: int = 100):
+        self.half_width = half_width
+        self.confidence = confidence
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+        self.z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.reset()
+
+    def reset(self):
+        """Forget the rewards, before a new evaluation."""
+        self.count = 0
+        self.mean = 0.0
+        self._squared_deviations = 0.0
+
+    def update(self, reward: float):
+        """Add the reward of an episode."""
+        self.count += 1
+        delta = reward - self.mean
+        self.mean += delta / self.count
+        self._squared_deviations += delta * (reward - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of the rewards, infinite until there are two."""
+        return self._squared_deviations / (self.count - 1) if self.count > 1 else inf
+
+    @property
+    def interval_half_width(self) -> float:
+        """Half width of the confidence interval of the mean reward."""
+        return self.z_score * sqrt(self.variance / self.count) if self.count > 1 else inf
+
+    @property
+    def done(self) -> bool:
+        """Whether the evaluation can stop."""
+        return self.count >= self.min_episodes and self.interval_half_width <= self.half_width
+
+    def shard(self, n_shards: int) -> "SequentialTest":
+        """Test for one of n_shards evaluations run in parallel. Each shard tolerates a
+        sqrt(n_shards) times wider interval, so the pooled mean has about the target precision."""
+        return SequentialTest(self.half_width * sqrt(n_shards), self.confidence,
+                              ceil(self.min_episodes / n_shards), self.max_episodes)
@@ -0,0 +1,100 @@
+"""Rules stopping training early once the evaluation rewards have converged."""
+from abc import ABC, abstractmethod
+from statistics import NormalDist
+
+import numpy as np
+
+
+class StoppingRule(ABC):
+    """Decide from the mean evaluation reward of every epoch whether training should stop."""
+
+    @abstractmethod
+    def check(self, reward_history: list[float], window: int) -> str | None:
+        """
+        Return the reason to stop, or None to keep training.
+        :param reward_history: Mean evaluation reward of every epoch so far.
+        :param window: Number of epochs whose rewards are averaged, e.g. the runner's adapt_window.
+        """
+
+
+class TargetReward(StoppingRule):
+    """Stop once the mean reward of the last window epochs reaches a target."""
+
+    def __init__(self, target: float):
+        self.target = target
+
+    def check(self, reward_history, window):
+        if len(reward_history) < window:
+            return None
+        mean_reward = np.mean(reward_history[-window:])
+        if mean_reward >= self.target:
+            return f"mean reward {mean_reward:.4g} of the last {window} epochs reached the target {self.target}"
+        return None
+
+
+class Plateau(StoppingRule):
+    """Stop once the window-epoch moving average of the reward has not improved
+    by more than min_delta for patience epochs."""
+
+    def __init__(self, patience: int, min_delta: float = 0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+
+    def check(self, reward_history, window):
+        if len(reward_history) < window + self.patience:
+            return None
+        moving_average = np.convolve(reward_history, np.ones(window) / window, mode='valid')
+        best_before = moving_average[:-self.patience].max()
+        if moving_average[-self.patience:].max() <= best_before + self.min_delta:
+            return (f"{window}-epoch mean reward did not improve on {best_before:.4g} "
+                    f"by more than {self.min_delta} for {self.patience} epochs")
+        return None
+
+
+class ImprovementBound(StoppingRule):
+    """
+    Stop once the last window epochs are confidently no better than the window before:
+    the upper confidence bound on the difference of their mean rewards, with a normal
+    approximation, is below min_improvement.
+    """
+
+    def __init__(self, confidence: float = 0.95, min_improvement: float = 0.0):
+        self.confidence = confidence
+        self.min_improvement = min_improvement
+        self.z_score = NormalDist().inv_cdf(confidence)
+
+    def check(self, reward_history, window):
+        if len(reward_history) < 2 * window:
+            return None
+        previous = np.asarray(reward_history[-2 * window:-window])
+        last = np.asarray(reward_history[-window:])
+        improvement = last.mean() - previous.mean()
+        standard_error = np.sqrt((last.var(ddof=1) + previous.var(ddof=1)) / window) if window > 1 else 0
+        upper_bound = improvement + self.z_score * standard_error
+        if upper_bound < self.min_improvement:
+            return (f"{self.confidence:.0%} upper bound {upper_bound:.4g} on the improvement of the last "
+                    f"{window} epochs over the {window} before is below {self.min_improvement}")
+        return None
+
+
+def make_stopping_rules(target_reward=None, plateau_patience=None, min_improvement=None):
+    """Build the stopping rules of the command line options that are set."""
+    rules = []
+    if target_reward is not None:
+        rules.append(TargetReward(target_reward))
+    if plateau_patience is not None:
+        rules.append(Plateau(plateau_patience))
+    if min_improvement is not None:
+        rules.append(ImprovementBound(min_improvement=min_improvement))
+    return rules
+
+
+def add_stopping_arguments(parser):
+    """Add the options of make_stopping_rules to an argument parser."""
+    parser.add_argument("--stop-target", type=float, default=None,
+                        help="Stop training once the mean reward over the adaptive window reaches this value.")
+    parser.add_argument("--stop-plateau", type=int, default=None,
+                        help="Stop training once the windowed mean reward has not improved for this many epochs.")
+    parser.add_argument("--stop-bound", type=float, default=None,
+                        help="Stop training once the mean reward of the last window of epochs is, with 95%% "
+                        "confidence, less than this much better than the window before.")
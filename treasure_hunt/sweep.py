@@ -0,0 +1,195 @@
+"""Run the agent x environment x seed grid on a process pool, skipping finished cells."""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from gymnasium import make
+
+from .main import ENVIRONMENTS, VALID_AGENTS, make_agent
+from .stopping import add_stopping_arguments, make_stopping_rules
+from .utils import AdaptiveRLRunner
+
+# Read by numpy's BLAS and torch when a worker process starts
+THREAD_ENV_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# value_iteration plans rather than trains, its epochs say nothing
+SWEEP_AGENTS = [agent_name for agent_name in VALID_AGENTS if agent_name != "value_iteration"]
+
+
+def experiment_name(agent_name, environment, seed):
+    """Name of the results folder of a sweep cell."""
+    return f"{agent_name}_{environment}_seed{seed}"
+
+
+def find_results(results_root, name):
+    """Return the latest completed run folder of an experiment, or None."""
+    experiment_dir = os.path.join(results_root, name)
+    if not os.path.isdir(experiment_dir):
+        return None
+    runs = sorted(run for run in os.listdir(experiment_dir)
+                  if os.path.isfile(os.path.join(experiment_dir, run, 'mean_reward.txt')))
+    return os.path.join(experiment_dir, runs[-1]) if runs else None
+
+
+def summarize_results(results_dir):
+    """Read the headline numbers of a saved run."""
+    with open(os.path.join(results_dir, 'mean_reward.txt'), encoding='utf8') as f:
+        final_mean_reward = float(f.read())
+    wallclock = np.loadtxt(os.path.join(results_dir, 'wallclock_history.csv'),
+                           delimiter=',', ndmin=1)
+    early_stop_path = os.path.join(results_dir, 'early_stop.json')
+    early_stop = {}
+    if os.path.isfile(early_stop_path):
+        with open(early_stop_path, encoding='utf8') as f:
+            early_stop = json.load(f)
+    return {
+        "final_mean_reward": final_mean_reward,
+        "epochs": len(wallclock),
+        "stop_reason": early_stop.get("reason", ""),
+        "training_time": float(np.sum(wallclock)),
+        "results_dir": results_dir,
+    }
+
+
+def limit_threads(n_threads):
+    """Worker initializer: keep torch from using every core of the machine."""
+    torch.set_num_threads(n_threads)
+
+
+@contextmanager
+def worker_thread_variables(n_threads):
+    """Set the thread variables of workers started in the block, then restore the previous values.
+    Spawned workers import numpy and torch, which size their thread pools from the variables,
+    before their initializer runs."""
+    previous = {variable: os.environ.get(variable) for variable in THREAD_ENV_VARIABLES}
+    os.environ.update({variable: str(n_threads) for variable in THREAD_ENV_VARIABLES})
+    try:
+        yield
+    finally:
+        for variable, value in previous.items():
+            if value is None:
+                del os.environ[variable]
+            else:
+                os.environ[variable] = value
+
+
+def run_cell(agent_name, environment, seed, *, epochs, timesteps,
+             final_test_episodes=1000, max_walltime=1800, results_root='results',
+             telemetry=False, stopping_rules=()):
+    """Train and test one agent on one environment, save the results and return their folder."""
+    np.random.seed(seed)
+    env = make(ENVIRONMENTS[environment], max_episode_steps=500)
+    agent, env = make_agent(agent_name, env)
+    env.action_space.seed(seed)  # Exploration samples actions from it
+    if hasattr(agent, "set_random_seed"):  # SB3 agents
+        agent.set_random_seed(seed)
+
+    runner = AdaptiveRLRunner(agent, env,
+                              total_epochs=epochs,
+                              eval_interval=timesteps,
+                              experiment_name=experiment_name(agent_name, environment, seed),
+                              final_test_episodes=final_test_episodes,
+                              seed=seed,
+                              verbose=False,
+                              max_walltime=max_walltime,
+                              results_root=results_root,
+                              telemetry=telemetry,
+                              stopping_rules=stopping_rules)
+    runner.train_agent()
+    runner.test_agent(final_test=True)
+    runner.save_results()
+    env.close()
+    return runner.results_dir
+
+
+def run_sweep(agents, environments, seeds, *, epochs, timesteps, workers=None,
+              threads_per_worker=1, final_test_episodes=1000, max_walltime=1800,
+              results_root='results', summary_path=None, telemetry=False, stopping_rules=()):
+    """Run every missing cell of the grid in parallel, then write a summary CSV.
+    Return the summary rows."""
+    cells = list(itertools.product(agents, environments, seeds))
+    rows = {}
+    pending = []
+    for cell in cells:
+        existing = find_results(results_root, experiment_name(*cell))
+        if existing is None:
+            pending.append(cell)
+        else:
+            print(f"Skipping {experiment_name(*cell)}: results found in '{existing}'")
+            rows[cell] = {"status": "existing", **summarize_results(existing)}
+
+    with worker_thread_variables(threads_per_worker), \
+            ProcessPoolExecutor(max_workers=workers,
+                                mp_context=multiprocessing.get_context("spawn"),
+                                initializer=limit_threads,
+                                initargs=(threads_per_worker,)) as pool:
+        futures = {pool.submit(run_cell, *cell, epochs=epochs, timesteps=timesteps,
+                               final_test_episodes=final_test_episodes,
+                               max_walltime=max_walltime, results_root=results_root,
+                               telemetry=telemetry, stopping_rules=stopping_rules): cell
+                   for cell in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            cell = futures[future]
+            try:
+                rows[cell] = {"status": "done", **summarize_results(future.result())}
+                outcome = f"mean reward {rows[cell]['final_mean_reward']}"
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                rows[cell] = {"status": "failed", "error": repr(error)}
+                outcome = f"failed with {error!r}"
+            print(f"[{done}/{len(pending)}] {experiment_name(*cell)}: {outcome}")
+
+    summary = [{"agent": agent_name, "environment": environment, "seed": seed,
+                **rows[(agent_name, environment, seed)]}
+               for agent_name, environment, seed in cells]
+    summary_path = summary_path or os.path.join(results_root, 'sweep_summary.csv')
+    os.makedirs(os.path.dirname(summary_path) or '.', exist_ok=True)
+    fieldnames = ["agent", "environment", "seed", "status", "final_mean_reward", "epochs",
+                  "stop_reason", "training_time", "results_dir", "error"]
+    with open(summary_path, 'w', encoding='utf8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(summary)
+    print(f"Sweep summary saved to '{summary_path}'.")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a parallel, resumable sweep of agents on treasure hunt environments.")
+    parser.add_argument("--agents", nargs="+", default=SWEEP_AGENTS, choices=VALID_AGENTS,
+                        help="Agents to run. All but value_iteration by default.")
+    parser.add_argument("--environments", nargs="+", default=list(ENVIRONMENTS),
+                        choices=ENVIRONMENTS.keys(), help="Environments to run.")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0],
+                        help="Seeds to run each agent/environment pair with.")
+    parser.add_argument("--epochs", type=int, default=int(os.getenv("TH_EPOCHS", 2000)),
+                        help="Number of epochs to train. Can also be set via TH_EPOCHS env variable.")
+    parser.add_argument("--timesteps", type=int, default=int(os.getenv("TH_TIMESTEPS", 10000)),
+                        help="Number of timesteps to train each epoch. Can also be set via TH_TIMESTEPS env variable.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TH_WORKERS", os.cpu_count())),
+                        help="Number of worker processes. Can also be set via TH_WORKERS env variable.")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="Thread limit of each worker for torch, OpenMP and BLAS.")
+    parser.add_argument("--results-root", default="results",
+                        help="Folder holding the results of every run.")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Export live metrics of every run to its results folder.")
+    add_stopping_arguments(parser)
+
+    args = parser.parse_args()
+
+    run_sweep(args.agents, args.environments, args.seeds,
+              epochs=args.epochs, timesteps=args.timesteps, workers=args.workers,
+              threads_per_worker=args.threads_per_worker, results_root=args.results_root,
+              telemetry=args.telemetry,
+              stopping_rules=make_stopping_rules(args.stop_target, args.stop_plateau, args.stop_bound))
+
+
+if __name__ == "__main__":
+    main()
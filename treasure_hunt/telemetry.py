@@ -0,0 +1,267 @@
+"""Low-overhead telemetry of training runs: throughput, call latencies, episodes and Q-table size."""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Latencies are bucketed by the bit length of their duration in nanoseconds,
+# so bucket i counts durations below 2**i ns. The last bucket is open-ended.
+N_LATENCY_BUCKETS = 36
+
+
+class LatencyHistogram:
+    """Histogram of call durations with power-of-two nanosecond buckets."""
+
+    # Durations at or above this many nanoseconds go to the last bucket
+    CAP_NS = 2**(N_LATENCY_BUCKETS - 1)
+
+    def __init__(self):
+        self.counts = [0] * N_LATENCY_BUCKETS
+        self.total_ns = 0
+
+    def observe(self, duration_ns: int):
+        """Record a duration in nanoseconds. Inlined in the Telemetry wrappers."""
+        self.counts[duration_ns.bit_length() if duration_ns < self.CAP_NS else -1] += 1
+        self.total_ns += duration_ns
+
+    @property
+    def count(self) -> int:
+        """Number of recorded durations."""
+        return sum(self.counts)
+
+    @staticmethod
+    def bucket_bounds() -> list[float]:
+        """Upper bound in seconds of every bucket, the last one being infinite."""
+        return [2**i / 1e9 for i in range(N_LATENCY_BUCKETS - 1)] + [float("inf")]
+
+    def quantile(self, q: float) -> float:
+        """Upper bound in seconds of the bucket holding the q-quantile of a non-empty histogram."""
+        rank = np.searchsorted(np.cumsum(self.counts), q * self.count)
+        return self.bucket_bounds()[rank]
+
+    def summary(self) -> dict:
+        """JSON-serializable summary of the histogram."""
+        return {
+            "count": self.count,
+            "mean_seconds": self.total_ns / 1e9 / self.count if self.count else None,
+            "p50_seconds": self.quantile(.5) if self.count else None,
+            "p99_seconds": self.quantile(.99) if self.count else None,
+            "buckets": self.counts,
+        }
+
+
+def q_table_memory(q_table) -> int:
+    """Approximate memory used by a Q-table, in bytes."""
+    if isinstance(q_table, np.ndarray):
+        return q_table.nbytes
+    rows = getattr(q_table, "rows", q_table)  # In-memory rows of a MappedQTable
+    if not rows:
+        return sys.getsizeof(rows)
+    # Rows all have the same size, do not walk millions of them
+    row = next(iter(rows.values()))
+    return sys.getsizeof(rows) + len(rows) * sys.getsizeof(row)
+
+
+class Telemetry:
+    """
+    Collect metrics of an agent training in an environment, by wrapping the environment's
+    step, the agent's predict and, for tabular agents, its TD updates with timers.
+
+    Steps and episodes played in an evaluating block are left out of the training metrics.
+    Actor processes step their own copies of the environment, so their steps are counted
+    from the batches of transitions the learner applies.
+
+    The wrappers shadow the methods as instance attributes, which would be saved or pickled
+    with the agent and environment: remove them for that with the detached block.
+
+    Metrics are exported as JSON lines (one snapshot per call to export) and as a
+    Prometheus text file, rewritten atomically so a local scraper can read it at any time.
+    """
+
+    PREFIX = "treasure_hunt"
+
+    def __init__(self, agent, env, labels: dict = None):
+        self.labels = labels or {}
+        self.histograms = {"env_step": LatencyHistogram(),
+                           "agent_predict": LatencyHistogram(),
+                           "td_update": LatencyHistogram(),
+                           "td_update_batch": LatencyHistogram()}
+        self.env_steps = 0
+        self.episodes = 0
+        self.successes = 0
+        self.episode_steps = 0  # Steps of the running episode
+        self.total_episode_steps = 0  # Steps of the finished episodes
+        self.start_time = time.perf_counter()
+        self.evaluation_seconds = 0.0  # Time spent in evaluating blocks
+        # Time, env steps and evaluation seconds at the last export
+        self.last_export = (self.start_time, 0, 0.0)
+        self.training = True  # False in evaluating blocks
+        self.agent = agent
+        self.env = env
+        self.success_reward = getattr(env.unwrapped, "TREASURE_REWARD", None)
+        self._instrumented = []
+        self.attach()
+
+    def attach(self):
+        """Wrap the instrumented methods."""
+        self._instrument(self.env, "step", self._timed_step)
+        self._instrument(self.agent, "predict", self._timer("agent_predict"))
+        if hasattr(self.agent, "_update_q_value"):
+            self._instrument(self.agent, "_update_q_value", self._timer("td_update"))
+            self._instrument(self.agent, "_update_q_values", self._timed_batch_update)
+
+    def _instrument(self, obj, name, wrap):
+        """Shadow a method of an object with a wrapped version of it."""
+        setattr(obj, name, wrap(getattr(obj, name)))
+        self._instrumented.append((obj, name))
+
+    def detach(self):
+        """Remove the wrappers, restoring the original methods."""
+        for obj, name in self._instrumented:
+            delattr(obj, name)
+        self._instrumented = []
+
+    @contextmanager
+    def detached(self):
+        """Remove the wrappers in the block, e.g. to save the agent."""
+        self.detach()
+        try:
+            yield
+        finally:
+            self.attach()
+
+    @contextmanager
+    def evaluating(self):
+        """Leave the steps and episodes of the block out of the training metrics, and its
+        duration out of the throughput. Latencies are still recorded."""
+        start = time.perf_counter()
+        self.training = False
+        try:
+            yield
+        finally:
+            self.training = True
+            # The running training episode was abandoned by the evaluation's reset
+            self.episode_steps = 0
+            self.evaluation_seconds += time.perf_counter() - start
+
+    def _timer(self, histogram_name):
+        """Return a decorator recording the latency of a method."""
+        histogram = self.histograms[histogram_name]
+        counts, cap, clock = histogram.counts, histogram.CAP_NS, time.perf_counter_ns
+
+        def wrap(method):
+            def timed(*args, **kwargs):
+                start = clock()
+                result = method(*args, **kwargs)
+                duration = clock() - start
+                counts[duration.bit_length() if duration < cap else -1] += 1
+                histogram.total_ns += duration
+                return result
+            return timed
+        return wrap
+
+    def _timed_step(self, step):
+        """Wrap env.step to also count steps, episode lengths and successes."""
+        histogram = self.histograms["env_step"]
+        counts, cap, clock = histogram.counts, histogram.CAP_NS, time.perf_counter_ns
+
+        def timed_step(action):
+            start = clock()
+            result = step(action)
+            duration = clock() - start
+            counts[duration.bit_length() if duration < cap else -1] += 1
+            histogram.total_ns += duration
+            if not self.training:
+                return result
+            self.env_steps += 1
+            self.episode_steps += 1
+            if result[2] or result[3]:  # Terminated or truncated
+                self.episodes += 1
+                self.successes += bool(result[2] and result[1] == self.success_reward)
+                self.total_episode_steps += self.episode_steps
+                self.episode_steps = 0
+            return result
+        return timed_step
+
+    def _timed_batch_update(self, update):
+        """Wrap the learner's batch TD update to also count the actors' steps."""
+        timed_update = self._timer("td_update_batch")(update)
+
+        def counted_update(states, actions, rewards, next_states):
+            self.env_steps += len(actions)
+            return timed_update(states, actions, rewards, next_states)
+        return counted_update
+
+    def snapshot(self) -> dict:
+        """Current values of all metrics. Rates are computed since the previous export,
+        over the time spent outside evaluating blocks."""
+        now = time.perf_counter()
+        last_time, last_steps, last_evaluation_seconds = self.last_export
+        training_seconds = now - last_time - (self.evaluation_seconds - last_evaluation_seconds)
+        q_table = getattr(self.agent, "q_table", None)
+        return {
+            **self.labels,
+            "time": time.time(),
+            "uptime_seconds": now - self.start_time,
+            "env_steps": self.env_steps,
+            "env_steps_per_second": (self.env_steps - last_steps) / max(training_seconds, 1e-9),
+            "episodes": self.episodes,
+            "mean_episode_length": self.total_episode_steps / self.episodes if self.episodes else None,
+            "success_rate": self.successes / self.episodes if self.episodes else None,
+            "q_table_states": None if q_table is None else len(q_table),
+            "q_table_bytes": None if q_table is None else q_table_memory(q_table),
+            "latency": {name: histogram.summary() for name, histogram in self.histograms.items()},
+        }
+
+    def to_prometheus(self, snapshot: dict) -> str:
+        """Render a snapshot in the Prometheus text exposition format."""
+        labels = ",".join(f'{key}="{value}"' for key, value in self.labels.items())
+        lines = []
+
+        def add_metric(name, kind, help_text, value):
+            if value is None:
+                return
+            lines.extend([f"# HELP {self.PREFIX}_{name} {help_text}",
+                          f"# TYPE {self.PREFIX}_{name} {kind}",
+                          f"{self.PREFIX}_{name}{{{labels}}} {value}"])
+
+        add_metric("env_steps_total", "counter", "Environment steps taken in training.", snapshot["env_steps"])
+        add_metric("env_steps_per_second", "gauge", "Training environment steps per second since the last export.",
+                   snapshot["env_steps_per_second"])
+        add_metric("episodes_total", "counter", "Training episodes finished.", snapshot["episodes"])
+        add_metric("mean_episode_length", "gauge", "Mean length of the finished episodes.",
+                   snapshot["mean_episode_length"])
+        add_metric("success_rate", "gauge", "Fraction of the finished episodes where the treasure was found.",
+                   snapshot["success_rate"])
+        add_metric("q_table_states", "gauge", "States stored in the Q-table.", snapshot["q_table_states"])
+        add_metric("q_table_bytes", "gauge", "Approximate memory used by the Q-table.",
+                   snapshot["q_table_bytes"])
+
+        name = f"{self.PREFIX}_latency_seconds"
+        lines.extend([f"# HELP {name} Latency of instrumented calls.", f"# TYPE {name} histogram"])
+        separator = "," if labels else ""
+        for call, histogram in self.histograms.items():
+            call_labels = f'{labels}{separator}call="{call}"'
+            for bound, count in zip(histogram.bucket_bounds(), np.cumsum(histogram.counts)):
+                bound = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{name}_bucket{{{call_labels},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{call_labels}}} {histogram.total_ns / 1e9}")
+            lines.append(f"{name}_count{{{call_labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory, **extra):
+        """Append a snapshot, with extra fields, to telemetry.jsonl and rewrite metrics.prom."""
+        snapshot = {**self.snapshot(), **extra}
+        self.last_export = (time.perf_counter(), self.env_steps, self.evaluation_seconds)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "telemetry.jsonl"), "a", encoding="utf8") as f:
+            f.write(json.dumps(snapshot) + "\n")
+        prometheus_path = os.path.join(directory, "metrics.prom")
+        with open(f"{prometheus_path}.tmp", "w", encoding="utf8") as f:
+            f.write(self.to_prometheus(snapshot))
+        os.replace(f"{prometheus_path}.tmp", prometheus_path)
+        return snapshot
@@ -1,29 +1,46 @@
 """Utility functions for the treasure hunt project."""
 
+import hashlib
+import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 import time
 
+import gymnasium as gym
 import pygame
 import numpy as np
 import matplotlib.pyplot as plt
 
+from .recorder import EpisodeRecorder
+from .sequential import SequentialTest
+from .telemetry import Telemetry
+
 
 class RLRunner:
     """Class to handle running training and testing an agent."""
 
     def __init__(self, agent, env, *,
                  total_epochs=10000, eval_interval=1000, eval_episodes=5, verbose=True,
-                 experiment_name=None, final_test_episodes=1000, seed=None, max_walltime=1800):
+                 experiment_name=None, final_test_episodes=1000, seed=None, max_walltime=1800,
+                 results_root='results', final_test_workers=1,
+                 checkpoint_epochs=None, checkpoint_seconds=None, telemetry=False,
+                 record_episodes=0, record_video=False, sequential_test: SequentialTest = None):
         self.agent = agent
         self.env = env
         self.total_epochs = total_epochs
         self.eval_interval = eval_interval
         self.eval_episodes = eval_episodes
         self.final_test_episodes = final_test_episodes
+        self.final_test_workers = final_test_workers
         self.verbose = verbose
         self.seed = seed
         self.max_walltime = max_walltime
+        # Checkpoint every checkpoint_epochs epochs and/or checkpoint_seconds seconds
+        self.checkpoint_epochs = checkpoint_epochs
+        self.checkpoint_seconds = checkpoint_seconds
         if experiment_name is None:
             self.experiment_name = f"{agent.__class__.__name__}_{
                 env.__class__.__name__}"
@@ -33,28 +50,86 @@ class RLRunner:
         self.reward_history = []
         self.wallclock_history = []
         self.last_rewards = []
+        self.completed_epochs = 0
+        self.early_stop = None  # Epoch and reason, if training stopped before total_epochs
+        # Number of history entries already appended to the CSV files
+        self.saved_history_lengths = {'reward_history': 0, 'wallclock_history': 0}
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.results_dir = os.path.join(
-            'results', self.experiment_name, timestamp)
+            results_root, self.experiment_name, timestamp)
+        # Exported to the results folder after every epoch
+        self.telemetry = Telemetry(agent, env, labels={"experiment": self.experiment_name}
+                                   ) if telemetry else None
+        # The first record_episodes episodes of every sequential evaluation are recorded
+        self.record_episodes = record_episodes
+        self.recorder = EpisodeRecorder(os.path.join(self.results_dir, 'episodes'), video=record_video
+                                        ) if record_episodes else None
+        # If set, evaluations stop once the test is done: after at most its max_episodes
+        # episodes during training, and final_test_episodes in the final test
+        self.sequential_test = sequential_test
+        # Reward of the single episode of every greedy policy evaluated on a deterministic env
+        self.evaluation_cache = {}
 
     def train_agent(self):
-        """Train the agent with regular evaluation loops."""
+        """Train the agent with regular evaluation loops, checkpointing if enabled.
+        A resumed runner continues from its last completed epoch, unless it stopped early."""
+        if self.early_stop is not None:
+            return
         total_epochs = self.total_epochs
         start_time = time.perf_counter()
-        self.env.reset(seed=self.seed)
-        for epoch_no in range(total_epochs):
+        last_checkpoint_time = start_time
+        if self.completed_epochs == 0:
+            self.env.reset(seed=self.seed)
+        for epoch_no in range(self.completed_epochs, total_epochs):
             self.train_agent_epoch()
             if self.verbose:
                 print(f"Epoch {epoch_no +
                                1}/{total_epochs} - Training complete")
-            self.test_agent()
+            with self._telemetry_block('evaluating'):
+                self.test_agent()
             if self.verbose:
                 print(f"Epoch {epoch_no +
                                1}/{total_epochs} - Mean reward: {self.reward_history[-1]}")
-            if time.perf_counter() - start_time > self.max_walltime:
+            self.completed_epochs = epoch_no + 1
+            if self.telemetry is not None:
+                self.telemetry.export(self.results_dir, epoch=self.completed_epochs,
+                                      eval_episodes=self.eval_episodes)
+            out_of_time = time.perf_counter() - start_time > self.max_walltime
+            reason = self.stop_reason()
+            if reason is not None:
+                self.early_stop = {'epoch': self.completed_epochs, 'reason': reason}
+            if (self._checkpoint_due(last_checkpoint_time)
+                    or ((out_of_time or reason is not None) and self.checkpointing)):
+                self.save_checkpoint()
+                last_checkpoint_time = time.perf_counter()
+            if reason is not None:
+                print(f"Stopping early after epoch {self.completed_epochs}: {reason}.")
+                return
+            if out_of_time:
                 print("Truncating due to exceeding time budget.")
                 return
 
+    def _telemetry_block(self, name):
+        """The telemetry's block of that name, 'evaluating' or 'detached', or a no-op without telemetry."""
+        return nullcontext() if self.telemetry is None else getattr(self.telemetry, name)()
+
+    def stop_reason(self):
+        """Return why training should stop after the current epoch, or None to continue.
+        Training always runs total_epochs epochs unless overridden."""
+        return None
+
+    @property
+    def checkpointing(self):
+        """Whether periodic checkpoints are enabled."""
+        return self.checkpoint_epochs is not None or self.checkpoint_seconds is not None
+
+    def _checkpoint_due(self, last_checkpoint_time):
+        """Whether a checkpoint should be saved after the current epoch."""
+        if self.checkpoint_epochs is not None and self.completed_epochs % self.checkpoint_epochs == 0:
+            return True
+        return (self.checkpoint_seconds is not None
+                and time.perf_counter() - last_checkpoint_time >= self.checkpoint_seconds)
+
     def train_agent_epoch(self):
         """Run an epoch of training."""
         start_time = time.perf_counter()
@@ -67,49 +142,212 @@ class RLRunner:
     def test_agent(self, final_test=False):
         """Test the agent's performance."""
         eval_episodes = self.final_test_episodes if final_test else self.eval_episodes
+        test = self.sequential_test
+        if test is not None:
+            test.reset()
+            if not final_test:
+                eval_episodes = test.max_episodes
 
-        rewards = []
-        for _ in range(eval_episodes):
-            obs, _ = self.env.reset()
-            episode_reward = 0
-            done = False
-            while not done:
-                action, _ = self.agent.predict(obs, deterministic=True)
-                obs, reward, done, truncated, _ = self.env.step(action)
-                episode_reward += reward
-                done = done or truncated
-            rewards.append(episode_reward)
+        # Tabular agents play the final test on their frozen greedy policy, leaving the Q-table
+        # untouched. Compiling reads the whole table, much longer than a few training evaluations
+        compiled_policy = (self.agent.compile_policy()
+                           if final_test and hasattr(self.agent, 'compile_policy') else None)
+        # Recorded evaluations always play their episodes
+        policy_key = self._deterministic_policy_key(compiled_policy) if self.recorder is None else None
+        if policy_key is not None:
+            if policy_key not in self.evaluation_cache:
+                self.evaluation_cache[policy_key] = run_episodes(self.agent, self.env, 1)[0]
+            rewards = [self.evaluation_cache[policy_key]]
+        elif final_test and self.final_test_workers > 1:
+            rewards = self._test_agent_parallel(eval_episodes)
+        elif self.recorder is not None:
+            n_recorded = min(self.record_episodes, eval_episodes)
+            rewards = (run_episodes(self.agent, self.env, n_recorded, recorder=self.recorder,
+                                    sequential_test=test)
+                       + run_episodes(self.agent, self.env, eval_episodes - n_recorded, sequential_test=test))
+            if final_test:
+                self.recorder.flush()
+        else:
+            rewards = run_episodes(self.agent, self.env, eval_episodes, sequential_test=test)
         self.last_rewards = rewards
         mean_reward = np.mean(rewards)
 
         self.reward_history.append(mean_reward)
 
+    def _deterministic_policy_key(self, compiled_policy=None):
+        """Hash of the agent's greedy policy if every evaluation episode is the same,
+        i.e. the environment is deterministic too. None otherwise."""
+        if not getattr(self.env.unwrapped, 'deterministic', False):
+            return None
+        if compiled_policy is not None:
+            return compiled_policy.key()
+        if hasattr(self.agent, 'greedy_policy_key'):
+            return self.agent.greedy_policy_key()
+        policy = getattr(self.agent, 'policy', None)
+        if policy is None:
+            return None
+        # SB3 agents act greedily with deterministic=True, so their weights define the policy
+        digest = hashlib.blake2b(digest_size=16)
+        for tensor in policy.state_dict().values():
+            digest.update(tensor.detach().cpu().numpy().tobytes())
+        return digest.hexdigest()
+
+    def _test_agent_parallel(self, eval_episodes):
+        """Shard the test episodes across worker processes.
+        Each shard has its own seed derived from self.seed, so results are reproducible
+        for a given seed and number of workers. With a sequential test, every shard stops
+        on its own once its share of the precision is reached."""
+        shard_test = None if self.sequential_test is None else self.sequential_test.shard(self.final_test_workers)
+        shard_sizes = [len(shard) for shard in np.array_split(
+            np.arange(eval_episodes), self.final_test_workers)]
+        shard_seeds = [int(seed_sequence.generate_state(1)[0]) for seed_sequence in
+                       np.random.SeedSequence(self.seed).spawn(self.final_test_workers)]
+        # Spawn, the only start method of every platform, so shards behave the same on Linux,
+        # macOS and Windows. The agent and environment are pickled, without the telemetry wrappers
+        with self._telemetry_block('detached'), \
+                ProcessPoolExecutor(max_workers=self.final_test_workers,
+                                    mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=_init_evaluation_worker,
+                                    initargs=(self.agent, self.env)) as pool:
+            shards = list(pool.map(_run_evaluation_shard, shard_seeds, shard_sizes,
+                                   [shard_test] * self.final_test_workers))
+        return [reward for shard in shards for reward in shard]
+
     def save_results(self):
         """Save the reward history and agent."""
         # Create results directory with timestamp subfolder if it doesn't exist
         os.makedirs(self.results_dir, exist_ok=True)
 
-        # Save reward history as CSV
-        np.savetxt(os.path.join(self.results_dir, 'reward_history.csv'),
-                   self.reward_history, delimiter=',')
-
-        # Save wallclock history as CSV
-        np.savetxt(os.path.join(self.results_dir, 'wallclock_history.csv'),
-                   self.wallclock_history, delimiter=',')
+        # Append the reward and wallclock histories to their CSV files
+        self._append_histories()
 
         # Save mean reward as text file
         with open(os.path.join(self.results_dir, 'mean_reward.txt'), 'w', encoding='utf8') as f:
             f.write(str(self.reward_history[-1]))
 
+        if self.early_stop is not None:
+            with open(os.path.join(self.results_dir, 'early_stop.json'), 'w', encoding='utf8') as f:
+                json.dump({**self.early_stop, 'total_epochs': self.total_epochs}, f)
+
         # Save rewards as CSV
         np.savetxt(os.path.join(self.results_dir, 'rewards.csv'),
                    self.last_rewards, delimiter=',')
 
-        # Save agent
-        self.agent.save(os.path.join(self.results_dir, 'agent'))
+        # Save agent, without the telemetry wrappers
+        with self._telemetry_block('detached'):
+            self.agent.save(os.path.join(self.results_dir, 'agent'))
 
         print(f"Results saved to the '{self.results_dir}' folder.")
 
+    def _append_histories(self):
+        """Append the history entries not saved yet to the history CSV files."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        for name, saved_length in self.saved_history_lengths.items():
+            history = getattr(self, name)
+            with open(os.path.join(self.results_dir, f'{name}.csv'), 'a', encoding='utf8') as f:
+                np.savetxt(f, history[saved_length:], delimiter=',')
+            self.saved_history_lengths[name] = len(history)
+
+    def _random_states(self):
+        """JSON-serializable states of the global, environment and space RNGs."""
+        global_state = np.random.get_state(legacy=False)
+        global_state['state']['key'] = global_state['state']['key'].tolist()
+        return {
+            'global': global_state,
+            'env': self.env.unwrapped.np_random.bit_generator.state,
+            'spaces': [space.np_random.bit_generator.state for space in self._spaces()],
+        }
+
+    def _restore_random_states(self, states):
+        """Inverse of _random_states."""
+        np.random.set_state(states['global'])
+        self.env.unwrapped.np_random.bit_generator.state = states['env']
+        for space, state in zip(self._spaces(), states['spaces']):
+            space.np_random.bit_generator.state = state
+
+    def _spaces(self):
+        """The action space and the unwrapped observation space, with all their subspaces.
+        Each space has its own RNG, used by sample."""
+        spaces = []
+        pending = [self.env.action_space, self.env.unwrapped.observation_space]
+        while pending:
+            space = pending.pop(0)
+            spaces.append(space)
+            if isinstance(space, gym.spaces.Dict):
+                pending.extend(space.spaces.values())
+            elif isinstance(space, gym.spaces.Tuple):
+                pending.extend(space.spaces)
+        return spaces
+
+    def save_checkpoint(self):
+        """
+        Save everything needed to resume training after the last completed epoch.
+        The agent is saved under a new name, then checkpoint.json is atomically replaced
+        to point to it, so a crash at any time leaves the previous checkpoint usable.
+        """
+        checkpoint_dir = os.path.join(self.results_dir, 'checkpoint')
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        agent_name = f'agent_epoch{self.completed_epochs}'
+        with self._telemetry_block('detached'):
+            self.agent.save(os.path.join(checkpoint_dir, agent_name))
+        self._append_histories()
+
+        state = {
+            'completed_epochs': self.completed_epochs,
+            'agent': agent_name,
+            'exploration_rate': getattr(self.agent, 'exploration_rate', None),
+            'eval_episodes': self.eval_episodes,
+            'history_lengths': self.saved_history_lengths,
+            'last_rewards': [float(reward) for reward in self.last_rewards],
+            'random_states': self._random_states(),
+            'early_stop': self.early_stop,
+        }
+        state_path = os.path.join(self.results_dir, 'checkpoint.json')
+        with open(f'{state_path}.tmp', 'w', encoding='utf8') as f:
+            json.dump(state, f)
+        os.replace(f'{state_path}.tmp', state_path)
+
+        # Previous agents are not referenced anymore
+        for file_name in os.listdir(checkpoint_dir):
+            if os.path.splitext(file_name)[0] != agent_name:
+                os.remove(os.path.join(checkpoint_dir, file_name))
+        if self.verbose:
+            print(f"Checkpoint saved after epoch {self.completed_epochs}.")
+
+    def resume(self, results_dir):
+        """
+        Restore the checkpoint of a previous run from its results folder.
+        The next train_agent call continues from the epoch after the checkpoint.
+        """
+        self.results_dir = results_dir
+        if self.recorder is not None:
+            self.recorder.directory = os.path.join(results_dir, 'episodes')
+        with open(os.path.join(results_dir, 'checkpoint.json'), encoding='utf8') as f:
+            state = json.load(f)
+
+        loaded = self.agent.load(os.path.join(results_dir, 'checkpoint', state['agent']))
+        if loaded is not None:  # SB3 agents load into a new model
+            self.agent = loaded
+            self.agent.set_env(self.env)
+            if self.telemetry is not None:
+                self.telemetry.detach()
+                self.telemetry = Telemetry(self.agent, self.env, labels=self.telemetry.labels)
+        if state['exploration_rate'] is not None:
+            self.agent.exploration_rate = state['exploration_rate']
+
+        # Drop history rows appended after the checkpoint
+        for name, length in state['history_lengths'].items():
+            path = os.path.join(results_dir, f'{name}.csv')
+            history = np.loadtxt(path, delimiter=',', ndmin=1)[:length].tolist()
+            np.savetxt(path, history, delimiter=',')
+            setattr(self, name, history)
+        self.saved_history_lengths = dict(state['history_lengths'])
+        self.completed_epochs = state['completed_epochs']
+        self.eval_episodes = state['eval_episodes']
+        self.last_rewards = state['last_rewards']
+        self.early_stop = state.get('early_stop')
+        self._restore_random_states(state['random_states'])
+
     def plot_results(self, save=False):
         """Plot reward history"""
         plt.plot(self.reward_history)
@@ -129,28 +367,46 @@ class AdaptiveRLRunner(RLRunner):
     def __init__(self, agent, env, *,
                  total_epochs=10000, eval_interval=1000, eval_episodes=5, verbose=True,
                  experiment_name=None, final_test_episodes=1000,
-                 seed=None, max_walltime=1800,
-                 target_std_ratio=.5, adapt_window=10, max_eval_episodes=30):
+                 seed=None, max_walltime=1800, results_root='results', final_test_workers=1,
+                 checkpoint_epochs=None, checkpoint_seconds=None, telemetry=False,
+                 record_episodes=0, record_video=False, sequential_test=None, target_std_ratio=.5,
+                 adapt_window=10, max_eval_episodes=30, stopping_rules=()):
         super().__init__(agent, env, total_epochs=total_epochs, eval_interval=eval_interval,
                          experiment_name=experiment_name, final_test_episodes=final_test_episodes,
-                         eval_episodes=eval_episodes, verbose=verbose, seed=seed, max_walltime=max_walltime)
+                         eval_episodes=eval_episodes, verbose=verbose, seed=seed, max_walltime=max_walltime,
+                         results_root=results_root, final_test_workers=final_test_workers,
+                         checkpoint_epochs=checkpoint_epochs, checkpoint_seconds=checkpoint_seconds,
+                         telemetry=telemetry, record_episodes=record_episodes,
+                         record_video=record_video, sequential_test=sequential_test)
         self.target_std_ratio = target_std_ratio
         self.adapt_window = adapt_window
         self.max_eval_episodes = max_eval_episodes
+        # Checked after every epoch, the first rule giving a reason stops training
+        self.stopping_rules = list(stopping_rules)
 
     def test_agent(self, final_test=False):
         """Train the agent with adaptive evaluation intervals."""
-        super().test_agent()
+        super().test_agent(final_test=final_test)
         if not final_test:
             self.adapt_eval_interval()
 
+    def stop_reason(self):
+        """Return the reason of the first stopping rule met over windows of adapt_window epochs."""
+        for rule in self.stopping_rules:
+            reason = rule.check(self.reward_history, self.adapt_window)
+            if reason is not None:
+                return reason
+        return None
+
     def adapt_eval_interval(self):
-        """Adapt the evaluation episodes based on the standard deviation of the last rewards."""
-        if len(self.reward_history) < self.adapt_window:
+        """Adapt the evaluation episodes based on the standard deviation of the last rewards.
+        A sequential test replaces the adaptation."""
+        if self.sequential_test is not None or len(self.reward_history) < self.adapt_window:
             return
         std_inner = np.std(self.last_rewards)
         std_inter = np.std(self.reward_history[-self.adapt_window:])
-        if std_inter == 0:
+        # Identical episodes, e.g. a single memoized one, say nothing about the evaluation length
+        if std_inter == 0 or std_inner == 0:
             return
         std_ratio = std_inter / std_inner
         if std_ratio > self.target_std_ratio and self.eval_episodes < self.max_eval_episodes:
@@ -162,16 +418,72 @@ class AdaptiveRLRunner(RLRunner):
                   f"{self.eval_episodes} based on std ratio {std_ratio}")
 
 
-def run_with_render(env_human, agent, n_episodes=10):
-    """Run the agent in the environment with rendering."""
+def run_episodes(agent, env, n_episodes, seed=None, recorder: EpisodeRecorder = None,
+                 sequential_test: SequentialTest = None):
+    """Play greedy episodes and return their total rewards.
+    If a seed is given, it is used for the first reset only.
+    If a recorder is given, it captures every step.
+    If a sequential test is given, every reward updates it and no episode starts once it is done."""
+    rewards = []
+    for episode in range(n_episodes):
+        if sequential_test is not None and sequential_test.done:
+            break
+        obs, _ = env.reset(seed=seed if episode == 0 else None)
+        if recorder is not None:
+            recorder.start_episode(env)
+        episode_reward = 0
+        done = False
+        while not done:
+            action, _ = agent.predict(obs, deterministic=True)
+            obs, reward, done, truncated, _ = env.step(action)
+            if recorder is not None:
+                recorder.capture(env)
+            episode_reward += reward
+            done = done or truncated
+        rewards.append(episode_reward)
+        if sequential_test is not None:
+            sequential_test.update(episode_reward)
+    return rewards
+
+
+# Agent and environment copies of an evaluation worker process
+_worker_agent = None
+_worker_env = None
+
+
+def _init_evaluation_worker(agent, env):
+    """Store the agent and environment sent to an evaluation worker."""
+    global _worker_agent, _worker_env  # pylint: disable=global-statement
+    _worker_agent, _worker_env = agent, env
+
+
+def _run_evaluation_shard(seed, n_episodes, sequential_test=None):
+    """Play a shard of the test episodes in a worker."""
+    np.random.seed(seed)
+    return run_episodes(_worker_agent, _worker_env, n_episodes, seed=seed, sequential_test=sequential_test)
+
+
+def run_with_render(env_human, agent, n_episodes=10, recorder: EpisodeRecorder = None):
+    """Run the agent in the environment with rendering.
+    If a recorder is given, the episodes are recorded to files rather than rendered,
+    which needs no display."""
+    if hasattr(agent, "compile_policy"):
+        agent.compile_policy()
 
     for _ in range(n_episodes):
         obs, _ = env_human.reset()  # Reset the environment before each episode
+        if recorder is not None:
+            recorder.start_episode(env_human)
         for _ in range(100):  # Add a limit
             # Get the action from the agent
             action, _ = agent.predict(obs, deterministic=False)
             obs, _, terminated, truncated, _ = env_human.step(action)
-            env_human.render()  # Render the environment
-            pygame.time.delay(100)  # Delay for 100 ms
+            if recorder is not None:
+                recorder.capture(env_human)
+            else:
+                env_human.render()  # Render the environment
+                pygame.time.delay(100)  # Delay for 100 ms
             if terminated or truncated:
                 break
+    if recorder is not None:
+        recorder.flush()